@@ -12,21 +12,65 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import os
+import time
+
 from oslo_config import cfg
 from oslo_db import options as db_options
 from oslo_log import log as logging
+from oslo_serialization import jsonutils
 
-from neutron import context
+from neutron.core_extensions import qos as qos_core
+from neutron.db import api as db_api
 from neutron import manager
 
-from networking_ovn._i18n import _LI, _LE
+from networking_ovn._i18n import _, _LI, _LE
+from networking_ovn.common import cache
 from networking_ovn.common import config as ovn_config
+from networking_ovn.common import sync_report
 from networking_ovn import ovn_nb_sync
 from networking_ovn.ovsdb import impl_idl_ovn
+from networking_ovn.ovsdb import snapshot
 from networking_ovn import plugin as ovn_plugin
 
 LOG = logging.getLogger(__name__)
 
+sync_opts = [
+    cfg.StrOpt('sync_checkpoint_file',
+               help=_('File recording the sync phases already completed. '
+                      'When set, an interrupted sync resumes from the '
+                      'last completed phase when run again.')),
+    cfg.StrOpt('sync_snapshot_file',
+               help=_('OVN NB database file, or JSON dump made with '
+                      '"ovsdb-client dump --format=json --data=json", to '
+                      'audit in log mode instead of connecting to the '
+                      'OVN NB ovsdb-server.')),
+    cfg.StrOpt('sync_snapshot_schema_file',
+               help=_('OVN NB schema, as given by "ovsdb-client '
+                      'get-schema", needed to read a JSON dump given as '
+                      'sync_snapshot_file.')),
+    cfg.IntOpt('sync_workers',
+               default=1,
+               min=1,
+               help=_('Number of worker processes. The networks, with '
+                      'their ports and ACLs, are split between the workers '
+                      'by hash, each worker with its own DB and OVN NB '
+                      'connections, and their reports are merged.')),
+    cfg.IntOpt('sg_index_max_age',
+               default=10,
+               min=0,
+               help=_('Maximum age in seconds of the security group '
+                      'memberships and references cached by the '
+                      'lightweight plugin of sync_fast_start. 0 disables '
+                      'the expiry.')),
+    cfg.BoolOpt('sync_fast_start',
+                default=False,
+                help=_('Read the Neutron DB with a lightweight read-only '
+                       'plugin instead of loading the core plugin through '
+                       'the Neutron manager. Starts a "log" mode sync '
+                       'faster, e.g. for audits run from cron.')),
+]
+
 
 class OVNPlugin(ovn_plugin.OVNPlugin):
 
@@ -39,6 +83,39 @@ class OVNPlugin(ovn_plugin.OVNPlugin):
         pass
 
 
+class ReadOnlyOVNPlugin(OVNPlugin):
+    """OVNPlugin only reading the Neutron DB, for "log" mode syncs.
+
+    It is created directly rather than by the Neutron manager, and its
+    constructor only sets up what the sync reads with: no IPAM, DHCP
+    scheduler, nova notifier or callback subscriptions.  Nothing changes
+    the DB while it runs, so its caches are not invalidated.
+    """
+
+    def __init__(self):
+        self._setup_base_binding_dict()
+        self.core_ext_handler = qos_core.QosCoreResourceExtension()
+        # The service plugins are not loaded by the sync, and asking the
+        # Neutron manager about them would load the full core plugin.
+        self.core_ext_handler._plugin_loaded = False
+        self._sg_index = cache.SecurityGroupIndex(
+            cfg.CONF.ovn.sg_index_max_age)
+        self._subnet_cache = cache.SubnetCache()
+        self._qos_cache = cache.QosOptionsCache(
+            self._qos_render_ovn_options)
+
+    @property
+    def _core_plugin(self):
+        # The L3 mixins get the core plugin from the Neutron manager.
+        return self
+
+    def _get_sg_port_bindings(self, context, sg_id):
+        return self._sg_index.get_sg_ports(self, context, sg_id)
+
+    def _get_referencing_sgs(self, context, sg_id):
+        return self._sg_index.get_referencing_sgs(self, context, sg_id)
+
+
 def setup_conf():
     conf = cfg.CONF
     cfg.CONF.core_plugin = (
@@ -50,6 +127,7 @@ def setup_conf():
             del ovn_opts[index]
 
     cfg.CONF.register_cli_opts(ovn_opts, group=ovn_group)
+    cfg.CONF.register_cli_opts(sync_opts, group=ovn_group)
     db_group, neutron_db_opts = db_options.list_opts()[0]
     cfg.CONF.register_cli_opts(neutron_db_opts, db_group)
     return conf
@@ -60,6 +138,7 @@ def main():
 
     The utility syncs neutron db with ovn nb db.
     """
+    started_at = time.time()
     conf = setup_conf()
 
     # if no config file is passed or no configuration options are passed
@@ -81,35 +160,126 @@ def main():
 
     # we dont want the service plugins to be loaded.
     conf.service_plugins = []
-    ovn_plugin = manager.NeutronManager.get_plugin()
-    try:
-        ovn_plugin._ovn = impl_idl_ovn.OvsdbOvnIdl(ovn_plugin)
-    except RuntimeError:
-        LOG.error(_LE('Invalid --ovn-ovsdb_connection parameter provided.'))
+    if conf.ovn.sync_fast_start:
+        if mode != ovn_nb_sync.SYNC_MODE_LOG:
+            LOG.error(_LE('The fast start can only be used in "log" mode'))
+            return
+        ovn_plugin = ReadOnlyOVNPlugin()
+    else:
+        ovn_plugin = manager.NeutronManager.get_plugin()
+    LOG.info(_LI('Loaded the plugin in %.2f seconds'),
+             time.time() - started_at)
+    if conf.ovn.sync_snapshot_file:
+        if mode != ovn_nb_sync.SYNC_MODE_LOG:
+            LOG.error(_LE('An OVN NB snapshot can only be synced in "log" '
+                          'mode'))
+            return
+        try:
+            ovn_plugin._ovn = snapshot.OvsdbSnapshotIdl(snapshot.load(
+                conf.ovn.sync_snapshot_file,
+                conf.ovn.sync_snapshot_schema_file))
+        except (IOError, ValueError) as e:
+            LOG.error(_LE('Invalid OVN NB snapshot %(file)s: %(error)s'),
+                      {'file': conf.ovn.sync_snapshot_file, 'error': e})
+            return
+        LOG.info(_LI('Loaded the OVN NB snapshot %s'),
+                 conf.ovn.sync_snapshot_file)
+
+    LOG.info(_LI('Syncing the networks, ports, ACLs and routers with '
+                 'mode : %s'), mode)
+    if conf.ovn.sync_workers > 1:
+        result = _sync_in_workers(conf, ovn_plugin, mode,
+                                  conf.ovn.sync_workers, started_at)
+    else:
+        result, _synchronizer = _sync(conf, ovn_plugin, mode,
+                                      started_at=started_at)
+    if not result:
+        LOG.error(_LE("Error syncing, check the --database-connection and "
+                      "--ovn-ovsdb_connection values and please try again"))
         return
+    LOG.info(_LI('Sync completed'))
+
 
+def _sync(conf, ovn_plugin, mode, shard=None, started_at=None):
+    """Sync all the resources, or the ones of a shard.
+
+    @return: (result of sync_all, synchronizer), (False, None) if the
+             OVN NB DB could not be reached
+    """
+    if not conf.ovn.sync_snapshot_file:
+        try:
+            ovn_plugin._ovn = impl_idl_ovn.OvsdbOvnIdl(ovn_plugin)
+        except RuntimeError:
+            LOG.error(_LE('Invalid --ovn-ovsdb_connection parameter '
+                          'provided.'))
+            return False, None
+
+    checkpoint_file = conf.ovn.sync_checkpoint_file
+    if checkpoint_file and shard is not None:
+        checkpoint_file = '%s.%d-of-%d' % ((checkpoint_file, ) + shard)
     synchronizer = ovn_nb_sync.OvnNbSynchronizer(
-        ovn_plugin, ovn_plugin._ovn, mode)
+        ovn_plugin, ovn_plugin._ovn, mode, checkpoint_file=checkpoint_file,
+        shard=shard, process_started_at=started_at)
+    return synchronizer.sync_all(), synchronizer
 
-    ctx = context.get_admin_context()
 
-    LOG.info(_LI('Syncing the networks and ports with mode : %s'), mode)
-    try:
-        synchronizer.sync_networks_and_ports(ctx)
-    except Exception:
-        LOG.exception(_LE("Error syncing  the networks and ports. Check the "
-                          "--database-connection value again"))
-        return
-    try:
-        synchronizer.sync_acls(ctx)
-    except Exception:
-        LOG.exception(_LE("Error syncing  ACLs for unknown reason "
-                          "please try again"))
-        return
+def _sync_in_workers(conf, ovn_plugin, mode, workers, started_at):
+    """Sync the resources in forked worker processes, one per shard.
+
+    Each worker opens its own DB and OVN NB connections, a loaded OVN NB
+    snapshot is shared.  The workers send their result and report back
+    through a pipe, and the merged report is emitted here.
+
+    @return: True if all the workers succeeded
+    """
+    # The pooled DB connections must not be shared with the workers.
+    db_api.get_engine().dispose()
+    workers_pipes = []
+    for index in range(workers):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            _run_worker(conf, ovn_plugin, mode, (index, workers), write_fd,
+                        started_at)
+        os.close(write_fd)
+        workers_pipes.append((index, pid, read_fd))
+
+    result = True
+    report = sync_report.SyncReport(mode, process_started_at=started_at)
+    for index, pid, read_fd in workers_pipes:
+        with os.fdopen(read_fd) as f:
+            output = f.read()
+        os.waitpid(pid, 0)
+        try:
+            worker = jsonutils.loads(output)
+        except ValueError:
+            LOG.error(_LE('OVN-NB Sync worker %d ended without result'),
+                      index)
+            result = False
+            continue
+        result = result and worker['result']
+        if worker['report']:
+            report.merge(worker['report'])
+    report.finish()
+    report.emit()
+    return result
+
+
+def _run_worker(conf, ovn_plugin, mode, shard, write_fd, started_at):
+    status = 1
     try:
-        synchronizer.sync_routers_and_rports(ctx)
+        # Only the parent writes the merged report.
+        conf.set_override('sync_report_file', None, 'ovn')
+        result, synchronizer = _sync(conf, ovn_plugin, mode, shard,
+                                     started_at)
+        output = {'result': result,
+                  'report': (synchronizer.report.to_dict()
+                             if synchronizer is not None else None)}
+        with os.fdopen(write_fd, 'w') as f:
+            jsonutils.dump(output, f)
+        status = 0
     except Exception:
-        LOG.exception(_LE("Error syncing  Routers and Router ports "
-                          "please try again"))
-        return
-    LOG.info(_LI('Sync completed'))
+        LOG.exception(_LE('OVN-NB Sync worker %d failed'), shard[0])
+    finally:
+        os._exit(status)
@@ -0,0 +1,142 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""OVN cost accounting of the API requests.
+
+When [ovn] request_accounting is set, the entry points decorated with
+track count the OVN NB DB transactions and commands, the OVN rows
+scanned and the Neutron DB queries of a request, and the time spent in
+OVN, and log one summary line per request.  The option is mutable, it
+can be switched on and off by reloading the configuration of a running
+neutron-server.
+
+The cost of a request is bound to the green thread serving it, and
+carried by its transactions to the thread committing them.
+"""
+
+import contextlib
+import functools
+import threading
+import time
+
+from oslo_log import log
+from sqlalchemy import event
+
+from neutron.db import api as db_api
+
+from networking_ovn._i18n import _LI
+from networking_ovn.common import config
+
+LOG = log.getLogger(__name__)
+
+_local = threading.local()
+_query_listener_lock = threading.Lock()
+_query_listener_registered = False
+
+
+class RequestCost(object):
+    """OVN cost of an API request."""
+
+    def __init__(self, name):
+        self.name = name
+        self.started_at = time.time()
+        self.transactions = 0
+        self.commands = 0
+        self.row_scans = 0
+        self.db_queries = 0
+        self.ovn_time = 0.0
+        self.queue_wait = 0.0
+
+    def to_dict(self):
+        return {'request': self.name,
+                'transactions': self.transactions,
+                'commands': self.commands,
+                'row_scans': self.row_scans,
+                'db_queries': self.db_queries,
+                'ovn_time': self.ovn_time,
+                'queue_wait': self.queue_wait,
+                'duration': time.time() - self.started_at}
+
+
+def current():
+    """Return the cost of the request served by this thread, or None."""
+    return getattr(_local, 'cost', None)
+
+
+@contextlib.contextmanager
+def bind(cost):
+    """Account the work done within the context to cost."""
+    previous = current()
+    _local.cost = cost
+    try:
+        yield cost
+    finally:
+        _local.cost = previous
+
+
+def add_transaction(cost, num_commands, queue_wait, duration):
+    """Account a committed OVN NB DB transaction to cost, if any.
+
+    @param queue_wait: time waited for the OVN NB DB connection
+    @type  queue_wait: float
+    @param duration: time taken by the commit, queue wait included
+    @type  duration: float
+    """
+    if cost is None:
+        return
+    cost.transactions += 1
+    cost.commands += num_commands
+    cost.queue_wait += queue_wait
+    cost.ovn_time += duration
+
+
+def add_row_scan(num_rows):
+    """Account OVN rows scanned to the current request."""
+    current().row_scans += num_rows
+
+
+def _count_query(*args, **kwargs):
+    cost = current()
+    if cost is not None:
+        cost.db_queries += 1
+
+
+def _register_query_listener():
+    global _query_listener_registered
+    with _query_listener_lock:
+        if not _query_listener_registered:
+            event.listen(db_api.get_engine(), 'before_cursor_execute',
+                         _count_query)
+            _query_listener_registered = True
+
+
+def track(f):
+    """Account the OVN cost of the decorated entry point.
+
+    The entry points called by another one are accounted to the outer one.
+    """
+    @functools.wraps(f)
+    def wrapper(*args, **kwargs):
+        if current() is not None or not config.is_ovn_request_accounting():
+            return f(*args, **kwargs)
+        _register_query_listener()
+        with bind(RequestCost(f.__name__)) as cost:
+            try:
+                return f(*args, **kwargs)
+            finally:
+                LOG.info(_LI("OVN cost of %(request)s: %(transactions)d "
+                             "transactions, %(commands)d commands, "
+                             "%(row_scans)d rows scanned, %(db_queries)d DB "
+                             "queries, %(ovn_time).3fs in OVN of which "
+                             "%(queue_wait).3fs queued, %(duration).3fs "
+                             "in total"), cost.to_dict())
+    return wrapper
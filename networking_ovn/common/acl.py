@@ -19,6 +19,9 @@ from neutron.common import constants as n_const
 from networking_ovn.common import constants as ovn_const
 from networking_ovn.common import utils
 
+LSWITCH_ACL_DROP = 'drop'
+LSWITCH_ACL_DHCP = 'dhcp'
+
 
 def acl_direction(r, port):
     if r['direction'] == 'ingress':
@@ -91,23 +94,6 @@ def acl_protocol_and_ports(r, icmp):
     return match
 
 
-def drop_all_ip_traffic_for_port(port):
-    acl_list = []
-    for direction, p in (('from-lport', 'inport'),
-                         ('to-lport', 'outport')):
-        lswitch = utils.ovn_name(port['network_id'])
-        lport = port['id']
-        acl = {"lswitch": lswitch, "lport": lport,
-               "priority": ovn_const.ACL_PRIORITY_DROP,
-               "action": ovn_const.ACL_ACTION_DROP,
-               "log": False,
-               "direction": direction,
-               "match": '%s == "%s" && ip' % (p, port['id']),
-               "external_ids": {'neutron:lport': port['id']}}
-        acl_list.append(acl)
-    return acl_list
-
-
 def add_sg_rule_acl_for_port(port, r, match):
     dir_map = {
         'ingress': 'to-lport',
@@ -124,47 +110,88 @@ def add_sg_rule_acl_for_port(port, r, match):
     return acl
 
 
-def add_acl_dhcp(port, subnet):
-    # Allow DHCP responses through from source IPs on the local subnet.
-    # We do this even if DHCP isn't enabled.  It could be enabled later.
-    # We could hook into handling when it's enabled/disabled for a subnet,
-    # but this code is temporary anyway.  It's likely no longer needed
-    # once OVN native DHCP support merges, which is under development and
-    # review already.
-    # TODO(russellb) Remove this once OVN native DHCP support is merged.
-    acl_list = []
-    acl = {"lswitch": utils.ovn_name(port['network_id']),
-           "lport": port['id'],
-           "priority": ovn_const.ACL_PRIORITY_ALLOW,
-           "action": ovn_const.ACL_ACTION_ALLOW,
-           "log": False,
-           "direction": 'to-lport',
-           "match": ('outport == "%s" && ip4 && ip4.src == %s && '
-                     'udp && udp.src == 67 && udp.dst == 68'
-                     ) % (port['id'], subnet['cidr']),
-           "external_ids": {'neutron:lport': port['id']}}
-    acl_list.append(acl)
-    acl = {"lswitch": utils.ovn_name(port['network_id']),
-           "lport": port['id'],
-           "priority": ovn_const.ACL_PRIORITY_ALLOW,
-           "action": ovn_const.ACL_ACTION_ALLOW,
-           "log": False,
-           "direction": 'from-lport',
-           "match": ('inport == "%s" && ip4 && '
-                     '(ip4.dst == 255.255.255.255 || '
-                     'ip4.dst == %s) && '
-                     'udp && udp.src == 68 && udp.dst == 67'
-                     ) % (port['id'], subnet['cidr']),
-           "external_ids": {'neutron:lport': port['id']}}
-    acl_list.append(acl)
-    return acl_list
-
-
-def _get_subnet_from_cache(plugin, admin_context, subnet_cache, subnet_id):
+def lswitch_acl_keys_for_port(port, subnets):
+    """Return the keys of the shared lswitch ACLs a port is a member of.
+
+    Every port with security groups is subject to the default drop ACLs of
+    its logical switch and to the DHCP ACLs of each IPv4 subnet it has an
+    address on.  Rather than rendering these per port, one ACL row per key
+    is shared by all member ports of the logical switch.
+
+    @param port: neutron port
+    @param subnets: subnets of the port's fixed IPs
+    @return: list of lswitch ACL keys
+    """
+    if not port.get('security_groups'):
+        return []
+    keys = ['%s:%s' % (LSWITCH_ACL_DROP, direction)
+            for direction in ('from-lport', 'to-lport')]
+    for subnet in subnets:
+        # Allow DHCP responses through from source IPs on the local
+        # subnet.  We do this even if DHCP isn't enabled.  It could be
+        # enabled later.
+        # TODO(russellb) Remove this once OVN native DHCP support is merged.
+        if subnet['ip_version'] != 4:
+            continue
+        for direction in ('from-lport', 'to-lport'):
+            key = '%s:%s:%s' % (LSWITCH_ACL_DHCP, direction, subnet['cidr'])
+            if key not in keys:
+                keys.append(key)
+    return keys
+
+
+def _lport_set_match(portdir, lports):
+    lport_set = ', '.join('"%s"' % lport for lport in sorted(lports))
+    return '%s == {%s}' % (portdir, lport_set)
+
+
+def lswitch_acl(lswitch, key, lports):
+    """Render the shared lswitch ACL identified by key for a set of lports.
+
+    @param lswitch: name of the logical switch
+    @param key: lswitch ACL key, see lswitch_acl_keys_for_port()
+    @param lports: names of the logical ports sharing the ACL
+    @return: ACL dictionary
+    """
+    kind, direction, cidr = (key.split(':', 2) + [None])[:3]
+    portdir = 'inport' if direction == 'from-lport' else 'outport'
+    match = _lport_set_match(portdir, lports)
+    if kind == LSWITCH_ACL_DROP:
+        priority = ovn_const.ACL_PRIORITY_DROP
+        action = ovn_const.ACL_ACTION_DROP
+        match += ' && ip'
+    else:
+        priority = ovn_const.ACL_PRIORITY_ALLOW
+        action = ovn_const.ACL_ACTION_ALLOW
+        if direction == 'to-lport':
+            match += (' && ip4 && ip4.src == %s && '
+                      'udp && udp.src == 67 && udp.dst == 68') % cidr
+        else:
+            match += (' && ip4 && '
+                      '(ip4.dst == 255.255.255.255 || ip4.dst == %s) && '
+                      'udp && udp.src == 68 && udp.dst == 67') % cidr
+    return {"lswitch": lswitch,
+            "priority": priority,
+            "action": action,
+            "log": False,
+            "direction": direction,
+            "match": match,
+            "external_ids": {
+                ovn_const.OVN_LSWITCH_ACL_EXT_ID_KEY: key,
+                ovn_const.OVN_LSWITCH_ACL_LPORTS_EXT_ID_KEY:
+                ' '.join(sorted(lports))}}
+
+
+def _get_subnet_from_cache(plugin, admin_context, subnet_cache, subnet_id,
+                           shared_subnet_cache=None):
     if subnet_id in subnet_cache:
         return subnet_cache[subnet_id]
     else:
-        subnet = plugin.get_subnet(admin_context, subnet_id)
+        if shared_subnet_cache is not None:
+            subnet = shared_subnet_cache.get_subnet(plugin, admin_context,
+                                                    subnet_id)
+        else:
+            subnet = plugin.get_subnet(admin_context, subnet_id)
         if subnet:
             subnet_cache[subnet_id] = subnet
         return subnet
@@ -194,7 +221,8 @@ def _get_sg_from_cache(plugin, admin_context, sg_cache, sg_id):
 
 def _acl_remote_match_ip(plugin, admin_context,
                          sg_ports, subnet_cache,
-                         ip_version, src_or_dst):
+                         ip_version, src_or_dst,
+                         shared_subnet_cache=None):
     ip_version_map = {'ip4': 4,
                       'ip6': 6}
     match = ''
@@ -206,7 +234,8 @@ def _acl_remote_match_ip(plugin, admin_context,
             subnet = _get_subnet_from_cache(plugin,
                                             admin_context,
                                             subnet_cache,
-                                            fixed_ip['subnet_id'])
+                                            fixed_ip['subnet_id'],
+                                            shared_subnet_cache)
             if subnet['ip_version'] == ip_version_map.get(ip_version):
                 match += '%s.%s == %s || ' % (ip_version,
                                               src_or_dst,
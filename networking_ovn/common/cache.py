@@ -0,0 +1,249 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import time
+
+from oslo_log import log
+
+from neutron.callbacks import events
+from neutron.callbacks import registry
+from neutron.callbacks import resources
+from neutron.objects.qos import policy as qos_policy
+
+LOG = log.getLogger(__name__)
+
+SG_PORTS = 'sg_ports'
+SG_REFS = 'sg_refs'
+
+# Log the cache statistics every STATS_LOG_INTERVAL lookups.
+STATS_LOG_INTERVAL = 1000
+
+# Maximum number of subnets kept by SubnetCache.
+SUBNET_CACHE_SIZE = 10000
+# Subnet fields needed to render ACLs.
+SUBNET_FIELDS = ['id', 'ip_version', 'cidr']
+
+
+class SecurityGroupIndex(object):
+    """Index of security group memberships and references.
+
+    The index maps each security group to the bindings of its member ports
+    and to the security groups having rules that reference it as remote
+    group.  Entries are loaded from the Neutron DB on first use, and
+    reloaded once older than max_age seconds.  A max_age of 0 disables the
+    expiry.  The entries are shared by all tenants, so they are always
+    loaded with an elevated context.
+
+    Only neutron-ovn-db-sync-util uses it.  Nothing tells a neutron-server
+    process about the ports added by the other ones, and the remote group
+    ACLs rendered from a membership missing them would never be rendered
+    again, so neutron-server reads the memberships from the Neutron DB.
+    """
+
+    def __init__(self, max_age=0):
+        self._max_age = max_age
+        # {sg_id: (load time, {port_id: binding})}
+        self._sg_ports = {}
+        # {sg_id: (load time, set(referencing sg_ids))}
+        self._sg_refs = {}
+        self._stats = {SG_PORTS: {'hits': 0, 'misses': 0},
+                       SG_REFS: {'hits': 0, 'misses': 0}}
+        self._lookups = 0
+
+    def get_sg_ports(self, plugin, context, sg_id):
+        """Return the port security group bindings of a security group."""
+        def _load():
+            filters = {'security_group_id': [sg_id]}
+            bindings = plugin._get_port_security_group_bindings(
+                context.elevated(), filters)
+            return dict((b['port_id'], b) for b in bindings)
+
+        return list(self._lookup(SG_PORTS, self._sg_ports, sg_id,
+                                 _load).values())
+
+    def get_referencing_sgs(self, plugin, context, sg_id):
+        """Return the ids of the security groups referencing sg_id."""
+        def _load():
+            filters = {'remote_group_id': [sg_id]}
+            rules = plugin.get_security_group_rules(
+                context.elevated(), filters, fields=['security_group_id'])
+            return set(r['security_group_id'] for r in rules)
+
+        return set(self._lookup(SG_REFS, self._sg_refs, sg_id, _load))
+
+    def _lookup(self, name, entries, key, load):
+        self._lookups += 1
+        if self._lookups % STATS_LOG_INTERVAL == 0:
+            LOG.debug("Security group index statistics: %s",
+                      self.get_stats())
+
+        entry = entries.get(key)
+        if entry and not self._expired(entry[0]):
+            self._stats[name]['hits'] += 1
+            return entry[1]
+
+        self._stats[name]['misses'] += 1
+        value = load()
+        entries[key] = (time.time(), value)
+        return value
+
+    def _expired(self, load_time):
+        return bool(self._max_age) and (
+            time.time() - load_time > self._max_age)
+
+    def get_stats(self):
+        """Return the hits, misses, hit rate and size of each map."""
+        stats = {}
+        for name, entries in ((SG_PORTS, self._sg_ports),
+                              (SG_REFS, self._sg_refs)):
+            hits = self._stats[name]['hits']
+            lookups = hits + self._stats[name]['misses']
+            stats[name] = {'hits': hits,
+                           'misses': self._stats[name]['misses'],
+                           'hit_rate': float(hits) / lookups if lookups
+                           else 0.0,
+                           'entries': len(entries)}
+        return stats
+
+
+class SubnetCache(object):
+    """Process-wide LRU cache of the subnet fields used to render ACLs.
+
+    Rendering the ACLs of a port needs the IP version and CIDR of the
+    subnet of each of its fixed IPs, and of each fixed IP of every port
+    of its remote security groups.  Entries are evicted once more than
+    max_size subnets are cached, and dropped on subnet update and delete.
+    """
+
+    def __init__(self, max_size=SUBNET_CACHE_SIZE):
+        self._max_size = max_size
+        self._subnets = collections.OrderedDict()
+        self._generation = 0
+        self._hits = 0
+        self._misses = 0
+
+    def subscribe(self):
+        for event in (events.AFTER_UPDATE, events.AFTER_DELETE):
+            registry.subscribe(self._subnet_callback, resources.SUBNET,
+                               event)
+
+    def _subnet_callback(self, resource, event, trigger, **kwargs):
+        subnet = kwargs.get('subnet') or {}
+        subnet_id = kwargs.get('subnet_id') or subnet.get('id')
+        if subnet_id:
+            self.invalidate(subnet_id)
+
+    def invalidate(self, subnet_id):
+        self._generation += 1
+        self._subnets.pop(subnet_id, None)
+
+    def get_subnet(self, plugin, context, subnet_id):
+        """Return the id, ip_version and cidr of a subnet."""
+        subnet = self._subnets.pop(subnet_id, None)
+        if subnet is not None:
+            self._hits += 1
+            self._subnets[subnet_id] = subnet
+            return subnet
+
+        self._misses += 1
+        generation = self._generation
+        subnet = plugin.get_subnet(context.elevated(), subnet_id,
+                                   fields=SUBNET_FIELDS)
+        if subnet and generation == self._generation:
+            self._subnets[subnet_id] = subnet
+            while len(self._subnets) > self._max_size:
+                self._subnets.popitem(last=False)
+        return subnet
+
+    def get_stats(self):
+        """Return the hits, misses, hit rate and size of the cache."""
+        lookups = self._hits + self._misses
+        return {'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': float(self._hits) / lookups if lookups else 0.0,
+                'entries': len(self._subnets)}
+
+
+class QosOptionsCache(object):
+    """Cache of the OVN options rendered from QoS policies.
+
+    Resolving the QoS options of a port needs the policy of its network
+    and the rules of its own policy and of its network policy.  The rules
+    and rendered options of each policy are cached, and the policy of
+    each network, until dropped by invalidate_network.  The options are
+    rendered from the rules by the render function given.
+
+    Nothing tells the neutron-server API workers about the policies and
+    network policies changed by the other processes, so neutron-server
+    only uses a cache for the duration of a request, e.g. to set the QoS
+    options of all the ports of a policy at once.
+    """
+
+    def __init__(self, render):
+        self._render = render
+        # {policy_id: (rules, options)}
+        self._policies = {}
+        # {network_id: policy_id}
+        self._network_policies = {}
+        self._hits = 0
+        self._misses = 0
+
+    def invalidate_network(self, network_id):
+        self._network_policies.pop(network_id, None)
+
+    def get_policy(self, context, policy_id):
+        """Return the rules and OVN options of a policy.
+
+        @return: (rules, options), ([], {}) if the policy does not exist
+        """
+        entry = self._policies.get(policy_id)
+        if entry:
+            self._hits += 1
+            return entry
+
+        self._misses += 1
+        policy = qos_policy.QosPolicy.get_object(context.elevated(),
+                                                 id=policy_id)
+        if policy is None:
+            return [], {}
+        return self._store_policy(policy)
+
+    def get_network_policy_id(self, context, network_id):
+        """Return the id of the QoS policy of a network, None if none."""
+        if network_id in self._network_policies:
+            self._hits += 1
+            return self._network_policies[network_id]
+
+        self._misses += 1
+        policy = qos_policy.QosPolicy.get_network_policy(context.elevated(),
+                                                         network_id)
+        policy_id = policy.id if policy else None
+        if policy is not None:
+            # The policy comes with its rules, cache them along.
+            self._store_policy(policy)
+        self._network_policies[network_id] = policy_id
+        return policy_id
+
+    def _store_policy(self, policy):
+        rules = list(policy.rules)
+        options = self._render(rules)
+        self._policies[policy.id] = (rules, options)
+        return rules, options
+
+    def get_stats(self):
+        """Return the hits, misses, hit rate and size of the cache."""
+        lookups = self._hits + self._misses
+        return {'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': float(self._hits) / lookups if lookups else 0.0,
+                'entries': len(self._policies) + len(self._network_policies)}
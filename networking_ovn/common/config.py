@@ -54,7 +54,133 @@ ovn_opts = [
     cfg.StrOpt("vhost_sock_dir",
                default="/var/run/openvswitch",
                help=_("The directory in which vhost virtio socket "
-                      "is created by all the vswitch daemons"))
+                      "is created by all the vswitch daemons")),
+    cfg.IntOpt('sync_transaction_size',
+               default=500,
+               min=1,
+               help=_('Maximum number of OVN NB DB changes committed in a '
+                      'single transaction when repairing the OVN NB DB '
+                      'from the Neutron DB.')),
+    cfg.BoolOpt('sync_bulk_rebuild',
+                default=False,
+                help=_('Whether to create all the networks and ports '
+                       'missing in the OVN NB DB in batched transactions '
+                       'when repairing it, instead of one by one. Faster '
+                       'when many resources are missing, e.g. when '
+                       'rebuilding an empty OVN NB DB.')),
+    cfg.IntOpt('sync_digest_interval',
+               default=0,
+               min=0,
+               help=_('Interval in seconds between two checks of the '
+                      'digests of the networks, which find the networks '
+                      'whose Neutron or OVN NB DB content changed since '
+                      'they were last found in sync, and compare and '
+                      'repair only these ones according to '
+                      'neutron_sync_mode. 0 disables the check.')),
+    cfg.StrOpt('sync_report_file',
+               help=_('File the JSON report of each OVN NB DB sync run is '
+                      'written to, with the duration and DB query count '
+                      'of each phase, the OVN transactions and the count '
+                      'and sample ids of each kind of discrepancy found. '
+                      'The report is logged in any case.')),
+    cfg.IntOpt('qos_transaction_size',
+               default=500,
+               min=1,
+               help=_('Maximum number of logical ports whose QoS options '
+                      'are set in a single OVN NB DB transaction, when the '
+                      'rules of a QoS policy or the policy of a network '
+                      'change.')),
+    cfg.IntOpt('ovsdb_critical_concurrency',
+               default=2,
+               min=1,
+               help=_('Maximum number of OVN NB DB transactions handed at '
+                      'once to the OVN NB DB connection, which commits them '
+                      'one at a time. Latency critical transactions, e.g. '
+                      'creating a port, may use all of them.')),
+    cfg.IntOpt('ovsdb_bulk_concurrency',
+               default=1,
+               min=1,
+               help=_('Maximum number of bulk OVN NB DB transactions, e.g. '
+                      'security group or QoS fan-outs and sync repairs, '
+                      'handed at once to the OVN NB DB connection. Kept '
+                      'below ovsdb_critical_concurrency, a latency critical '
+                      'transaction never waits behind more than the one '
+                      'being committed.')),
+    cfg.BoolOpt('ovsdb_native_thread',
+                default=False,
+                help=_('Whether neutron-server receives, parses and applies '
+                       'the OVN NB DB updates on a native thread, instead '
+                       'of a greenthread, so that large updates, e.g. the '
+                       'initial dump of the database, do not hold the '
+                       'handling of API requests.')),
+    cfg.StrOpt('ovsdb_schema_cache_dir',
+               help=_('Directory where the OVN NB DB schema is cached, so '
+                      'that the neutron-server workers start their OVN NB '
+                      'DB connection without fetching the schema from the '
+                      'ovsdb-server. The OVN worker updates the cache when '
+                      'the version of the schema changes.')),
+    cfg.BoolOpt('request_accounting',
+                default=False,
+                mutable=True,
+                help=_('Whether to log, for each API request, the number of '
+                       'OVN NB DB transactions and commands, OVN rows '
+                       'scanned and Neutron DB queries it triggered, and '
+                       'the time it spent in OVN. Can be changed without '
+                       'restarting neutron-server, by reloading its '
+                       'configuration.')),
+    cfg.FloatOpt('notify_lag_warning',
+                 default=30.0,
+                 help=_('Time in seconds from the reception of an OVN NB DB '
+                        'notification, e.g. a logical port going up, to the '
+                        'start of its handling, beyond which a warning is '
+                        'logged. Lags that long mean the handling of the '
+                        'notifications cannot keep up, e.g. after a chassis '
+                        'reboot.')),
+    cfg.IntOpt('notify_workers',
+               default=4,
+               min=1,
+               help=_('Number of OVN NB DB notifications, e.g. logical '
+                      'ports going up, handled concurrently. The '
+                      'notifications of a row are handled in order.')),
+    cfg.IntOpt('notify_queue_warning',
+               default=1000,
+               min=1,
+               help=_('Number of OVN NB DB notifications queued for a '
+                      'notify worker beyond which a warning is logged. The '
+                      'queues are not bounded: the OVN NB DB connection, '
+                      'which commits the transactions of the notify '
+                      'workers, never waits for them.')),
+    cfg.StrOpt('stats_dump_dir',
+               help=_('Directory where each neutron-server process writes '
+                      'its networking-ovn statistics, OVSDB command and '
+                      'transaction latency histograms among them, as '
+                      'networking-ovn-stats-<pid>.json, when sent SIGUSR1. '
+                      'They are logged in any case.')),
+    cfg.BoolOpt('journal_mode',
+                default=False,
+                help=_('Whether the ML2 mechanism driver records the OVN '
+                       'NB DB changes of networks and ports in a journal '
+                       'table of the Neutron DB, within the transaction of '
+                       'the Neutron change, to be replayed asynchronously '
+                       'by the OVN worker, instead of writing them to the '
+                       'OVN NB DB before answering the API request.')),
+    cfg.IntOpt('journal_workers',
+               default=4,
+               min=1,
+               help=_('Number of networks whose journaled changes are '
+                      'replayed concurrently. The changes of a network '
+                      'and its ports are replayed in order.')),
+    cfg.IntOpt('journal_max_retries',
+               default=5,
+               min=0,
+               help=_('Number of times the replay of a journaled change is '
+                      'retried before it is marked failed, leaving the '
+                      'resource for the OVN NB DB sync to repair.')),
+    cfg.FloatOpt('journal_poll_interval',
+                 default=1.0,
+                 help=_('Interval in seconds between two checks of the '
+                        'journal for changes to replay, when none was '
+                        'found.')),
 ]
 
 cfg.CONF.register_opts(ovn_opts, group='ovn')
@@ -88,3 +214,75 @@ def get_ovn_vif_type():
 
 def get_ovn_vhost_sock_dir():
     return cfg.CONF.ovn.vhost_sock_dir
+
+
+def get_ovn_sync_transaction_size():
+    return cfg.CONF.ovn.sync_transaction_size
+
+
+def is_ovn_sync_bulk_rebuild():
+    return cfg.CONF.ovn.sync_bulk_rebuild
+
+
+def get_ovn_sync_digest_interval():
+    return cfg.CONF.ovn.sync_digest_interval
+
+
+def get_ovn_sync_report_file():
+    return cfg.CONF.ovn.sync_report_file
+
+
+def get_ovn_qos_transaction_size():
+    return cfg.CONF.ovn.qos_transaction_size
+
+
+def is_ovn_journal_mode():
+    return cfg.CONF.ovn.journal_mode
+
+
+def get_ovn_journal_workers():
+    return cfg.CONF.ovn.journal_workers
+
+
+def get_ovn_journal_max_retries():
+    return cfg.CONF.ovn.journal_max_retries
+
+
+def get_ovn_journal_poll_interval():
+    return cfg.CONF.ovn.journal_poll_interval
+
+
+def get_ovn_ovsdb_critical_concurrency():
+    return cfg.CONF.ovn.ovsdb_critical_concurrency
+
+
+def get_ovn_ovsdb_bulk_concurrency():
+    return cfg.CONF.ovn.ovsdb_bulk_concurrency
+
+
+def is_ovn_ovsdb_native_thread():
+    return cfg.CONF.ovn.ovsdb_native_thread
+
+
+def get_ovn_ovsdb_schema_cache_dir():
+    return cfg.CONF.ovn.ovsdb_schema_cache_dir
+
+
+def is_ovn_request_accounting():
+    return cfg.CONF.ovn.request_accounting
+
+
+def get_ovn_stats_dump_dir():
+    return cfg.CONF.ovn.stats_dump_dir
+
+
+def get_ovn_notify_lag_warning():
+    return cfg.CONF.ovn.notify_lag_warning
+
+
+def get_ovn_notify_workers():
+    return cfg.CONF.ovn.notify_workers
+
+
+def get_ovn_notify_queue_warning():
+    return cfg.CONF.ovn.notify_queue_warning
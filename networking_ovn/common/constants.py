@@ -19,6 +19,11 @@ OVN_ROUTER_NAME_EXT_ID_KEY = 'neutron:router_name'
 OVN_PHYSNET_EXT_ID_KEY = 'neutron:provnet-physical-network'
 OVN_NETTYPE_EXT_ID_KEY = 'neutron:provnet-network-type'
 OVN_SEGID_EXT_ID_KEY = 'neutron:provnet-segmentation-id'
+OVN_LSWITCH_ACL_EXT_ID_KEY = 'neutron:lswitch_acl'
+OVN_LSWITCH_ACL_LPORTS_EXT_ID_KEY = 'neutron:lports'
+OVN_NEUTRON_DIGEST_EXT_ID_KEY = 'neutron:neutron_digest'
+OVN_NB_DIGEST_EXT_ID_KEY = 'neutron:nb_digest'
+OVN_REV_NUM_EXT_ID_KEY = 'neutron:revision_number'
 OVN_PORT_BINDING_PROFILE = portbindings.PROFILE
 OVN_PORT_BINDING_PROFILE_PARAMS = [{'parent_name': six.string_types,
                                     'tag': six.integer_types},
@@ -36,3 +41,19 @@ ACL_PRIORITY_DROP = 1001
 ACL_ACTION_DROP = 'drop'
 ACL_ACTION_ALLOW_RELATED = 'allow-related'
 ACL_ACTION_ALLOW = 'allow'
+
+# States of the rows of the OVN journal.
+JOURNAL_STATE_PENDING = 'pending'
+JOURNAL_STATE_PROCESSING = 'processing'
+JOURNAL_STATE_FAILED = 'failed'
+
+# Resources and operations recorded in the OVN journal.
+JOURNAL_TYPE_NETWORK = 'network'
+JOURNAL_TYPE_PORT = 'port'
+JOURNAL_OP_CREATE = 'create'
+JOURNAL_OP_UPDATE = 'update'
+JOURNAL_OP_DELETE = 'delete'
+
+# Priority classes of the OVN NB DB transactions.
+TXN_PRIORITY_CRITICAL = 'critical'
+TXN_PRIORITY_BULK = 'bulk'
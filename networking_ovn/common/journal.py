@@ -0,0 +1,185 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import time
+
+from eventlet import greenpool
+from eventlet import greenthread
+from oslo_log import log
+
+from neutron import context as n_context
+
+from networking_ovn._i18n import _LE, _LI, _LW
+from networking_ovn.common import config
+from networking_ovn.common import constants as ovn_const
+from networking_ovn.common import stats
+from networking_ovn.db import journal as journal_db
+
+LOG = log.getLogger(__name__)
+
+# Maximum number of rows claimed at once.
+CLAIM_SIZE = 100
+# Rows processing for longer than this many seconds were left by a process
+# which died while replaying them, and are set back to pending.
+STALE_ROW_AGE = 600
+# Interval in seconds between two logs of the journal statistics.
+STATS_LOG_INTERVAL = 60
+# Maximum delay in seconds between two retries of a row.
+MAX_RETRY_DELAY = 30
+
+
+def record(context, object_type, operation, resource, original=None):
+    """Record an OVN NB DB change, in the DB transaction of the context.
+
+    @param context: neutron context of the Neutron change
+    @type  context: neutron.context.Context
+    @param object_type: JOURNAL_TYPE_NETWORK or JOURNAL_TYPE_PORT
+    @type  object_type: string
+    @param operation: JOURNAL_OP_CREATE, JOURNAL_OP_UPDATE or
+                      JOURNAL_OP_DELETE
+    @type  operation: string
+    @param resource: the network or port
+    @type  resource: {}
+    @param original: the network or port before an update
+    @type  original: {}
+    @return: Nothing
+    """
+    if object_type == ovn_const.JOURNAL_TYPE_NETWORK:
+        network_id = resource['id']
+    else:
+        network_id = resource['network_id']
+    journal_db.create_pending_row(
+        context.session, object_type, resource['id'], network_id, operation,
+        {'resource': resource, 'original': original})
+
+
+class OvnJournal(object):
+    """Replays the OVN NB DB changes recorded in the journal.
+
+    Run by the OVN worker.  A dispatcher green thread claims the oldest
+    pending rows and hands the rows of each network to a pool of
+    [ovn] journal_workers green threads, which replay them in order with
+    the handler of their resource type and operation.  A failing row is
+    retried with an increasing delay, holding back the next rows of its
+    network, and marked failed after [ovn] journal_max_retries retries.
+    """
+
+    def __init__(self, handlers):
+        # {(object_type, operation): function(resource, original)}
+        self._handlers = handlers
+        self._pool = greenpool.GreenPool(config.get_ovn_journal_workers())
+        self._counters = {'replayed': 0, 'retried': 0, 'failed': 0}
+        self._last_stats_log = time.time()
+
+    def start(self):
+        LOG.info(_LI("Starting the OVN journal replay"))
+        stats.register_provider('journal', self.get_stats)
+        greenthread.spawn_n(self._run)
+
+    def _run(self):
+        interval = config.get_ovn_journal_poll_interval()
+        while True:
+            try:
+                claimed = self._dispatch()
+                if time.time() - self._last_stats_log > STATS_LOG_INTERVAL:
+                    self._last_stats_log = time.time()
+                    self._maintain()
+            except Exception:
+                LOG.exception(_LE("OVN journal dispatch failed"))
+                claimed = False
+            if not claimed:
+                greenthread.sleep(interval)
+
+    def _dispatch(self):
+        """Claim pending rows and replay them, a green thread per network.
+
+        @return: True if rows were claimed
+        """
+        context = n_context.get_admin_context()
+        rows = journal_db.claim_pending_rows(context.session, CLAIM_SIZE)
+        rows_by_network = collections.OrderedDict()
+        for row in rows:
+            rows_by_network.setdefault(row['network_id'], []).append(row)
+        for network_rows in rows_by_network.values():
+            # Blocks while all the workers are busy.
+            self._pool.spawn_n(self._replay, network_rows)
+        return bool(rows)
+
+    def _replay(self, rows):
+        context = n_context.get_admin_context()
+        for index, row in enumerate(rows):
+            try:
+                self._replay_row(context, row)
+            except Exception:
+                LOG.exception(_LE("Unable to replay the OVN journal rows of "
+                                  "network %s"), row['network_id'])
+                journal_db.release_rows(
+                    context.session, [r['seqnum'] for r in rows[index:]])
+                return
+
+    def _replay_row(self, context, row):
+        handler = self._handlers.get((row['object_type'], row['operation']))
+        if handler is None:
+            LOG.error(_LE("No OVN journal handler to %(operation)s a "
+                          "%(type)s"), {'operation': row['operation'],
+                                        'type': row['object_type']})
+            journal_db.fail_row(context.session, row['seqnum'])
+            self._counters['failed'] += 1
+            return
+
+        retry_count = row['retry_count']
+        max_retries = config.get_ovn_journal_max_retries()
+        while True:
+            try:
+                handler(row['data']['resource'], row['data']['original'])
+                break
+            except Exception as e:
+                retry_count += 1
+                if retry_count > max_retries:
+                    LOG.exception(_LE("Unable to %(operation)s %(type)s "
+                                      "%(id)s in OVN, giving up"),
+                                  {'operation': row['operation'],
+                                   'type': row['object_type'],
+                                   'id': row['object_uuid']})
+                    journal_db.fail_row(context.session, row['seqnum'])
+                    self._counters['failed'] += 1
+                    return
+                LOG.warning(_LW("Unable to %(operation)s %(type)s %(id)s in "
+                                "OVN, retry %(retry)d: %(error)s"),
+                            {'operation': row['operation'],
+                             'type': row['object_type'],
+                             'id': row['object_uuid'],
+                             'retry': retry_count, 'error': e})
+                journal_db.update_retry_count(context.session, row['seqnum'],
+                                              retry_count)
+                self._counters['retried'] += 1
+                greenthread.sleep(min(2 ** (retry_count - 1),
+                                      MAX_RETRY_DELAY))
+        journal_db.delete_row(context.session, row['seqnum'])
+        self._counters['replayed'] += 1
+
+    def _maintain(self):
+        context = n_context.get_admin_context()
+        reset = journal_db.reset_stale_rows(context.session, STALE_ROW_AGE)
+        if reset:
+            LOG.warning(_LW("Set %d stale OVN journal rows back to "
+                            "pending"), reset)
+        stats = self.get_stats()
+        if stats['depth'] or stats['failed']:
+            LOG.info(_LI("OVN journal statistics: %s"), stats)
+
+    def get_stats(self):
+        """Return the depth, lag and replay counters of the journal."""
+        stats = journal_db.get_stats(n_context.get_admin_context().session)
+        stats.update(self._counters)
+        return stats
@@ -0,0 +1,174 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import bisect
+import collections
+import os
+import signal
+import time
+
+from eventlet import greenthread
+from oslo_log import log
+from oslo_serialization import jsonutils
+import six
+
+from networking_ovn._i18n import _LE, _LI
+from networking_ovn.common import config
+
+LOG = log.getLogger(__name__)
+
+# Upper bounds of the buckets of the latency histograms, in seconds.
+LATENCY_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5,
+                   1, 2, 5, 10)
+# Upper bounds of the buckets of the size histograms, in bytes.
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+# Signal making a process dump its statistics.
+DUMP_SIGNAL = signal.SIGUSR1
+
+# {name: {key: Histogram}}
+_histograms = collections.defaultdict(dict)
+# {name: {key: count}}
+_counters = collections.defaultdict(lambda: collections.defaultdict(int))
+# {name: function returning the statistics of a component}
+_providers = {}
+_started_at = time.time()
+_signal_handler_installed = False
+
+
+class Histogram(object):
+    """Distribution of values among fixed buckets.
+
+    Observing a value only increments counters, the percentiles given by
+    to_dict are the upper bounds of the buckets they fall in.
+    """
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    def observe(self, value):
+        self.buckets[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, percent):
+        if not self.count:
+            return 0
+        rank = self.count * percent / 100.0
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                break
+        return self.bounds[index] if index < len(self.bounds) else self.max
+
+    def to_dict(self):
+        buckets = dict(('le_%s' % bound, count) for bound, count in
+                       zip(self.bounds, self.buckets) if count)
+        if self.buckets[-1]:
+            buckets['inf'] = self.buckets[-1]
+        return {'count': self.count,
+                'sum': self.sum,
+                'max': self.max,
+                'p50': self.percentile(50),
+                'p90': self.percentile(90),
+                'p99': self.percentile(99),
+                'buckets': buckets}
+
+
+def observe(name, key, value, bounds=LATENCY_BUCKETS):
+    """Add a value to the histogram of name and key, e.g. a latency.
+
+    @param name: what is measured, e.g. command_run_idl
+    @type  name: string
+    @param key: what it is measured for, e.g. a command class or table
+    @type  key: string
+    @param bounds: upper bounds of the buckets of a new histogram
+    @type  bounds: tuple
+    @return: Nothing
+    """
+    histograms = _histograms[name]
+    histogram = histograms.get(key)
+    if histogram is None:
+        histogram = histograms.setdefault(key, Histogram(bounds))
+    histogram.observe(value)
+
+
+def incr(name, key, value=1):
+    _counters[name][key] += value
+
+
+def register_provider(name, get_stats):
+    """Include the statistics returned by get_stats() in the dumps."""
+    _providers[name] = get_stats
+
+
+def get_stats():
+    result = {'pid': os.getpid(),
+              'uptime': time.time() - _started_at,
+              'histograms': dict(
+                  (name, dict((key, histogram.to_dict())
+                              for key, histogram in
+                              six.iteritems(dict(histograms))))
+                  for name, histograms in six.iteritems(dict(_histograms))),
+              'counters': dict(
+                  (name, dict(counters))
+                  for name, counters in six.iteritems(dict(_counters)))}
+    for name, get_provider_stats in six.iteritems(dict(_providers)):
+        try:
+            result[name] = get_provider_stats()
+        except Exception:
+            LOG.exception(_LE("Unable to get the %s statistics"), name)
+    return result
+
+
+def dump():
+    """Log the statistics, and write them to [ovn] stats_dump_dir if set."""
+    stats = jsonutils.dumps(get_stats(), sort_keys=True)
+    LOG.info(_LI("networking-ovn statistics: %s"), stats)
+    dump_dir = config.get_ovn_stats_dump_dir()
+    if not dump_dir:
+        return
+    path = os.path.join(dump_dir,
+                        'networking-ovn-stats-%d.json' % os.getpid())
+    try:
+        # Write then rename, readers must not see a truncated dump.
+        with open(path + '.tmp', 'w') as f:
+            f.write(stats)
+        os.rename(path + '.tmp', path)
+    except (IOError, OSError) as e:
+        LOG.error(_LE("Unable to write the networking-ovn statistics to "
+                      "%(path)s: %(error)s"), {'path': path, 'error': e})
+
+
+def _handle_dump_signal(signo, frame):
+    # Not dumped from the signal handler, which may have interrupted a
+    # thread holding a lock needed to get the statistics.
+    greenthread.spawn_n(dump)
+
+
+def install_signal_handler():
+    """Dump the statistics of the process when sent DUMP_SIGNAL.
+
+    Installed before neutron-server forks its workers, so that each of
+    them dumps its own statistics, and the parent process is not killed
+    by the signal.
+    """
+    global _signal_handler_installed
+    if not _signal_handler_installed:
+        signal.signal(DUMP_SIGNAL, _handle_dump_signal)
+        _signal_handler_installed = True
@@ -0,0 +1,217 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import resource
+import time
+
+from eventlet import greenthread
+from oslo_log import log
+from oslo_serialization import jsonutils
+import six
+
+from networking_ovn._i18n import _LI, _LW
+from networking_ovn.common import config
+
+LOG = log.getLogger(__name__)
+
+# Number of ids kept as samples for each kind of discrepancy.
+SAMPLE_SIZE = 10
+# Number of discrepancies of each kind logged one by one, the others are
+# only counted in the report.
+LOG_LIMIT = 20
+
+PHASE_RUNNING = 'running'
+PHASE_SUCCEEDED = 'succeeded'
+PHASE_FAILED = 'failed'
+PHASE_SKIPPED = 'skipped'
+# The status of merged phases is the worst of the merged ones.
+PHASE_STATUS_ORDER = (PHASE_SUCCEEDED, PHASE_SKIPPED, PHASE_RUNNING,
+                      PHASE_FAILED)
+
+
+class SyncReport(object):
+    """Timings, counters and findings of an OVN NB sync run.
+
+    Discrepancies are counted by category, with the ids of the first ones
+    as samples, and only the first log_limit ones of each category are
+    logged.  DB queries are counted per phase by count_query, to be
+    registered as SQLAlchemy before_cursor_execute listener; phases run on
+    their own green thread, which tells them apart.
+
+    The time to the first comparison of NB and Neutron resources, recorded
+    by mark_comparison, is counted from process_started_at when given, so
+    that it includes the startup of the process syncing.  The peak RSS of
+    the process syncing is recorded when the run finishes.
+    """
+
+    def __init__(self, mode, sample_size=SAMPLE_SIZE, log_limit=LOG_LIMIT,
+                 process_started_at=None):
+        self.mode = mode
+        self.sample_size = sample_size
+        self.log_limit = log_limit
+        self.started_at = time.time()
+        self.process_started_at = process_started_at or self.started_at
+        self.first_comparison_at = None
+        self.duration = None
+        self.peak_rss = None
+        self.phases = {}
+        self.transactions = {'count': 0, 'commands': 0, 'max_commands': 0,
+                             'duration': 0.0}
+        self.discrepancies = {}
+        self._phase_threads = {}
+
+    def start_phase(self, phase):
+        self.phases[phase] = {'status': PHASE_RUNNING, 'duration': 0.0,
+                              'db_queries': 0}
+        self._phase_threads[id(greenthread.getcurrent())] = phase
+
+    def end_phase(self, phase, status, duration=0.0):
+        stats = self.phases.setdefault(phase, {'db_queries': 0})
+        stats['status'] = status
+        stats['duration'] = round(duration, 3)
+        self._phase_threads.pop(id(greenthread.getcurrent()), None)
+
+    def count_query(self, *args, **kwargs):
+        phase = self._phase_threads.get(id(greenthread.getcurrent()))
+        if phase is not None:
+            self.phases[phase]['db_queries'] += 1
+
+    def add_transaction(self, num_commands, duration):
+        self.transactions['count'] += 1
+        self.transactions['commands'] += num_commands
+        self.transactions['max_commands'] = max(
+            self.transactions['max_commands'], num_commands)
+        self.transactions['duration'] += duration
+
+    def mark_comparison(self):
+        if self.first_comparison_at is None:
+            self.first_comparison_at = time.time()
+
+    def add_discrepancy(self, category, resource_id, message=None, *args):
+        """Record a resource found out of sync.
+
+        @param category: kind of discrepancy, e.g. port_missing_in_ovn
+        @type  category: string
+        @param resource_id: id of the resource out of sync
+        @type  resource_id: string
+        @param message: warning to log, formatted with args or else with
+                        resource_id, None to only count the discrepancy
+        @type  message: string
+        @return: Nothing
+        """
+        entry = self.discrepancies.setdefault(category,
+                                              {'count': 0, 'samples': []})
+        entry['count'] += 1
+        if len(entry['samples']) < self.sample_size:
+            entry['samples'].append(resource_id)
+        if message and entry['count'] <= self.log_limit:
+            LOG.warning(message, *(args or (resource_id,)))
+
+    def finish(self):
+        """Log how many discrepancies were not logged one by one."""
+        self.duration = time.time() - self.started_at
+        # In KiB on Linux.  The reports of the workers may be merged first.
+        self.peak_rss = max(
+            self.peak_rss or 0,
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+        for category, entry in sorted(six.iteritems(self.discrepancies)):
+            if entry['count'] > self.log_limit:
+                LOG.warning(_LW("OVN-NB Sync found %(count)d %(category)s "
+                                "discrepancies, only the first %(limit)d "
+                                "were logged"),
+                            {'count': entry['count'], 'category': category,
+                             'limit': self.log_limit})
+
+    def merge(self, report):
+        """Add the counters of the report of another sync run.
+
+        Used to gather the reports of the workers of a sharded sync: the
+        phases of the workers ran in parallel, so a merged phase lasts as
+        long as the longest of them.
+
+        @param report: report of the other run, as returned by to_dict
+        @type  report: {}
+        @return: Nothing
+        """
+        for phase, stats in six.iteritems(report['phases']):
+            merged = self.phases.setdefault(
+                phase, {'status': PHASE_SUCCEEDED, 'duration': 0.0,
+                        'db_queries': 0})
+            merged['status'] = max(merged['status'], stats['status'],
+                                   key=PHASE_STATUS_ORDER.index)
+            merged['duration'] = max(merged['duration'], stats['duration'])
+            merged['db_queries'] += stats['db_queries']
+        for key in ('count', 'commands', 'duration'):
+            self.transactions[key] += report['transactions'][key]
+        self.transactions['max_commands'] = max(
+            self.transactions['max_commands'],
+            report['transactions']['max_commands'])
+        for category, entry in six.iteritems(report['discrepancies']):
+            merged = self.discrepancies.setdefault(
+                category, {'count': 0, 'samples': []})
+            merged['count'] += entry['count']
+            merged['samples'].extend(
+                entry['samples'][:self.sample_size - len(merged['samples'])])
+        # The workers run in their own process, the largest one is kept.
+        if report.get('peak_rss_kib') is not None:
+            self.peak_rss = max(self.peak_rss or 0, report['peak_rss_kib'])
+        # The other run started from the same process_started_at.
+        if report.get('time_to_first_comparison') is not None:
+            compared_at = (self.process_started_at +
+                           report['time_to_first_comparison'])
+            if (self.first_comparison_at is None or
+                    compared_at < self.first_comparison_at):
+                self.first_comparison_at = compared_at
+
+    def to_dict(self):
+        transactions = dict(self.transactions)
+        transactions['duration'] = round(transactions['duration'], 3)
+        time_to_first_comparison = None
+        if self.first_comparison_at is not None:
+            time_to_first_comparison = round(
+                self.first_comparison_at - self.process_started_at, 3)
+        return {'mode': self.mode,
+                'started_at': self.started_at,
+                'startup_duration': round(
+                    self.started_at - self.process_started_at, 3),
+                'time_to_first_comparison': time_to_first_comparison,
+                'duration': (round(self.duration, 3)
+                             if self.duration is not None else None),
+                'peak_rss_kib': self.peak_rss,
+                'phases': self.phases,
+                'transactions': transactions,
+                'discrepancies': self.discrepancies,
+                'total_discrepancies': sum(
+                    entry['count']
+                    for entry in six.itervalues(self.discrepancies))}
+
+    def emit(self):
+        """Log the report, and write it to [ovn] sync_report_file if set."""
+        LOG.info(_LI("OVN-NB Sync report: %s"),
+                 jsonutils.dumps(self.to_dict(), sort_keys=True))
+        report_file = config.get_ovn_sync_report_file()
+        if not report_file:
+            return
+        try:
+            self.write(report_file)
+        except (IOError, OSError) as e:
+            LOG.warning(_LW("Unable to write the OVN-NB Sync report to "
+                            "%(file)s: %(error)s"),
+                        {'file': report_file, 'error': e})
+
+    def write(self, path):
+        # Write then rename, readers must not see a truncated report.
+        tmp_file = path + '.tmp'
+        with open(tmp_file, 'w') as f:
+            jsonutils.dump(self.to_dict(), f, sort_keys=True, indent=2)
+        os.rename(tmp_file, path)
@@ -10,9 +10,13 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import hashlib
 import os
 
 from neutron_lib import constants as const
+from oslo_serialization import jsonutils
+
+from networking_ovn.common import constants as ovn_const
 
 
 def ovn_name(id):
@@ -42,3 +46,25 @@ def ovn_vhu_sockpath(sock_dir, port_id):
         # this parameter will become the virtio port name,
         # so it should not exceed IFNAMSIZ(16).
         (const.VHOST_USER_DEVICE_PREFIX + port_id)[:14])
+
+
+def get_revision_number(resource):
+    # The revision_number standard attribute is only there when the
+    # revisions service plugin is loaded.
+    return resource.get('revision_number')
+
+
+def stamp_revision_number(ext_ids, resource):
+    # Record in the external_ids of an OVN row the revision of the Neutron
+    # resource it is rendered from.
+    revision = get_revision_number(resource)
+    if revision is not None:
+        ext_ids[ovn_const.OVN_REV_NUM_EXT_ID_KEY] = str(revision)
+    return ext_ids
+
+
+def digest(*items):
+    # A digest of JSON serializable items which does not depend on the
+    # order of the keys of their dicts.
+    data = jsonutils.dumps(items, sort_keys=True)
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
@@ -0,0 +1,141 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import datetime
+
+from oslo_serialization import jsonutils
+from oslo_utils import timeutils
+import sqlalchemy as sa
+
+from networking_ovn.common import constants as ovn_const
+from networking_ovn.db import models
+
+
+def create_pending_row(session, object_type, object_uuid, network_id,
+                       operation, data):
+    """Record an OVN operation in the current transaction of session.
+
+    @param network_id: network the operation is replayed in order with
+    @type  network_id: string
+    @param data: JSON serializable data of the operation
+    @type  data: {}
+    @return: Nothing
+    """
+    with session.begin(subtransactions=True):
+        session.add(models.OVNJournal(
+            object_type=object_type, object_uuid=object_uuid,
+            network_id=network_id, operation=operation,
+            data=jsonutils.dumps(data)))
+
+
+def claim_pending_rows(session, limit):
+    """Claim the oldest pending rows of the networks not being replayed.
+
+    The rows claimed are set processing.  The rows of a network are only
+    claimed when none of them is processing, and as the oldest rows are
+    claimed first, they are always claimed in order.
+
+    @param limit: maximum number of rows claimed
+    @type  limit: int
+    @return: list of dicts of the rows claimed, in seqnum order
+    """
+    journal = models.OVNJournal
+    with session.begin(subtransactions=True):
+        busy = session.query(journal.network_id).filter(
+            journal.state == ovn_const.JOURNAL_STATE_PROCESSING)
+        rows = (session.query(journal).
+                filter(journal.state == ovn_const.JOURNAL_STATE_PENDING).
+                filter(~journal.network_id.in_(busy.subquery())).
+                order_by(journal.seqnum).limit(limit).
+                with_for_update().all())
+        now = timeutils.utcnow()
+        for row in rows:
+            row.state = ovn_const.JOURNAL_STATE_PROCESSING
+            row.updated_at = now
+        return [_make_row_dict(row) for row in rows]
+
+
+def _make_row_dict(row):
+    return {'seqnum': row.seqnum,
+            'object_type': row.object_type,
+            'object_uuid': row.object_uuid,
+            'network_id': row.network_id,
+            'operation': row.operation,
+            'data': jsonutils.loads(row.data),
+            'retry_count': row.retry_count,
+            'created_at': row.created_at}
+
+
+def _update_rows(session, seqnums, **values):
+    if not seqnums:
+        return
+    values['updated_at'] = timeutils.utcnow()
+    with session.begin(subtransactions=True):
+        session.query(models.OVNJournal).filter(
+            models.OVNJournal.seqnum.in_(seqnums)).update(
+                values, synchronize_session=False)
+
+
+def delete_row(session, seqnum):
+    with session.begin(subtransactions=True):
+        session.query(models.OVNJournal).filter_by(seqnum=seqnum).delete()
+
+
+def update_retry_count(session, seqnum, retry_count):
+    _update_rows(session, [seqnum], retry_count=retry_count)
+
+
+def fail_row(session, seqnum):
+    _update_rows(session, [seqnum], state=ovn_const.JOURNAL_STATE_FAILED)
+
+
+def release_rows(session, seqnums):
+    """Set claimed rows back to pending."""
+    _update_rows(session, seqnums, state=ovn_const.JOURNAL_STATE_PENDING)
+
+
+def reset_stale_rows(session, max_age):
+    """Set back to pending the rows processing for over max_age seconds.
+
+    Rows are only left processing that long by a process which died
+    while replaying them.
+
+    @return: number of rows reset
+    """
+    since = timeutils.utcnow() - datetime.timedelta(seconds=max_age)
+    with session.begin(subtransactions=True):
+        return session.query(models.OVNJournal).filter(
+            models.OVNJournal.state == ovn_const.JOURNAL_STATE_PROCESSING,
+            models.OVNJournal.updated_at < since).update(
+                {'state': ovn_const.JOURNAL_STATE_PENDING},
+                synchronize_session=False)
+
+
+def get_stats(session):
+    """Return the depth, lag and failures of the journal.
+
+    @return: dict with the number of rows left to replay as depth, the
+             age in seconds of the oldest of them as lag, and the number
+             of rows given up on as failed
+    """
+    journal = models.OVNJournal
+    counts = dict(session.query(journal.state, sa.func.count()).
+                  group_by(journal.state).all())
+    oldest = session.query(sa.func.min(journal.created_at)).filter(
+        journal.state != ovn_const.JOURNAL_STATE_FAILED).scalar()
+    lag = 0.0
+    if oldest is not None:
+        lag = max(0.0, timeutils.delta_seconds(oldest, timeutils.utcnow()))
+    return {'depth': (counts.get(ovn_const.JOURNAL_STATE_PENDING, 0) +
+                      counts.get(ovn_const.JOURNAL_STATE_PROCESSING, 0)),
+            'lag': lag,
+            'failed': counts.get(ovn_const.JOURNAL_STATE_FAILED, 0)}
@@ -0,0 +1,54 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Add the OVN journal table
+
+Revision ID: e229b8aad9f2
+Revises: start_networking_ovn
+Create Date: 2016-09-12 00:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+from neutron.db.migration import cli
+
+from networking_ovn.common import constants as ovn_const
+
+# revision identifiers, used by Alembic.
+revision = 'e229b8aad9f2'
+down_revision = 'start_networking_ovn'
+branch_labels = (cli.EXPAND_BRANCH,)
+
+
+def upgrade():
+    op.create_table(
+        'ovn_journal',
+        sa.Column('seqnum',
+                  sa.BigInteger().with_variant(sa.Integer(), 'sqlite'),
+                  primary_key=True, autoincrement=True),
+        sa.Column('object_type', sa.String(36), nullable=False),
+        sa.Column('object_uuid', sa.String(36), nullable=False),
+        sa.Column('network_id', sa.String(36), nullable=False, index=True),
+        sa.Column('operation', sa.String(36), nullable=False),
+        sa.Column('data', sa.Text, nullable=False),
+        sa.Column('state',
+                  sa.Enum(ovn_const.JOURNAL_STATE_PENDING,
+                          ovn_const.JOURNAL_STATE_PROCESSING,
+                          ovn_const.JOURNAL_STATE_FAILED,
+                          name='ovn_journal_state'),
+                  nullable=False, default=ovn_const.JOURNAL_STATE_PENDING,
+                  index=True),
+        sa.Column('retry_count', sa.Integer, nullable=False, default=0),
+        sa.Column('created_at', sa.DateTime, nullable=False),
+        sa.Column('updated_at', sa.DateTime, nullable=False))
@@ -0,0 +1,50 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from oslo_utils import timeutils
+import sqlalchemy as sa
+
+from neutron.db import model_base
+
+from networking_ovn.common import constants as ovn_const
+
+
+class OVNJournal(model_base.BASEV2):
+    """An OVN NB DB operation pending in the OVN journal.
+
+    The rows are recorded in the DB transaction of the Neutron change they
+    come from, and replayed to the OVN NB DB in seqnum order for each
+    network, the operations of a network and of its ports being recorded
+    under its id.
+    """
+
+    __tablename__ = 'ovn_journal'
+
+    seqnum = sa.Column(sa.BigInteger().with_variant(sa.Integer(), 'sqlite'),
+                       primary_key=True, autoincrement=True)
+    object_type = sa.Column(sa.String(36), nullable=False)
+    object_uuid = sa.Column(sa.String(36), nullable=False)
+    network_id = sa.Column(sa.String(36), nullable=False, index=True)
+    operation = sa.Column(sa.String(36), nullable=False)
+    # JSON of the Neutron resource, and of its original state on update.
+    data = sa.Column(sa.Text, nullable=False)
+    state = sa.Column(sa.Enum(ovn_const.JOURNAL_STATE_PENDING,
+                              ovn_const.JOURNAL_STATE_PROCESSING,
+                              ovn_const.JOURNAL_STATE_FAILED,
+                              name='ovn_journal_state'),
+                      nullable=False, default=ovn_const.JOURNAL_STATE_PENDING,
+                      index=True)
+    retry_count = sa.Column(sa.Integer, nullable=False, default=0)
+    created_at = sa.Column(sa.DateTime, nullable=False,
+                           default=timeutils.utcnow)
+    updated_at = sa.Column(sa.DateTime, nullable=False,
+                           default=timeutils.utcnow)
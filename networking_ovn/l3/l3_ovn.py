@@ -25,7 +25,9 @@ from neutron.plugins.common import constants
 from neutron.services import service_base
 
 from networking_ovn._i18n import _LE, _LI
+from networking_ovn.common import accounting
 from networking_ovn.common import constants as ovn_const
+from networking_ovn.common import exceptions as ovn_exc
 from networking_ovn.common import extensions
 from networking_ovn.common import utils
 from networking_ovn.ovsdb import impl_idl_ovn
@@ -73,6 +75,7 @@ class OVNL3RouterPlugin(service_base.ServicePluginBase,
         return ("L3 Router Service Plugin for basic L3 forwarding"
                 " using OVN")
 
+    @accounting.track
     def create_router(self, context, router):
         router = super(OVNL3RouterPlugin, self).create_router(
             context, router)
@@ -96,6 +99,7 @@ class OVNL3RouterPlugin(service_base.ServicePluginBase,
         router_name = utils.ovn_name(router['id'])
         external_ids = {ovn_const.OVN_ROUTER_NAME_EXT_ID_KEY:
                         router.get('name', 'no_router_name')}
+        utils.stamp_revision_number(external_ids, router)
         enabled = router.get('admin_state_up')
         with self._ovn.transaction(check_error=True) as txn:
             txn.add(self._ovn.create_lrouter(router_name,
@@ -103,6 +107,7 @@ class OVNL3RouterPlugin(service_base.ServicePluginBase,
                                              enabled=enabled
                                              ))
 
+    @accounting.track
     def update_router(self, context, id, router):
         original_router = self.get_router(context, id)
         result = super(OVNL3RouterPlugin, self).update_router(
@@ -117,7 +122,14 @@ class OVNL3RouterPlugin(service_base.ServicePluginBase,
             if enabled != original_router['admin_state_up']:
                 update['enabled'] = enabled
 
-        if 'name' in router['router']:
+        revision = utils.get_revision_number(result)
+        if revision is not None:
+            # Keep the revision of the lrouter up to date, even when none
+            # of its columns changed.
+            update['external_ids'] = utils.stamp_revision_number(
+                {ovn_const.OVN_ROUTER_NAME_EXT_ID_KEY: result['name']},
+                result)
+        elif 'name' in router['router']:
             if router['router']['name'] != original_router['name']:
                 external_ids = {ovn_const.OVN_ROUTER_NAME_EXT_ID_KEY:
                                 router['router']['name']}
@@ -131,7 +143,13 @@ class OVNL3RouterPlugin(service_base.ServicePluginBase,
 
         if update or added or removed:
             try:
-                with self._ovn.transaction(check_error=True) as txn:
+                # RevisionConflict is handled below, do not log it as a
+                # transaction error.
+                with self._ovn.transaction(check_error=True,
+                                           log_errors=False) as txn:
+                    if revision is not None:
+                        txn.add(self._ovn.check_revision_number(
+                            'Logical_Router', router_name, revision))
                     if update:
                         txn.add(self._ovn.update_lrouter(router_name,
                                 **update))
@@ -145,6 +163,11 @@ class OVNL3RouterPlugin(service_base.ServicePluginBase,
                         txn.add(self._ovn.delete_static_route(router_name,
                                 ip_prefix=route['destination'],
                                 nexthop=route['nexthop']))
+            except ovn_exc.RevisionConflict as e:
+                # The router was already updated from a newer revision by
+                # a concurrent request.
+                LOG.debug('Dropping out of order update of router %(id)s: '
+                          '%(error)s', {'id': id, 'error': e})
             except Exception:
                 LOG.exception(_LE('Unable to update lrouter for %s'), id)
                 super(OVNL3RouterPlugin, self).update_router(context,
@@ -154,6 +177,7 @@ class OVNL3RouterPlugin(service_base.ServicePluginBase,
 
         return result
 
+    @accounting.track
     def delete_router(self, context, id):
         router_name = utils.ovn_name(id)
         ret_val = super(OVNL3RouterPlugin, self).delete_router(context, id)
@@ -184,6 +208,7 @@ class OVNL3RouterPlugin(service_base.ServicePluginBase,
             txn.add(self._ovn.set_lrouter_port_in_lport(port['id'],
                                                         lrouter_port_name))
 
+    @accounting.track
     def add_router_interface(self, context, router_id, interface_info):
         router_interface_info = \
             super(OVNL3RouterPlugin, self).add_router_interface(
@@ -193,6 +218,7 @@ class OVNL3RouterPlugin(service_base.ServicePluginBase,
         self.create_lrouter_port_in_ovn(context, router_id, port)
         return router_interface_info
 
+    @accounting.track
     def remove_router_interface(self, context, router_id, interface_info):
         router_interface_info = \
             super(OVNL3RouterPlugin, self).remove_router_interface(
@@ -34,9 +34,14 @@ from neutron.plugins.ml2 import driver_api
 from neutron.services.qos import qos_consts
 
 from networking_ovn._i18n import _LI
+from networking_ovn.common import accounting
 from networking_ovn.common import acl as ovn_acl
+from networking_ovn.common import cache
 from networking_ovn.common import config
 from networking_ovn.common import constants as ovn_const
+from networking_ovn.common import exceptions as ovn_exc
+from networking_ovn.common import journal
+from networking_ovn.common import stats
 from networking_ovn.common import utils
 from networking_ovn.ovsdb import impl_idl_ovn
 from networking_ovn.ovsdb import ovsdb_monitor
@@ -82,8 +87,10 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
         """
         LOG.info(_LI("Starting OVNMechanismDriver"))
         self._plugin_property = None
+        self._subnet_cache = cache.SubnetCache()
         self._setup_vif_port_bindings()
         self.subscribe()
+        stats.install_signal_handler()
         # TODO(rtheis): Is any initialization required for QoS?
 
     @property
@@ -116,6 +123,7 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
             }
 
     def subscribe(self):
+        self._subnet_cache.subscribe()
         registry.subscribe(
             self.post_fork_initialize,
             resources.PROCESS,
@@ -136,6 +144,13 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
     def post_fork_initialize(self, resource, event, trigger, **kwargs):
         self._ovn = impl_idl_ovn.OvsdbOvnIdl(self, trigger)
 
+        if (config.is_ovn_journal_mode() and
+                trigger.im_class == ovsdb_monitor.OvnWorker):
+            # Only the OVN worker replays the journal, the API workers
+            # record in it.
+            self._journal = journal.OvnJournal(self._get_journal_handlers())
+            self._journal.start()
+
         # TODO(rtheis): Synchronizer needs to use ML2 ...
         # if trigger.im_class == ovsdb_monitor.OvnWorker:
         #     # Call the synchronization task if its ovn worker
@@ -144,6 +159,39 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
         #         self, self._ovn, config.get_ovn_neutron_sync_mode())
         #     self.synchronizer.sync()
 
+    def _get_journal_handlers(self):
+        # The handlers are called with the resource and its original state.
+        net_type = ovn_const.JOURNAL_TYPE_NETWORK
+        port_type = ovn_const.JOURNAL_TYPE_PORT
+        return {
+            (net_type, ovn_const.JOURNAL_OP_CREATE):
+                lambda network, original: self._create_network(network),
+            (net_type, ovn_const.JOURNAL_OP_UPDATE): self._update_network,
+            (net_type, ovn_const.JOURNAL_OP_DELETE):
+                lambda network, original: self._delete_network(network),
+            (port_type, ovn_const.JOURNAL_OP_CREATE):
+                lambda port, original: self._create_port(port),
+            (port_type, ovn_const.JOURNAL_OP_UPDATE): self._update_port,
+            (port_type, ovn_const.JOURNAL_OP_DELETE):
+                lambda port, original: self._delete_port(port),
+        }
+
+    def _record(self, context, object_type, operation):
+        """Record the change of context in the journal, in journal mode.
+
+        :param context: NetworkContext or PortContext of the change.
+
+        The change is then replayed to OVN by the OVN worker, and the
+        postcommit methods leave OVN alone.
+        """
+        if not config.is_ovn_journal_mode():
+            return
+        original = (context.original
+                    if operation == ovn_const.JOURNAL_OP_UPDATE else None)
+        journal.record(context._plugin_context, object_type, operation,
+                       context.current, original)
+
+    @accounting.track
     def sg_callback(self, resource, event, trigger, **kwargs):
         sg_id = None
         sg_rule = None
@@ -170,6 +218,19 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
                                              rule=sg_rule,
                                              is_add_acl=is_add_acl)
 
+    def create_network_precommit(self, context):
+        """Allocate resources for a new network.
+
+        :param context: NetworkContext instance describing the new
+        network.
+
+        Called inside transaction context on session. Records the
+        network in the journal, in journal mode.
+        """
+        self._record(context, ovn_const.JOURNAL_TYPE_NETWORK,
+                     ovn_const.JOURNAL_OP_CREATE)
+
+    @accounting.track
     def create_network_postcommit(self, context):
         """Create a network.
 
@@ -181,7 +242,11 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
         drastically affect performance. Raising an exception will
         cause the deletion of the resource.
         """
-        network = context.current
+        if config.is_ovn_journal_mode():
+            return
+        self._create_network(context.current)
+
+    def _create_network(self, network):
         physnet = self._get_attribute(network, pnet.PHYSICAL_NETWORK)
         segid = self._get_attribute(network, pnet.SEGMENTATION_ID)
         self.create_network_in_ovn(network, {}, physnet, segid)
@@ -194,9 +259,11 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
         ext_ids.update({
             ovn_const.OVN_NETWORK_NAME_EXT_ID_KEY: network['name']
         })
+        utils.stamp_revision_number(ext_ids, network)
 
         lswitch_name = utils.ovn_name(network['id'])
-        with self._ovn.transaction(check_error=True) as txn:
+        with self._ovn.transaction(check_error=True,
+                                   tenant_id=network['tenant_id']) as txn:
             txn.add(self._ovn.create_lswitch(
                 lswitch_name=lswitch_name,
                 external_ids=ext_ids))
@@ -219,6 +286,26 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
         self._ovn.set_lswitch_ext_id(
             utils.ovn_name(network_id), ext_id).execute(check_error=True)
 
+    def _set_network_revision_number(self, network):
+        # Stamp the lswitch with the revision and name of the network,
+        # unless it was already updated from a newer revision.
+        revision = utils.get_revision_number(network)
+        lswitch_name = utils.ovn_name(network['id'])
+        try:
+            with self._ovn.transaction(check_error=True,
+                                       log_errors=False) as txn:
+                txn.add(self._ovn.check_revision_number(
+                    'Logical_Switch', lswitch_name, revision))
+                txn.add(self._ovn.set_lswitch_ext_id(
+                    lswitch_name,
+                    [ovn_const.OVN_NETWORK_NAME_EXT_ID_KEY, network['name']]))
+                txn.add(self._ovn.set_lswitch_ext_id(
+                    lswitch_name,
+                    [ovn_const.OVN_REV_NUM_EXT_ID_KEY, str(revision)]))
+        except ovn_exc.RevisionConflict as e:
+            LOG.debug('Dropping out of order update of network %(id)s: '
+                      '%(error)s', {'id': network['id'], 'error': e})
+
     def _get_network_ports_for_policy(self, admin_context,
                                       network_id, policy_id):
         all_rules = qos_rule.get_rules(admin_context, policy_id)
@@ -254,12 +341,32 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
             admin_context, policy_id)
 
         if qos_rule_options is not None:
-            with self._ovn.transaction(check_error=True) as txn:
-                for port_id in port_ids:
-                    txn.add(self._ovn.set_lport(
-                        lport_name=port_id,
-                        options=qos_rule_options))
+            # Only the options column is set, in transactions of at most
+            # [ovn] qos_transaction_size ports.
+            chunk_size = config.get_ovn_qos_transaction_size()
+            for start in range(0, len(port_ids), chunk_size):
+                with self._ovn.transaction(
+                        check_error=True,
+                        priority=ovn_const.TXN_PRIORITY_BULK) as txn:
+                    for port_id in port_ids[start:start + chunk_size]:
+                        txn.add(self._ovn.set_lport(
+                            lport_name=port_id,
+                            options=qos_rule_options))
+
+    def update_network_precommit(self, context):
+        """Update resources of a network.
+
+        :param context: NetworkContext instance describing the new
+        state of the network, as well as the original state prior
+        to the update_network call.
 
+        Called inside transaction context on session. Records the
+        update in the journal, in journal mode.
+        """
+        self._record(context, ovn_const.JOURNAL_TYPE_NETWORK,
+                     ovn_const.JOURNAL_OP_UPDATE)
+
+    @accounting.track
     def update_network_postcommit(self, context):
         """Update a network.
 
@@ -276,9 +383,14 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
         network state.  It is up to the mechanism driver to ignore
         state or state changes that it does not know or care about.
         """
-        network = context.current
-        original_network = context.original
-        if network['name'] != original_network['name']:
+        if config.is_ovn_journal_mode():
+            return
+        self._update_network(context.current, context.original)
+
+    def _update_network(self, network, original_network):
+        if utils.get_revision_number(network) is not None:
+            self._set_network_revision_number(network)
+        elif network['name'] != original_network['name']:
             self._set_network_name(network['id'], network['name'])
 
         if (qos_consts.QOS_POLICY_ID in network and
@@ -287,6 +399,19 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
             self._update_network_qos(network['id'],
                                      network[qos_consts.QOS_POLICY_ID])
 
+    def delete_network_precommit(self, context):
+        """Delete resources for a network.
+
+        :param context: NetworkContext instance describing the current
+        state of the network, prior to the call to delete it.
+
+        Called inside transaction context on session. Records the
+        deletion in the journal, in journal mode.
+        """
+        self._record(context, ovn_const.JOURNAL_TYPE_NETWORK,
+                     ovn_const.JOURNAL_OP_DELETE)
+
+    @accounting.track
     def delete_network_postcommit(self, context):
         """Delete a network.
 
@@ -299,7 +424,11 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
         expected, and will not prevent the resource from being
         deleted.
         """
-        network = context.current
+        if config.is_ovn_journal_mode():
+            return
+        self._delete_network(context.current)
+
+    def _delete_network(self, network):
         self._ovn.delete_lswitch(
             utils.ovn_name(network['id']), if_exists=True).execute(
                 check_error=True)
@@ -315,6 +444,8 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
         of the current transaction.
         """
         self.validate_and_get_data_from_binding_profile(context.current)
+        self._record(context, ovn_const.JOURNAL_TYPE_PORT,
+                     ovn_const.JOURNAL_OP_CREATE)
 
     def validate_and_get_data_from_binding_profile(self, port):
         if (ovn_const.OVN_PORT_BINDING_PROFILE not in port or
@@ -388,6 +519,7 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
                 provisioning_blocks.L2_AGENT_ENTITY
             )
 
+    @accounting.track
     def create_port_postcommit(self, context):
         """Create a port.
 
@@ -399,9 +531,14 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
         result in the deletion of the resource.
         """
         port = context.current
+        self._insert_port_provisioning_block(port)
+        if config.is_ovn_journal_mode():
+            return
+        self._create_port(port)
+
+    def _create_port(self, port):
         binding_profile = self.validate_and_get_data_from_binding_profile(port)
         ovn_port_info = self.get_ovn_port_options(binding_profile, port)
-        self._insert_port_provisioning_block(port)
         self.create_port_in_ovn(port, ovn_port_info)
         # TODO(rtheis): Are changes required for QoS?
 
@@ -478,7 +615,8 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
                                                           sg_ports,
                                                           subnet_cache,
                                                           ip_version,
-                                                          src_or_dst)
+                                                          src_or_dst,
+                                                          self._subnet_cache)
 
         match += remote_group_match
 
@@ -528,17 +666,10 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
         if not sec_groups:
             return acl_list
 
-        # Drop all IP traffic to and from the logical port by default.
-        acl_list += ovn_acl.drop_all_ip_traffic_for_port(port)
-
-        for ip in port['fixed_ips']:
-            subnet = ovn_acl._get_subnet_from_cache(self._plugin,
-                                                    admin_context,
-                                                    subnet_cache,
-                                                    ip['subnet_id'])
-            if subnet['ip_version'] != 4:
-                continue
-            acl_list += ovn_acl.add_acl_dhcp(port, subnet)
+        # NOTE: Dropping all IP traffic to and from the logical port by
+        # default and allowing DHCP are done by ACLs shared by all the
+        # port-secured ports of the logical switch, see
+        # _get_lswitch_acl_keys().
 
         # We create an ACL entry for each rule on each security group applied
         # to this port.
@@ -557,6 +688,17 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
 
         return acl_list
 
+    def _get_lswitch_acl_keys(self, admin_context, port, subnet_cache):
+        if not port.get('security_groups'):
+            return []
+        subnets = [ovn_acl._get_subnet_from_cache(self._plugin,
+                                                  admin_context,
+                                                  subnet_cache,
+                                                  ip['subnet_id'],
+                                                  self._subnet_cache)
+                   for ip in port['fixed_ips']]
+        return ovn_acl.lswitch_acl_keys_for_port(port, subnets)
+
     def _refresh_remote_security_group(self,
                                        admin_context,
                                        sec_group,
@@ -632,21 +774,29 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
                                           subnet_cache)
                 acl_new_values_dict[port['id']] = acls_new
 
-        self._ovn.update_acls(list(lswitch_names),
-                              iter(port_list),
-                              acl_new_values_dict,
-                              need_compare=need_compare,
-                              is_add_acl=is_add_acl).execute(check_error=True)
+        # A fan-out to all the ports of the group, committed after the
+        # latency critical transactions.
+        tenant_id = port_list[0]['tenant_id'] if port_list else None
+        with self._ovn.transaction(check_error=True,
+                                   priority=ovn_const.TXN_PRIORITY_BULK,
+                                   tenant_id=tenant_id) as txn:
+            txn.add(self._ovn.update_acls(list(lswitch_names),
+                                          iter(port_list),
+                                          acl_new_values_dict,
+                                          need_compare=need_compare,
+                                          is_add_acl=is_add_acl))
 
     def create_port_in_ovn(self, port, ovn_port_info):
-        external_ids = {ovn_const.OVN_PORT_NAME_EXT_ID_KEY: port['name']}
+        external_ids = utils.stamp_revision_number(
+            {ovn_const.OVN_PORT_NAME_EXT_ID_KEY: port['name']}, port)
         lswitch_name = utils.ovn_name(port['network_id'])
         admin_context = n_context.get_admin_context()
         sg_cache = {}
         sg_ports_cache = {}
         subnet_cache = {}
 
-        with self._ovn.transaction(check_error=True) as txn:
+        with self._ovn.transaction(check_error=True,
+                                   tenant_id=port['tenant_id']) as txn:
             # The lport_name *must* be neutron port['id'].  It must match the
             # iface-id set in the Interfaces table of the Open_vSwitch
             # database which nova sets to be the port ID.
@@ -668,6 +818,12 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
                                       subnet_cache)
             for acl in acls_new:
                 txn.add(self._ovn.add_acl(**acl))
+            lswitch_acl_keys = self._get_lswitch_acl_keys(admin_context,
+                                                          port,
+                                                          subnet_cache)
+            if lswitch_acl_keys:
+                txn.add(self._ovn.update_lswitch_acls(
+                        lswitch_name, {port['id']: lswitch_acl_keys}))
 
         if len(port.get('fixed_ips')):
             for sg_id in port.get('security_groups', []):
@@ -692,7 +848,10 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
         state changes that it does not know or care about.
         """
         self.validate_and_get_data_from_binding_profile(context.current)
+        self._record(context, ovn_const.JOURNAL_TYPE_PORT,
+                     ovn_const.JOURNAL_OP_UPDATE)
 
+    @accounting.track
     def update_port_postcommit(self, context):
         """Update a port.
 
@@ -709,43 +868,67 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
         state. It is up to the mechanism driver to ignore state or
         state changes that it does not know or care about.
         """
-        port = context.current
-        original_port = context.original
+        if config.is_ovn_journal_mode():
+            return
+        self._update_port(context.current, context.original)
+
+    def _update_port(self, port, original_port):
         binding_profile = self.validate_and_get_data_from_binding_profile(port)
         ovn_port_info = self.get_ovn_port_options(binding_profile, port)
         self._update_port_in_ovn(original_port, port, ovn_port_info)
         # TODO(rtheis): Are changes required for QoS?
 
     def _update_port_in_ovn(self, original_port, port, ovn_port_info):
-        external_ids = {
-            ovn_const.OVN_PORT_NAME_EXT_ID_KEY: port['name']}
+        external_ids = utils.stamp_revision_number(
+            {ovn_const.OVN_PORT_NAME_EXT_ID_KEY: port['name']}, port)
+        revision = utils.get_revision_number(port)
         admin_context = n_context.get_admin_context()
         sg_cache = {}
         sg_ports_cache = {}
         subnet_cache = {}
 
-        with self._ovn.transaction(check_error=True) as txn:
-            txn.add(self._ovn.set_lport(lport_name=port['id'],
-                    addresses=ovn_port_info.addresses,
-                    external_ids=external_ids,
-                    parent_name=ovn_port_info.parent_name,
-                    tag=ovn_port_info.tag,
-                    type=ovn_port_info.type,
-                    options=ovn_port_info.options,
-                    enabled=port['admin_state_up'],
-                    port_security=ovn_port_info.port_security))
-            # Note that the ovsdb IDL suppresses the transaction down to what
-            # has actually changed.
-            txn.add(self._ovn.delete_acl(
-                    utils.ovn_name(port['network_id']),
-                    port['id']))
-            acls_new = self._add_acls(admin_context,
-                                      port,
-                                      sg_cache,
-                                      sg_ports_cache,
-                                      subnet_cache)
-            for acl in acls_new:
-                txn.add(self._ovn.add_acl(**acl))
+        try:
+            # RevisionConflict is handled below, do not log it as a
+            # transaction error.
+            with self._ovn.transaction(check_error=True,
+                                       log_errors=False,
+                                       tenant_id=port['tenant_id']) as txn:
+                if revision is not None:
+                    txn.add(self._ovn.check_revision_number(
+                        'Logical_Port', port['id'], revision))
+                txn.add(self._ovn.set_lport(lport_name=port['id'],
+                        addresses=ovn_port_info.addresses,
+                        external_ids=external_ids,
+                        parent_name=ovn_port_info.parent_name,
+                        tag=ovn_port_info.tag,
+                        type=ovn_port_info.type,
+                        options=ovn_port_info.options,
+                        enabled=port['admin_state_up'],
+                        port_security=ovn_port_info.port_security))
+                # Note that the ovsdb IDL suppresses the transaction down to
+                # what has actually changed.
+                txn.add(self._ovn.delete_acl(
+                        utils.ovn_name(port['network_id']),
+                        port['id']))
+                acls_new = self._add_acls(admin_context,
+                                          port,
+                                          sg_cache,
+                                          sg_ports_cache,
+                                          subnet_cache)
+                for acl in acls_new:
+                    txn.add(self._ovn.add_acl(**acl))
+                lswitch_acl_keys = self._get_lswitch_acl_keys(admin_context,
+                                                              port,
+                                                              subnet_cache)
+                txn.add(self._ovn.update_lswitch_acls(
+                        utils.ovn_name(port['network_id']),
+                        {port['id']: lswitch_acl_keys}))
+        except ovn_exc.RevisionConflict as e:
+            # The port was already updated from a newer revision by a
+            # concurrent request, which also refreshed its remote groups.
+            LOG.debug('Dropping out of order update of port %(id)s: '
+                      '%(error)s', {'id': port['id'], 'error': e})
+            return
 
         # Refresh remote security groups for changed security groups
         old_sg_ids = set(original_port.get('security_groups', []))
@@ -776,6 +959,19 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
                     sg_cache, sg_ports_cache,
                     subnet_cache, [port['id']])
 
+    def delete_port_precommit(self, context):
+        """Delete resources of a port.
+
+        :param context: PortContext instance describing the current
+        state of the port, prior to the call to delete it.
+
+        Called inside transaction context on session. Records the
+        deletion in the journal, in journal mode.
+        """
+        self._record(context, ovn_const.JOURNAL_TYPE_PORT,
+                     ovn_const.JOURNAL_OP_DELETE)
+
+    @accounting.track
     def delete_port_postcommit(self, context):
         """Delete a port.
 
@@ -788,12 +984,20 @@ class OVNMechanismDriver(driver_api.MechanismDriver):
         expected, and will not prevent the resource from being
         deleted.
         """
-        port = context.current
-        with self._ovn.transaction(check_error=True) as txn:
+        if config.is_ovn_journal_mode():
+            return
+        self._delete_port(context.current)
+
+    def _delete_port(self, port):
+        with self._ovn.transaction(check_error=True,
+                                   tenant_id=port['tenant_id']) as txn:
             txn.add(self._ovn.delete_lport(port['id'],
                     utils.ovn_name(port['network_id'])))
             txn.add(self._ovn.delete_acl(
                     utils.ovn_name(port['network_id']), port['id']))
+            if port.get('security_groups'):
+                txn.add(self._ovn.update_lswitch_acls(
+                        utils.ovn_name(port['network_id']), {port['id']: []}))
 
         admin_context = n_context.get_admin_context()
         sg_ids = port.get('security_groups', [])
@@ -10,19 +10,34 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-from datetime import datetime
+from eventlet import greenpool
 from eventlet import greenthread
+import contextlib
+import datetime
 import itertools
+import os
+import resource
+import time
+import zlib
 from neutron_lib import constants
 from oslo_log import log
+from oslo_serialization import jsonutils
+from oslo_utils import timeutils
+from sqlalchemy import event
+from sqlalchemy import func as sa_func
 
 from neutron import context
+from neutron.db import api as db_api
 from neutron.extensions import providernet as pnet
 
-from networking_ovn._i18n import _LW
+from networking_ovn._i18n import _LE, _LI, _LW
+from networking_ovn.common import config
 from networking_ovn.common import constants as ovn_const
+from networking_ovn.common import exceptions as ovn_exc
+from networking_ovn.common import sync_report
 from networking_ovn.common import utils
 from neutron.db import db_base_plugin_v2
+from neutron.db import models_v2
 from neutron.db import securitygroups_db
 import six
 
@@ -32,15 +47,61 @@ SYNC_MODE_OFF = 'off'
 SYNC_MODE_LOG = 'log'
 SYNC_MODE_REPAIR = 'repair'
 
+# Maximum number of sync phases running at the same time.
+SYNC_PHASE_POOL_SIZE = 3
+# Number of Neutron resources read by each DB query.
+SYNC_PAGE_SIZE = 1000
+
+# Fields of the Neutron resources covered by the network digests.
+NETWORK_DIGEST_FIELDS = ('id', 'name', pnet.NETWORK_TYPE,
+                         pnet.PHYSICAL_NETWORK, pnet.SEGMENTATION_ID)
+PORT_DIGEST_FIELDS = ('id', 'mac_address', 'fixed_ips', 'security_groups',
+                      'port_security_enabled', 'allowed_address_pairs',
+                      'admin_state_up', 'device_owner', 'device_id',
+                      'binding:profile', 'qos_policy_id', 'extra_dhcp_opts')
+SG_RULE_DIGEST_FIELDS = ('id', 'direction', 'ethertype', 'protocol',
+                         'port_range_min', 'port_range_max',
+                         'remote_ip_prefix', 'remote_group_id')
+# Port digests are summed up modulo the size of the digests.
+DIGEST_MOD = 2 ** 160
+# Seconds before the last digest check the changes are read from.
+DIGEST_CHANGED_SINCE_MARGIN = 60
+# Logical port columns compared with their Neutron port.
+LPORT_DIFF_COLUMNS = ('addresses', 'port_security', 'options', 'enabled')
+
 
 class OvnNbSynchronizer(db_base_plugin_v2.NeutronDbPluginV2,
                         securitygroups_db.SecurityGroupDbMixin):
     """Synchronizer class for NB."""
 
-    def __init__(self, plugin, ovn_api, mode):
+    def __init__(self, plugin, ovn_api, mode, checkpoint_file=None,
+                 shard=None, process_started_at=None):
+        """Create a synchronizer.
+
+        @param shard: (index, count) to only sync the networks, with their
+                      ports and ACLs, hashed to the shard index out of
+                      count shards, None to sync all of them.  Routers are
+                      synced by shard 0 only.
+        @type  shard: ()
+        @param process_started_at: start time of the process syncing, from
+                                   which the reports count the time to the
+                                   first comparison, None for the start of
+                                   each sync
+        @type  process_started_at: float
+        """
         self.core_plugin = plugin
         self.ovn_api = ovn_api
         self.mode = mode
+        self.checkpoint_file = checkpoint_file
+        self.shard = shard
+        self.process_started_at = process_started_at
+        self._completed_phases = set()
+        # State of the network digest checks, see _update_neutron_digests().
+        self._neutron_digests = None
+        self._digest_counts = None
+        self._digests_checked_at = None
+        self.report = sync_report.SyncReport(
+            mode, process_started_at=process_started_at)
 
     def sync(self):
         greenthread.spawn_n(self._sync)
@@ -54,10 +115,221 @@ class OvnNbSynchronizer(db_base_plugin_v2.NeutronDbPluginV2,
         greenthread.sleep(10)
         LOG.debug("Starting OVN-Northbound DB sync process")
 
+        self.sync_all()
+
+        interval = config.get_ovn_sync_digest_interval()
+        while interval:
+            greenthread.sleep(interval)
+            with self._reporting():
+                self._run_phase(self.sync_network_digests)
+
+    def sync_all(self):
+        """Run all the sync phases.
+
+        Phases are run concurrently on a bounded green thread pool.  In
+        repair mode the ACLs and router ports refer to the logical switches
+        and ports, so they are only synced once networks and ports are.  In
+        log mode nothing is written and all phases start at once.
+
+        @return: True if all the phases succeeded
+        """
+        self._completed_phases = self._load_checkpoint()
+        with self._reporting():
+            pool = greenpool.GreenPool(SYNC_PHASE_POOL_SIZE)
+            ports_phase = pool.spawn(self._run_phase,
+                                     self.sync_networks_and_ports)
+            depends_on = (ports_phase if self.mode == SYNC_MODE_REPAIR
+                          else None)
+            phases = [ports_phase]
+            dependent_phases = [self.sync_acls]
+            if self.shard is None or self.shard[0] == 0:
+                dependent_phases.append(self.sync_routers_and_rports)
+            for phase in dependent_phases:
+                phases.append(pool.spawn(self._run_phase, phase, depends_on))
+            result = all([p.wait() for p in phases])
+        if result and self.checkpoint_file:
+            self._remove_checkpoint()
+        return result
+
+    def _in_shard(self, network_id):
+        index, count = self.shard
+        # Masked, crc32 is signed on python 2.
+        crc = zlib.crc32(network_id.encode('utf-8')) & 0xffffffff
+        return crc % count == index
+
+    def _get_shard_network_ids(self, ctx):
+        """Return the ids of the networks of the shard of this sync."""
+        return [network['id'] for network in
+                self.core_plugin.get_networks(ctx, fields=['id'])
+                if self._in_shard(network['id'])]
+
+    @contextlib.contextmanager
+    def _reporting(self):
+        """Report on the sync phases run within the context.
+
+        A new report counts the DB queries of the phases while they run,
+        and is logged, and written to [ovn] sync_report_file if set, once
+        they are done.
+        """
+        self.report = sync_report.SyncReport(
+            self.mode, process_started_at=self.process_started_at)
+        engine = db_api.get_engine()
+        event.listen(engine, 'before_cursor_execute',
+                     self.report.count_query)
+        try:
+            yield self.report
+        finally:
+            event.remove(engine, 'before_cursor_execute',
+                         self.report.count_query)
+            self.report.finish()
+            self.report.emit()
+
+    def _run_phase(self, phase, depends_on=None):
+        """Run a sync phase, logging its duration.
+
+        @param phase: sync method to run
+        @param depends_on: green thread of the phase to wait for first
+        @return: True if the phase succeeded
+        """
+        if depends_on is not None and not depends_on.wait():
+            LOG.warning(_LW("OVN-NB Sync %s skipped, a phase it depends on "
+                            "failed"), phase.__name__)
+            self.report.end_phase(phase.__name__, sync_report.PHASE_SKIPPED)
+            return False
+        if phase.__name__ in self._completed_phases:
+            LOG.info(_LI("OVN-NB Sync %s already completed according to "
+                         "the checkpoint file, skipping"), phase.__name__)
+            self.report.end_phase(phase.__name__, sync_report.PHASE_SKIPPED)
+            return True
+        # Each phase gets its own context, DB sessions must not be shared
+        # between green threads.
         ctx = context.get_admin_context()
-        self.sync_networks_and_ports(ctx)
-        self.sync_acls(ctx)
-        self.sync_routers_and_rports(ctx)
+        self.report.start_phase(phase.__name__)
+        start = time.time()
+        try:
+            phase(ctx)
+        except Exception:
+            LOG.exception(_LE("OVN-NB Sync %s failed"), phase.__name__)
+            self.report.end_phase(phase.__name__, sync_report.PHASE_FAILED,
+                                  time.time() - start)
+            return False
+        duration = time.time() - start
+        self.report.end_phase(phase.__name__, sync_report.PHASE_SUCCEEDED,
+                              duration)
+        LOG.info(_LI("OVN-NB Sync %(phase)s finished in %(time).2f "
+                     "seconds, peak RSS %(rss)d KiB"),
+                 {'phase': phase.__name__, 'time': duration,
+                  'rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss})
+        if self.checkpoint_file:
+            self._completed_phases.add(phase.__name__)
+            self._save_checkpoint()
+        return True
+
+    def _load_checkpoint(self):
+        """Read the phases completed by an interrupted run.
+
+        A checkpoint written by a run in another sync mode is ignored, a
+        log run does not repair anything.
+
+        @return: set of the names of the completed phases
+        """
+        if not self.checkpoint_file or not os.path.exists(
+                self.checkpoint_file):
+            return set()
+        try:
+            with open(self.checkpoint_file) as f:
+                checkpoint = jsonutils.load(f)
+        except (IOError, ValueError):
+            LOG.warning(_LW("Ignoring unreadable OVN-NB Sync checkpoint "
+                            "file %s"), self.checkpoint_file)
+            return set()
+        if checkpoint.get('mode') != self.mode:
+            return set()
+        LOG.info(_LI("Resuming OVN-NB Sync from checkpoint file %s"),
+                 self.checkpoint_file)
+        return set(checkpoint.get('completed_phases', []))
+
+    def _save_checkpoint(self):
+        # Write then rename, an interruption must not leave a truncated
+        # checkpoint behind.
+        tmp_file = self.checkpoint_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            jsonutils.dump({'mode': self.mode,
+                            'completed_phases':
+                            sorted(self._completed_phases)}, f)
+        os.rename(tmp_file, self.checkpoint_file)
+
+    def _remove_checkpoint(self):
+        try:
+            os.remove(self.checkpoint_file)
+        except OSError:
+            pass
+
+    def _commit_in_chunks(self, phase, units):
+        """Commit OVN commands in bounded size transactions.
+
+        A single transaction holding thousands of commands stalls
+        ovsdb-server and fails as a whole, so the commands are committed
+        by chunks of about [ovn] sync_transaction_size commands.
+
+        @param phase: name of the sync step, used for progress logging
+        @type  phase: string
+        @param units: lists of commands, the commands of a list are always
+                      committed in the same transaction
+        @type  units: [[]]
+        @return: Nothing
+        """
+        units = [unit for unit in units if unit]
+        if not units:
+            return
+        chunk_size = config.get_ovn_sync_transaction_size()
+        total = len(units)
+        done = 0
+        while done < total:
+            num_cmds = 0
+            start = time.time()
+            with self.ovn_api.transaction(
+                    check_error=True,
+                    priority=ovn_const.TXN_PRIORITY_BULK) as txn:
+                for unit in units[done:]:
+                    if num_cmds and num_cmds + len(unit) > chunk_size:
+                        break
+                    for cmd in unit:
+                        txn.add(cmd)
+                    num_cmds += len(unit)
+                    done += 1
+            self.report.add_transaction(num_cmds, time.time() - start)
+            LOG.info(_LI("OVN-NB Sync %(phase)s: committed %(done)d of "
+                         "%(total)d changes"),
+                     {'phase': phase, 'done': done, 'total': total})
+
+    @staticmethod
+    def _iter_resources(get_resources, ctx, filters=None, sorts=None):
+        """Read Neutron resources one page at a time.
+
+        Only a page of resources is held in memory at once, however large
+        the cloud is.
+
+        @param get_resources: plugin method listing the resources
+        @param ctx: neutron context
+        @type  ctx: object of type neutron.context.Context
+        @param filters: filters of the resources to read, all if None
+        @type  filters: {}
+        @param sorts: sort keys and directions, ending with the id so the
+                      order is total, defaults to the id
+        @type  sorts: [(key, ascending)]
+        @return: iterator over the resources, in the sorts order
+        """
+        sorts = sorts or [('id', True)]
+        marker = None
+        while True:
+            page = get_resources(ctx, filters=filters, sorts=sorts,
+                                 limit=SYNC_PAGE_SIZE, marker=marker)
+            for obj in page:
+                yield obj
+            if len(page) < SYNC_PAGE_SIZE:
+                return
+            marker = page[-1]['id']
 
     @staticmethod
     def _get_attribute(obj, attribute):
@@ -66,7 +338,7 @@ class OvnNbSynchronizer(db_base_plugin_v2.NeutronDbPluginV2,
             res = None
         return res
 
-    def _create_network_in_ovn(self, net):
+    def _get_network_ext_ids(self, net):
         ext_ids = {}
         physnet = self._get_attribute(net, pnet.PHYSICAL_NETWORK)
         if physnet:
@@ -80,19 +352,216 @@ class OvnNbSynchronizer(db_base_plugin_v2.NeutronDbPluginV2,
                 ext_ids.update({
                     ovn_const.OVN_SEGID_EXT_ID_KEY: str(segid),
                 })
+        return ext_ids
 
-        self.core_plugin.create_network_in_ovn(net, ext_ids)
+    def _create_network_in_ovn(self, net):
+        self.core_plugin.create_network_in_ovn(
+            net, self._get_network_ext_ids(net))
 
-    def _create_port_in_ovn(self, ctx, port):
+    def _update_network_in_ovn(self, net):
+        """Render the lswitch of a network again and stamp its revision.
+
+        The external_ids rendered from the network are set, and the
+        localnet port of a provider network created if missing, in the
+        transaction stamping the revision of the network, unless the
+        lswitch was updated from a newer revision meanwhile.
+
+        @param net: Neutron network
+        @type  net: {}
+        @return: Nothing
+        """
+        lswitch_name = utils.ovn_name(net['id'])
+        ext_ids = self._get_network_ext_ids(net)
+        physnet = ext_ids.get(ovn_const.OVN_PHYSNET_EXT_ID_KEY)
+        segid = ext_ids.get(ovn_const.OVN_SEGID_EXT_ID_KEY)
+        ext_ids[ovn_const.OVN_NETWORK_NAME_EXT_ID_KEY] = net['name']
+        ext_ids[ovn_const.OVN_REV_NUM_EXT_ID_KEY] = str(
+            utils.get_revision_number(net))
+        try:
+            LOG.debug('Updating the network %s in OVN NB DB', net['id'])
+            with self.ovn_api.transaction(check_error=True,
+                                          log_errors=False) as txn:
+                txn.add(self.ovn_api.check_revision_number(
+                    'Logical_Switch', lswitch_name,
+                    utils.get_revision_number(net)))
+                for key, value in sorted(six.iteritems(ext_ids)):
+                    txn.add(self.ovn_api.set_lswitch_ext_id(
+                        lswitch_name, (key, value)))
+                if physnet:
+                    txn.add(self.ovn_api.create_lport(
+                        lport_name='provnet-%s' % net['id'],
+                        lswitch_name=lswitch_name,
+                        addresses=['unknown'],
+                        external_ids=None,
+                        type='localnet',
+                        tag=int(segid) if segid is not None else None,
+                        options={'network_name': physnet}))
+        except ovn_exc.RevisionConflict as e:
+            LOG.debug('Dropping out of order update of network %(id)s: '
+                      '%(error)s', {'id': net['id'], 'error': e})
+        except RuntimeError:
+            LOG.warning(_LW("Update network in OVN NB failed for"
+                            " network %s"), net['id'])
+
+    def _get_ovn_port_info(self, ctx, port):
         binding_profile = self.core_plugin.get_data_from_binding_profile(
             ctx, port)
         qos_options = self.core_plugin.qos_get_ovn_port_options(
             ctx, port)
-        ovn_port_info = self.core_plugin.get_ovn_port_options(binding_profile,
-                                                              qos_options,
-                                                              port)
+        return self.core_plugin.get_ovn_port_options(binding_profile,
+                                                     qos_options,
+                                                     port)
+
+    def _create_port_in_ovn(self, ctx, port):
+        ovn_port_info = self._get_ovn_port_info(ctx, port)
         return self.core_plugin.create_port_in_ovn(ctx, port, ovn_port_info)
 
+    def _update_port_in_ovn(self, ctx, port):
+        ovn_port_info = self._get_ovn_port_info(ctx, port)
+        try:
+            LOG.debug('Updating the port %s in OVN NB DB', port['id'])
+            self.core_plugin._update_port_in_ovn(ctx, port, port,
+                                                 ovn_port_info)
+        except RuntimeError:
+            LOG.warning(_LW("Update port in OVN NB failed for"
+                            " port %s"), port['id'])
+
+    def _get_lport_columns(self, ctx, port):
+        """Render the compared columns of the logical port of a port.
+
+        @param ctx: neutron context
+        @type  ctx: object of type neutron.context.Context
+        @param port: Neutron port
+        @type  port: {}
+        @return: {column: value} for the columns of LPORT_DIFF_COLUMNS
+        """
+        ovn_port_info = self._get_ovn_port_info(ctx, port)
+        return {'addresses': ovn_port_info.addresses,
+                'port_security': ovn_port_info.port_security,
+                'options': ovn_port_info.options or {},
+                'enabled': port['admin_state_up']}
+
+    @staticmethod
+    def _get_lport_key(columns):
+        """Return the columns of a logical port as a comparable tuple.
+
+        The NB returns the optional enabled column as an empty or single
+        item list, and an empty one means enabled.
+
+        @param columns: {column: value} for the columns of
+                        LPORT_DIFF_COLUMNS
+        @type  columns: {}
+        @return: tuple of the normalized values, in LPORT_DIFF_COLUMNS order
+        """
+        enabled = columns.get('enabled')
+        if isinstance(enabled, list):
+            enabled = enabled[0] if enabled else True
+        elif enabled is None:
+            enabled = True
+        options = columns.get('options') or {}
+        return (tuple(sorted(columns.get('addresses') or [])),
+                tuple(sorted(columns.get('port_security') or [])),
+                tuple(sorted((k, str(v)) for k, v in six.iteritems(options))),
+                bool(enabled))
+
+    @staticmethod
+    def _is_outdated(ext_ids, resource):
+        """Whether an OVN row was written from an older revision.
+
+        @param ext_ids: external_ids of the OVN row
+        @type  ext_ids: {}
+        @param resource: Neutron resource the row is rendered from
+        @type  resource: {}
+        @return: True if the row is stamped with an older revision than
+                 the one of the resource, or with none
+        """
+        revision = utils.get_revision_number(resource)
+        if revision is None:
+            return False
+        ovn_revision = (ext_ids or {}).get(ovn_const.OVN_REV_NUM_EXT_ID_KEY)
+        return ovn_revision is None or int(ovn_revision) < revision
+
+    def _diff_lport(self, ctx, port, ovn_columns, lswitches_out_of_sync):
+        """Compare a logical port with the rendering of its Neutron port.
+
+        @param ctx: neutron context
+        @type  ctx: object of type neutron.context.Context
+        @param port: Neutron port
+        @type  port: {}
+        @param ovn_columns: LPORT_DIFF_COLUMNS columns of the logical port
+        @type  ovn_columns: {}
+        @param lswitches_out_of_sync: updated with the lswitch of the port
+                                      if it drifted
+        @type  lswitches_out_of_sync: set
+        @return: list of the commands repairing the drifted columns, empty
+                 if none drifted or not in repair mode
+        """
+        columns = self._get_lport_columns(ctx, port)
+        key = self._get_lport_key(columns)
+        ovn_key = self._get_lport_key(ovn_columns)
+        if key == ovn_key:
+            return []
+        drifted = [column for column, value, ovn_value in
+                   zip(LPORT_DIFF_COLUMNS, key, ovn_key)
+                   if value != ovn_value]
+        lswitches_out_of_sync.add(utils.ovn_name(port['network_id']))
+        self.report.add_discrepancy(
+            'port_drifted', port['id'],
+            _LW("Port %(port)s differs from OVN DB in %(columns)s"),
+            {'port': port['id'], 'columns': ', '.join(drifted)})
+        if self.mode != SYNC_MODE_REPAIR:
+            return []
+        return [self.ovn_api.set_lport(
+            lport_name=port['id'],
+            **dict((column, columns[column]) for column in drifted))]
+
+    def _bulk_create_networks_and_ports(self, ctx, networks, ports):
+        """Create missing networks and ports in batched transactions.
+
+        Creating them one by one costs a transaction, an ACL rendering and
+        a refresh of the remote security groups per port.  Instead all the
+        commands are rendered up front, sharing the caches between ports,
+        and committed in transactions of [ovn] sync_transaction_size
+        commands.  The ACLs of existing ports with the new ports in their
+        remote groups are fixed by the ACL sync which follows.
+
+        @param ctx: neutron context
+        @type  ctx: object of type neutron.context.Context
+        @param networks: Neutron networks missing in OVN
+        @type  networks: []
+        @param ports: Neutron ports missing in OVN
+        @type  ports: []
+        @return: Nothing
+        """
+        units = []
+        for net in networks:
+            units.append(self.core_plugin._create_network_in_ovn_cmds(
+                net, self._get_network_ext_ids(net)))
+
+        sg_cache = {}
+        sg_ports_cache = {}
+        subnet_cache = {}
+        lswitch_acls = {}
+        port_units = []
+        for port in ports:
+            ovn_port_info = self._get_ovn_port_info(ctx, port)
+            port_units.append(self.core_plugin._create_port_in_ovn_cmds(
+                ctx, port, ovn_port_info, sg_cache=sg_cache,
+                sg_ports_cache=sg_ports_cache, subnet_cache=subnet_cache))
+            keys = self.core_plugin._get_lswitch_acl_keys(ctx, port,
+                                                          subnet_cache)
+            if keys:
+                lswitch_acls.setdefault(
+                    utils.ovn_name(port['network_id']), {})[port['id']] = keys
+
+        # Make the shared drop ACLs cover the ports before creating them,
+        # they must never be reachable without their ACLs.
+        for lswitch, lport_acl_keys in six.iteritems(lswitch_acls):
+            units.append([self.ovn_api.update_lswitch_acls(lswitch,
+                                                           lport_acl_keys)])
+        units.extend(port_units)
+        self._commit_in_chunks('networks and ports creation', units)
+
     def remove_common_acls(self, neutron_acls, nb_acls):
         """Take out common acls of the two acl dictionaries.
 
@@ -108,25 +577,28 @@ class OvnNbSynchronizer(db_base_plugin_v2.NeutronDbPluginV2,
                     neutron_acls[port].remove(acl)
                     nb_acls[port].remove(acl)
 
-    def get_acls(self, context):
+    def get_acls(self, context, network_ids=None):
         """create the list of ACLS in OVN.
 
         @param context: neutron context
         @type  context: object of type neutron.context.Context
-        @var   filters: to be used for filtering out group bindings, null here
+        @param network_ids: networks whose ACLs to list, defaults to the
+                            networks having ports bound to a SG
+        @type  network_ids: []
         @var   lswitch_names: List of lswitch names
         @var   acl_list: List of NB acls
         @var   acl_list_dict: Dictionary of acl-lists based on lport as key
-        @var   sg_ports: List of ports associated to SGs
         @return: acl_list-dict
         """
-        filters = {}
-        sg_ports = self.core_plugin._get_port_security_group_bindings(context,
-                                                                      filters)
-        lswitch_names = set([])
-        for binding in sg_ports:
-            port = self.get_port(context, binding['port_id'])
-            lswitch_names.add(port['network_id'])
+        if network_ids is not None:
+            lswitch_names = set(network_ids)
+        else:
+            # The networks of the ports bound to a SG, in a single query
+            # instead of a port lookup per binding.
+            sg_binding = securitygroups_db.SecurityGroupPortBinding
+            query = context.session.query(models_v2.Port.network_id).join(
+                sg_binding, sg_binding.port_id == models_v2.Port.id).distinct()
+            lswitch_names = set(row[0] for row in query)
         acl_dict, ignore1, ignore2 = \
             self.ovn_api.get_acls_for_lswitches(lswitch_names)
         acl_list = list(itertools.chain(*six.itervalues(acl_dict)))
@@ -139,65 +611,187 @@ class OvnNbSynchronizer(db_base_plugin_v2.NeutronDbPluginV2,
                 acl_list_dict[key] = list([acl])
         return acl_list_dict
 
-    def sync_acls(self, ctx):
+    def sync_acls(self, ctx, network_ids=None):
         """Sync ACLs between neutron and NB.
 
+        Neutron ports are read one page at a time, ordered by network, and
+        their ACLs compared right away with the NB ones.  The ACLs shared by
+        the ports of a logical switch are compared once all the ports of its
+        network are read, so only the shared ACL keys of one network, and
+        of the logical switches out of sync, are kept.  The NB ACLs are
+        still read at once, and the caches of security groups, remote group
+        bindings and subnets last the whole sync: memory still grows with
+        the number of ports bound to a remote group.
+
         @param ctx: neutron context
         @type  ctx: object of type neutron.context.Context
+        @param network_ids: networks to sync, all of them if None
+        @type  network_ids: []
         @var   db_secs: List of SGs from neutron DB
-        @var   db_ports: List of ports from neutron DB
-        @var   neutron_acls: neutron dictionary of port
-               vs list-of-acls
         @var   nb_acls: NB dictionary of port
                vs list-of-acls
         @var   sg_ports_cache: cache for sg_ports
         @var   subnet_cache: cache for subnets
-        @return: Nothing
+        @var   lswitch_acls_to_repair: shared ACL keys of the lports of the
+               lswitches out of sync
+        @var   units: lists of OVN commands repairing a port or lswitch
+        @return: set of the names of the lswitches found out of sync
         """
-        LOG.debug('ACL-SYNC: started @ %s' %
-                  str(datetime.now()))
+        LOG.debug('ACL-SYNC: started')
+        if network_ids is None and self.shard is not None:
+            network_ids = self._get_shard_network_ids(ctx)
         db_secs = {}
         for sg in self.core_plugin.get_security_groups(ctx):
             db_secs[sg['id']] = sg
 
-        db_ports = {}
-        for port in self.core_plugin.get_ports(ctx):
-            db_ports[port['id']] = port
+        nb_acls = self.get_acls(ctx, network_ids)
+        # ACLs shared by the ports of a logical switch are not indexed by
+        # lport, compare them separately.
+        nb_lswitch_acls = self._get_lswitch_acl_members(
+            nb_acls.pop(None, []))
 
+        sg_cache = {}
         sg_ports_cache = {}
         subnet_cache = {}
-        neutron_acls = {}
-        for port_id, port in db_ports.items():
-            if port['security_groups']:
-                if port_id in neutron_acls:
-                    neutron_acls[port_id].extend(
-                        self.core_plugin._add_acls(ctx,
-                                                   port,
-                                                   sg_ports_cache,
-                                                   subnet_cache))
-                else:
-                    neutron_acls[port_id] = \
-                        self.core_plugin._add_acls(ctx,
-                                                   port,
-                                                   sg_ports_cache,
-                                                   subnet_cache)
-
-        nb_acls = self.get_acls(ctx)
-
-        self.remove_common_acls(neutron_acls, nb_acls)
+        lswitch_acls_to_repair = {}
+        repair = self.mode == SYNC_MODE_REPAIR
+        units = []
+        ports_out_of_sync = 0
+        lswitches_out_of_sync = set()
+        num_add_acls = 0
+        num_del_acls = 0
+
+        def _compare_lswitch_acls(lswitch, lport_acl_keys):
+            nb_keys = {lswitch: nb_lswitch_acls.pop(lswitch, {})}
+            if self._get_lswitches_to_repair({lswitch: lport_acl_keys},
+                                             nb_keys):
+                lswitch_acls_to_repair[lswitch] = lport_acl_keys
+
+        filters = None
+        if network_ids is not None:
+            filters = {'network_id': network_ids}
+        lswitch = None
+        lport_acl_keys = {}
+        for port in self._iter_resources(
+                self.core_plugin.get_ports, ctx, filters=filters,
+                sorts=[('network_id', True), ('id', True)]):
+            self.report.mark_comparison()
+            port_lswitch = utils.ovn_name(port['network_id'])
+            if port_lswitch != lswitch:
+                # All the ports of the previous network have been read.
+                if lswitch is not None:
+                    _compare_lswitch_acls(lswitch, lport_acl_keys)
+                lswitch = port_lswitch
+                lport_acl_keys = {}
+            if not port['security_groups']:
+                continue
+            port_id = port['id']
+            acls = self.core_plugin._add_acls(
+                ctx, port, sg_cache=sg_cache, sg_ports_cache=sg_ports_cache,
+                subnet_cache=subnet_cache)
+            lport_acl_keys[port_id] = self.core_plugin._get_lswitch_acl_keys(
+                ctx, port, subnet_cache)
+
+            add_acls = {port_id: list(acls)}
+            del_acls = {port_id: nb_acls.pop(port_id, [])}
+            self.remove_common_acls(add_acls, del_acls)
+            num_add_acls += len(add_acls[port_id])
+            num_del_acls += len(del_acls[port_id])
+            if del_acls[port_id] or add_acls[port_id]:
+                ports_out_of_sync += 1
+                lswitches_out_of_sync.add(utils.ovn_name(port['network_id']))
+                self.report.add_discrepancy('port_acls', port_id)
+            if not repair:
+                continue
+            if del_acls[port_id]:
+                # delete_acl removes all the ACLs of the lport, so the ACLs
+                # common with neutron have to be added back in the same
+                # transaction.
+                unit = [self.ovn_api.delete_acl(
+                    del_acls[port_id][0]['lswitch'], port_id)]
+                unit.extend(self.ovn_api.add_acl(**acl) for acl in acls)
+                units.append(unit)
+            elif add_acls[port_id]:
+                units.append([self.ovn_api.add_acl(**acl)
+                              for acl in add_acls[port_id]])
+
+        # The ACLs left belong to ports gone or without security groups.
+        for acls in six.itervalues(nb_acls):
+            if not acls:
+                continue
+            ports_out_of_sync += 1
+            lswitches_out_of_sync.add(acls[0]['lswitch'])
+            num_del_acls += len(acls)
+            self.report.add_discrepancy('port_acls', acls[0]['lport'])
+            if repair:
+                units.append([self.ovn_api.delete_acl(acls[0]['lswitch'],
+                                                      acls[0]['lport'])])
+
+        if lswitch is not None:
+            _compare_lswitch_acls(lswitch, lport_acl_keys)
+        # The lswitches left have no port in Neutron.
+        for lswitch in self._get_lswitches_to_repair({}, nb_lswitch_acls):
+            lswitch_acls_to_repair[lswitch] = {}
+        lswitches_to_repair = list(lswitch_acls_to_repair)
+        lswitches_out_of_sync.update(lswitches_to_repair)
 
         LOG.debug('ACLs-to-be-addded %d ACLs-to-be-removed %d' %
-                  (len(list(itertools.chain(*six.itervalues(neutron_acls)))),
-                   len(list(itertools.chain(*six.itervalues(nb_acls))))))
-
-        LOG.debug('ACL-SYNC: transaction started @ %s' % str(datetime.now()))
-        with self.ovn_api.transaction(check_error=True) as txn:
-            for acla in list(itertools.chain(*six.itervalues(neutron_acls))):
-                txn.add(self.ovn_api.add_acl(**acla))
-            for aclr in list(itertools.chain(*six.itervalues(nb_acls))):
-                txn.add(self.ovn_api.delete_acl(aclr['lswitch'],
-                                                aclr['lport']))
-        LOG.debug('ACL-SYNC: transaction finished @ %s' % str(datetime.now()))
+                  (num_add_acls, num_del_acls))
+        if ports_out_of_sync:
+            LOG.warning(_LW("ACLs of %d ports are out of sync with "
+                            "Neutron"), ports_out_of_sync)
+        for lswitch in lswitches_to_repair:
+            self.report.add_discrepancy(
+                'lswitch_acls', lswitch,
+                _LW("Shared ACLs of logical switch %s are out of sync with "
+                    "Neutron"))
+        if not repair:
+            return lswitches_out_of_sync
+
+        for lswitch, lport_acl_keys in six.iteritems(lswitch_acls_to_repair):
+            units.append([self.ovn_api.update_lswitch_acls(
+                lswitch, lport_acl_keys, replace=True)])
+        self._commit_in_chunks('ACLs', units)
+        LOG.debug('ACL-SYNC: finished')
+        return lswitches_out_of_sync
+
+    @staticmethod
+    def _get_lswitch_acl_members(lswitch_acls):
+        """Map each lswitch to its shared ACL keys and their lports.
+
+        @param lswitch_acls: NB shared lswitch ACLs
+        @type  lswitch_acls: []
+        @return: {lswitch: {key: set(lports)}}
+        """
+        members = {}
+        for acl in lswitch_acls:
+            ext_ids = acl.get('external_ids', {})
+            key = ext_ids.get(ovn_const.OVN_LSWITCH_ACL_EXT_ID_KEY)
+            if key is None:
+                continue
+            lports = ext_ids.get(
+                ovn_const.OVN_LSWITCH_ACL_LPORTS_EXT_ID_KEY, '')
+            members.setdefault(acl['lswitch'], {})[key] = set(lports.split())
+        return members
+
+    @staticmethod
+    def _get_lswitches_to_repair(neutron_lswitch_acls, nb_lswitch_acls):
+        """Find the lswitches whose shared ACLs differ from neutron.
+
+        @param neutron_lswitch_acls: {lswitch: {lport: [keys]}}
+        @param nb_lswitch_acls: {lswitch: {key: set(lports)}}
+        @return: List of lswitch names
+        """
+        lswitches = []
+        for lswitch in set(neutron_lswitch_acls) | set(nb_lswitch_acls):
+            expected = {}
+            for lport, keys in six.iteritems(
+                    neutron_lswitch_acls.get(lswitch, {})):
+                for key in keys:
+                    expected.setdefault(key, set()).add(lport)
+            if expected != nb_lswitch_acls.get(lswitch, {}):
+                lswitches.append(lswitch)
+        return lswitches
 
     def sync_routers_and_rports(self, ctx):
         """Sync Routers between neutron and NB.
@@ -228,6 +822,7 @@ class OvnNbSynchronizer(db_base_plugin_v2.NeutronDbPluginV2,
         lrouters = self.ovn_api.get_all_logical_routers_with_rports()
         del_lrouters_list = []
         del_lrouter_ports_list = []
+        self.report.mark_comparison()
         for lrouter in lrouters:
             if lrouter['name'] in db_routers:
                 for lrport in lrouter['ports']:
@@ -241,24 +836,28 @@ class OvnNbSynchronizer(db_base_plugin_v2.NeutronDbPluginV2,
                 del_lrouters_list.append(lrouter)
 
         for r_id, router in db_routers.items():
-            LOG.warning(_LW("Router found in Neutron but not in "
-                            "OVN DB, router id=%s"), router['id'])
+            self.report.add_discrepancy(
+                'router_missing_in_ovn', router['id'],
+                _LW("Router found in Neutron but not in OVN DB, "
+                    "router id=%s"))
             if self.mode == SYNC_MODE_REPAIR:
                 try:
-                    LOG.warning(_LW("Creating the router %s in OVN NB DB"),
-                                router['id'])
+                    LOG.debug('Creating the router %s in OVN NB DB',
+                              router['id'])
                     self.core_plugin.create_lrouter_in_ovn(router)
                 except RuntimeError:
                     LOG.warning(_LW("Create router in OVN NB failed for"
                                     " router %s"), router['id'])
 
         for rp_id, rrport in db_router_ports.items():
-            LOG.warning(_LW("Router Port found in Neutron but not in OVN "
-                            "DB, router port_id=%s"), rrport['id'])
+            self.report.add_discrepancy(
+                'router_port_missing_in_ovn', rrport['id'],
+                _LW("Router Port found in Neutron but not in OVN DB, "
+                    "router port_id=%s"))
             if self.mode == SYNC_MODE_REPAIR:
                 try:
-                    LOG.warning(_LW("Creating the router port %s in "
-                                    "OVN NB DB"), rrport['id'])
+                    LOG.debug('Creating the router port %s in OVN NB DB',
+                              rrport['id'])
                     self.core_plugin.create_lrouter_port_in_ovn(
                         ctx, rrport['device_id'], rrport)
                 except RuntimeError:
@@ -266,57 +865,105 @@ class OvnNbSynchronizer(db_base_plugin_v2.NeutronDbPluginV2,
                                     "NB failed for"
                                     " router port %s"), rrport['id'])
 
-        with self.ovn_api.transaction(check_error=True) as txn:
-            for lrouter in del_lrouters_list:
-                LOG.warning(_LW("Router found in OVN but not in "
-                                "Neutron, router id=%s"), lrouter['name'])
-                if self.mode == SYNC_MODE_REPAIR:
-                    LOG.warning(_LW("Deleting the router %s from OVN NB DB"),
-                                lrouter['name'])
-                    txn.add(self.ovn_api.delete_lrouter(
-                            utils.ovn_name(lrouter['name'])))
-
-            for lrport_info in del_lrouter_ports_list:
-                LOG.warning(_LW("Router Port found in OVN but not in "
-                                "Neutron, port_id=%s"), lrport_info['port'])
-                if self.mode == SYNC_MODE_REPAIR:
-                    LOG.warning(_LW("Deleting the port %s from OVN NB DB"),
-                                lrport_info['port'])
-                    txn.add(self.ovn_api.delete_lrouter_port(
-                            utils.ovn_lrouter_port_name(lrport_info['port']),
-                            utils.ovn_name(lrport_info['lrouter']),
-                            if_exists=False))
+        units = []
+        for lrouter in del_lrouters_list:
+            self.report.add_discrepancy(
+                'router_missing_in_neutron', lrouter['name'],
+                _LW("Router found in OVN but not in Neutron, router id=%s"))
+            if self.mode == SYNC_MODE_REPAIR:
+                LOG.debug('Deleting the router %s from OVN NB DB',
+                          lrouter['name'])
+                units.append([self.ovn_api.delete_lrouter(
+                    utils.ovn_name(lrouter['name']))])
+
+        for lrport_info in del_lrouter_ports_list:
+            self.report.add_discrepancy(
+                'router_port_missing_in_neutron', lrport_info['port'],
+                _LW("Router Port found in OVN but not in Neutron, "
+                    "port_id=%s"))
+            if self.mode == SYNC_MODE_REPAIR:
+                LOG.debug('Deleting the port %s from OVN NB DB',
+                          lrport_info['port'])
+                units.append([self.ovn_api.delete_lrouter_port(
+                    utils.ovn_lrouter_port_name(lrport_info['port']),
+                    utils.ovn_name(lrport_info['lrouter']),
+                    if_exists=False)])
+        self._commit_in_chunks('routers and router ports deletion', units)
         LOG.debug('OVN-NB Sync routers and router ports finished')
 
-    def sync_networks_and_ports(self, ctx):
+    def sync_networks_and_ports(self, ctx, network_ids=None):
+        """Sync Networks and Ports between neutron and NB.
+
+        Neutron networks and ports are read one page at a time and looked
+        up in the logical switches and ports of the NB, which are already
+        held in memory by the IDL.  Only the resources missing on either
+        side are kept.  The rows stamped with the revision number of their
+        Neutron resource are up to date, the ones stamped with an older
+        revision are rendered again from their resource.  The addresses,
+        port_security, options and enabled columns of the other logical
+        ports are compared with their rendering from the Neutron port, and
+        the drifted columns are set back in chunked transactions.
+
+        @param ctx: neutron context
+        @type  ctx: object of type neutron.context.Context
+        @param network_ids: networks to sync, all of them, or all of the
+                            shard, if None
+        @type  network_ids: []
+        @return: set of the names of the lswitches found out of sync
+        """
         LOG.debug('OVN-NB Sync networks and ports started')
-        db_networks = {}
-        for net in self.core_plugin.get_networks(ctx):
-            db_networks[utils.ovn_name(net['id'])] = net
-
-        db_ports = {}
-        for port in self.core_plugin.get_ports(ctx):
-            db_ports[port['id']] = port
-
-        lswitches = self.ovn_api.get_all_logical_switches_with_ports()
-        del_lswitchs_list = []
-        del_lports_list = []
-        for lswitch in lswitches:
-            if lswitch['name'] in db_networks:
-                for lport in lswitch['ports']:
-                    if lport in db_ports:
-                        del db_ports[lport]
-                    else:
-                        del_lports_list.append({'port': lport,
-                                                'lswitch': lswitch['name']})
-                del db_networks[lswitch['name']]
-            else:
-                del_lswitchs_list.append(lswitch)
+        lswitches = dict((lswitch['name'], lswitch['ports']) for lswitch in
+                         self.ovn_api.get_all_logical_switches_with_ports())
+        network_filters = port_filters = None
+        if network_ids is None and self.shard is not None:
+            network_ids = self._get_shard_network_ids(ctx)
+            # The lswitches left without network are hashed the same way.
+            lswitch_names = set(
+                name for name in lswitches
+                if self._in_shard(name.replace('neutron-', '', 1)))
+        elif network_ids is not None:
+            lswitch_names = set(utils.ovn_name(net_id)
+                                for net_id in network_ids)
+        if network_ids is not None:
+            lswitches = dict((name, lports) for name, lports in
+                             six.iteritems(lswitches)
+                             if name in lswitch_names)
+            network_filters = {'id': network_ids}
+            port_filters = {'network_id': network_ids}
+        lswitches_out_of_sync = set()
+        lswitch_ext_ids = self.ovn_api.get_all_logical_switches_ids()
+        lport_ext_ids = self.ovn_api.get_all_logical_ports_ids()
+        lport_columns = self.ovn_api.get_all_logical_ports_columns(
+            LPORT_DIFF_COLUMNS)
 
-        for net_id, network in db_networks.items():
-            LOG.warning(_LW("Network found in Neutron but not in "
-                            "OVN DB, network_id=%s"), network['id'])
-            if self.mode == SYNC_MODE_REPAIR:
+        bulk_rebuild = (self.mode == SYNC_MODE_REPAIR and
+                        config.is_ovn_sync_bulk_rebuild())
+        lports = {}
+        add_networks_list = []
+        for network in self._iter_resources(self.core_plugin.get_networks,
+                                            ctx, filters=network_filters):
+            self.report.mark_comparison()
+            lswitch_name = utils.ovn_name(network['id'])
+            if lswitch_name in lswitches:
+                for lport in lswitches.pop(lswitch_name):
+                    lports[lport] = lswitch_name
+                if self._is_outdated(lswitch_ext_ids.get(lswitch_name),
+                                     network):
+                    lswitches_out_of_sync.add(lswitch_name)
+                    self.report.add_discrepancy(
+                        'network_outdated', network['id'],
+                        _LW("Network outdated in OVN DB, network_id=%s"))
+                    if self.mode == SYNC_MODE_REPAIR:
+                        self._update_network_in_ovn(network)
+                continue
+            lswitches_out_of_sync.add(lswitch_name)
+            self.report.add_discrepancy(
+                'network_missing_in_ovn', network['id'],
+                _LW("Network found in Neutron but not in OVN DB, "
+                    "network_id=%s"))
+            if bulk_rebuild:
+                add_networks_list.append(network)
+            elif self.mode == SYNC_MODE_REPAIR:
                 try:
                     LOG.debug('Creating the network %s in OVN NB DB',
                               network['id'])
@@ -324,11 +971,35 @@ class OvnNbSynchronizer(db_base_plugin_v2.NeutronDbPluginV2,
                 except RuntimeError:
                     LOG.warning(_LW("Create network in OVN NB failed for"
                                     " network %s"), network['id'])
+        # The logical switches left have no Neutron network.
+        del_lswitchs_list = list(lswitches)
+        lswitches_out_of_sync.update(del_lswitchs_list)
 
-        for port_id, port in db_ports.items():
-            LOG.warning(_LW("Port found in Neutron but not in OVN "
-                            "DB, port_id=%s"), port['id'])
-            if self.mode == SYNC_MODE_REPAIR:
+        add_ports_list = []
+        update_units = []
+        for port in self._iter_resources(self.core_plugin.get_ports, ctx,
+                                         filters=port_filters):
+            if lports.pop(port['id'], None):
+                if self._is_outdated(lport_ext_ids.get(port['id']), port):
+                    lswitches_out_of_sync.add(
+                        utils.ovn_name(port['network_id']))
+                    self.report.add_discrepancy(
+                        'port_outdated', port['id'],
+                        _LW("Port outdated in OVN DB, port_id=%s"))
+                    if self.mode == SYNC_MODE_REPAIR:
+                        self._update_port_in_ovn(ctx, port)
+                elif port['id'] in lport_columns:
+                    update_units.append(self._diff_lport(
+                        ctx, port, lport_columns[port['id']],
+                        lswitches_out_of_sync))
+                continue
+            lswitches_out_of_sync.add(utils.ovn_name(port['network_id']))
+            self.report.add_discrepancy(
+                'port_missing_in_ovn', port['id'],
+                _LW("Port found in Neutron but not in OVN DB, port_id=%s"))
+            if bulk_rebuild:
+                add_ports_list.append(port)
+            elif self.mode == SYNC_MODE_REPAIR:
                 try:
                     LOG.debug('Creating the port %s in OVN NB DB',
                               port['id'])
@@ -337,23 +1008,300 @@ class OvnNbSynchronizer(db_base_plugin_v2.NeutronDbPluginV2,
                     LOG.warning(_LW("Create port in OVN NB failed for"
                                     " port %s"), port['id'])
 
-        with self.ovn_api.transaction(check_error=True) as txn:
-            for lswitch in del_lswitchs_list:
-                LOG.warning(_LW("Network found in OVN but not in "
-                                "Neutron, network_id=%s"), lswitch['name'])
-                if self.mode == SYNC_MODE_REPAIR:
-                    LOG.debug('Deleting the network %s from OVN NB DB',
-                              lswitch['name'])
-                    txn.add(self.ovn_api.delete_lswitch(
-                        lswitch_name=lswitch['name']))
-
-            for lport_info in del_lports_list:
-                LOG.warning(_LW("Port found in OVN but not in "
-                                "Neutron, port_id=%s"), lport_info['port'])
-                if self.mode == SYNC_MODE_REPAIR:
-                    LOG.debug('Deleting the port %s from OVN NB DB',
-                              lport_info['port'])
-                    txn.add(self.ovn_api.delete_lport(
-                        lport_name=lport_info['port'],
-                        lswitch=lport_info['lswitch']))
+        self._commit_in_chunks('ports update', update_units)
+        if bulk_rebuild:
+            self._bulk_create_networks_and_ports(ctx, add_networks_list,
+                                                 add_ports_list)
+
+        units = []
+        for lswitch_name in del_lswitchs_list:
+            self.report.add_discrepancy(
+                'network_missing_in_neutron', lswitch_name,
+                _LW("Network found in OVN but not in Neutron, "
+                    "network_id=%s"))
+            if self.mode == SYNC_MODE_REPAIR:
+                LOG.debug('Deleting the network %s from OVN NB DB',
+                          lswitch_name)
+                units.append([self.ovn_api.delete_lswitch(
+                    lswitch_name=lswitch_name)])
+
+        # The logical ports left have no Neutron port.
+        for lport, lswitch_name in six.iteritems(lports):
+            lswitches_out_of_sync.add(lswitch_name)
+            self.report.add_discrepancy(
+                'port_missing_in_neutron', lport,
+                _LW("Port found in OVN but not in Neutron, port_id=%s"))
+            if self.mode == SYNC_MODE_REPAIR:
+                LOG.debug('Deleting the port %s from OVN NB DB', lport)
+                units.append([self.ovn_api.delete_lport(
+                    lport_name=lport, lswitch=lswitch_name)])
+        self._commit_in_chunks('networks and ports deletion', units)
         LOG.debug('OVN-NB Sync networks and ports finished')
+        return lswitches_out_of_sync
+
+    def _get_neutron_digests(self, ctx, network_ids=None):
+        """Digest the Neutron resources each lswitch is rendered from.
+
+        A network digest covers the network, its ports and the rules of
+        their security groups, including the addresses of the members of
+        the remote groups of these rules.
+
+        @param ctx: neutron context
+        @type  ctx: object of type neutron.context.Context
+        @param network_ids: networks to digest, all of them if None
+        @type  network_ids: []
+        @return: {lswitch_name: digest}
+        """
+        network_filters = port_filters = None
+        if network_ids is not None:
+            network_filters = {'id': network_ids}
+            port_filters = {'network_id': network_ids}
+        network_digests = {}
+        for network in self._iter_resources(self.core_plugin.get_networks,
+                                            ctx, filters=network_filters):
+            network_digests[utils.ovn_name(network['id'])] = utils.digest(
+                [network.get(field) for field in NETWORK_DIGEST_FIELDS])
+
+        # The digests of the ports of a network are summed up, which does
+        # not depend on the order the ports are read in.
+        port_digests = {}
+        network_sgs = {}
+        sg_addresses = {}
+        for port in self._iter_resources(self.core_plugin.get_ports, ctx,
+                                         filters=port_filters):
+            lswitch_name = utils.ovn_name(port['network_id'])
+            port_digest = int(utils.digest(
+                [port.get(field) for field in PORT_DIGEST_FIELDS]), 16)
+            port_digests[lswitch_name] = (
+                port_digests.get(lswitch_name, 0) + port_digest) % DIGEST_MOD
+            sg_ids = port.get('security_groups') or []
+            network_sgs.setdefault(lswitch_name, set()).update(sg_ids)
+            addresses = [ip['ip_address'] for ip in port['fixed_ips']]
+            for sg_id in sg_ids:
+                sg_addresses.setdefault(sg_id, set()).update(addresses)
+
+        if network_ids is None:
+            rules = self.core_plugin.get_security_group_rules(ctx)
+        else:
+            sg_ids = set(itertools.chain(*six.itervalues(network_sgs)))
+            rules = self.core_plugin.get_security_group_rules(
+                ctx, filters={'security_group_id': list(sg_ids)}
+            ) if sg_ids else []
+            # The members of the remote groups are not all ports of the
+            # networks digested.
+            sg_addresses = self._get_sg_addresses(
+                ctx, set(rule['remote_group_id'] for rule in rules
+                         if rule.get('remote_group_id')))
+        sg_rules = {}
+        for rule in rules:
+            sg_rules.setdefault(rule['security_group_id'], []).append(
+                [rule.get(field) for field in SG_RULE_DIGEST_FIELDS] +
+                [sorted(sg_addresses.get(rule.get('remote_group_id'), []))])
+
+        digests = {}
+        for lswitch_name, network_digest in six.iteritems(network_digests):
+            sgs = [[sg_id, sorted(sg_rules.get(sg_id, []))]
+                   for sg_id in sorted(network_sgs.get(lswitch_name, []))]
+            digests[lswitch_name] = utils.digest(
+                network_digest, port_digests.get(lswitch_name, 0), sgs)
+        return digests
+
+    def _get_sg_addresses(self, ctx, sg_ids):
+        """Return the addresses of the members of security groups.
+
+        @param ctx: neutron context
+        @type  ctx: object of type neutron.context.Context
+        @param sg_ids: ids of the security groups
+        @type  sg_ids: set
+        @return: {sg_id: set of the addresses of its member ports}
+        """
+        if not sg_ids:
+            return {}
+        port_sgs = {}
+        for binding in self.core_plugin._get_port_security_group_bindings(
+                ctx, filters={'security_group_id': list(sg_ids)}):
+            port_sgs.setdefault(binding['port_id'], []).append(
+                binding['security_group_id'])
+        sg_addresses = {}
+        for port in self._iter_resources(self.core_plugin.get_ports, ctx,
+                                         filters={'id': list(port_sgs)}):
+            addresses = [ip['ip_address'] for ip in port['fixed_ips']]
+            for sg_id in port_sgs[port['id']]:
+                sg_addresses.setdefault(sg_id, set()).update(addresses)
+        return sg_addresses
+
+    @staticmethod
+    def _get_digest_counts(ctx):
+        """Count the ports of each network and the rules and members of
+        each security group.
+
+        A deletion changes these counts, it is not found by the changed
+        since filters.  Each count is a single grouped query.
+
+        @param ctx: neutron context
+        @type  ctx: object of type neutron.context.Context
+        @return: ({network_id: ports}, {sg_id: rules}, {sg_id: members})
+        """
+        port = models_v2.Port
+        rule = securitygroups_db.SecurityGroupRule
+        binding = securitygroups_db.SecurityGroupPortBinding
+        return tuple(
+            dict(ctx.session.query(key, sa_func.count()).group_by(key))
+            for key in (port.network_id, rule.security_group_id,
+                        binding.security_group_id))
+
+    @staticmethod
+    def _changed_counts(old_counts, counts):
+        """Return the keys whose count changed."""
+        return set(key for key in set(old_counts) | set(counts)
+                   if old_counts.get(key) != counts.get(key))
+
+    def _get_changed_network_ids(self, ctx, since, old_counts, counts):
+        """Find the networks whose digest may have changed since a time.
+
+        The networks, ports and security group rules created or updated
+        since then are read with the changed_since filter of the
+        timestamps of the standard attributes.  The networks whose ports
+        were deleted, and the security groups whose rules or members were
+        deleted, are found by their counts.  The networks of the ports of
+        the groups changed, or having them as remote group, are changed
+        as well.
+
+        @param ctx: neutron context
+        @type  ctx: object of type neutron.context.Context
+        @param since: time of the last digest check
+        @type  since: datetime.datetime
+        @param old_counts: _get_digest_counts() at the last digest check
+        @type  old_counts: ()
+        @param counts: _get_digest_counts() now
+        @type  counts: ()
+        @return: set of the network ids
+        """
+        filters = {'changed_since': [since.isoformat()]}
+        network_ids = set(
+            network['id'] for network in self.core_plugin.get_networks(
+                ctx, filters=filters, fields=['id']))
+        network_ids |= self._changed_counts(old_counts[0], counts[0])
+        sg_ids = self._changed_counts(old_counts[1], counts[1])
+        sg_ids |= self._changed_counts(old_counts[2], counts[2])
+        for port in self.core_plugin.get_ports(
+                ctx, filters=filters,
+                fields=['network_id', 'security_groups']):
+            network_ids.add(port['network_id'])
+            sg_ids.update(port.get('security_groups') or [])
+        sg_ids.update(rule['security_group_id'] for rule in
+                      self.core_plugin.get_security_group_rules(
+                          ctx, filters=filters,
+                          fields=['security_group_id']))
+        if not sg_ids:
+            return network_ids
+
+        sg_ids.update(rule['security_group_id'] for rule in
+                      self.core_plugin.get_security_group_rules(
+                          ctx, filters={'remote_group_id': list(sg_ids)},
+                          fields=['security_group_id']))
+        sg_binding = securitygroups_db.SecurityGroupPortBinding
+        query = ctx.session.query(models_v2.Port.network_id).join(
+            sg_binding, sg_binding.port_id == models_v2.Port.id).filter(
+            sg_binding.security_group_id.in_(sg_ids)).distinct()
+        network_ids.update(row[0] for row in query)
+        return network_ids
+
+    def _update_neutron_digests(self, ctx):
+        """Return the Neutron digests, computed again for changed networks.
+
+        The first check digests all the networks.  The next ones only
+        digest again the networks changed since the previous check, see
+        _get_changed_network_ids(), and drop the ones deleted.  Without
+        the timestamps of the standard attributes, e.g. when the
+        timestamp service plugin is not loaded, every check digests all
+        the networks.
+
+        @param ctx: neutron context
+        @type  ctx: object of type neutron.context.Context
+        @return: {lswitch_name: digest}
+        """
+        checked_at = timeutils.utcnow()
+        counts = self._get_digest_counts(ctx)
+        if self._digests_checked_at is None:
+            digests = self._get_neutron_digests(ctx)
+            sample = self.core_plugin.get_networks(
+                ctx, fields=['id', 'updated_at'], limit=1)
+            has_timestamps = bool(sample) and 'updated_at' in sample[0]
+        else:
+            # Changes committed meanwhile may be stamped with an earlier
+            # time, or by a server whose clock is late.
+            since = self._digests_checked_at - datetime.timedelta(
+                seconds=DIGEST_CHANGED_SINCE_MARGIN)
+            existing = set(network['id'] for network in
+                           self.core_plugin.get_networks(ctx, fields=['id']))
+            digests = dict((name, digest) for name, digest in
+                           six.iteritems(self._neutron_digests)
+                           if name.replace('neutron-', '', 1) in existing)
+            changed = self._get_changed_network_ids(
+                ctx, since, self._digest_counts, counts) & existing
+            LOG.debug('OVN-NB Sync digesting %d networks changed since the '
+                      'last check', len(changed))
+            if changed:
+                digests.update(self._get_neutron_digests(ctx, list(changed)))
+            has_timestamps = True
+        self._neutron_digests = digests
+        self._digest_counts = counts
+        self._digests_checked_at = checked_at if has_timestamps else None
+        return digests
+
+    def sync_network_digests(self, ctx):
+        """Sync only the networks changed since they were last in sync.
+
+        When a network is found in sync, the digests of its Neutron and
+        NB content are stored in the external_ids of its lswitch.  The
+        networks whose current digests differ from the stored ones, on
+        either side, are the only ones compared and repaired in depth.
+        Storing the digests is a write, so it is only done in repair
+        mode, and the first check compares all the networks.  The Neutron
+        digests are kept in memory between two checks, and only computed
+        again for the networks changed meanwhile.
+
+        @param ctx: neutron context
+        @type  ctx: object of type neutron.context.Context
+        @return: Nothing
+        """
+        nb_digests = self.ovn_api.get_all_logical_switch_digests()
+        neutron_digests = self._update_neutron_digests(ctx)
+        self.report.mark_comparison()
+        changed = set()
+        for lswitch_name in set(nb_digests) | set(neutron_digests):
+            nb_digest, ext_ids = nb_digests.get(lswitch_name, (None, {}))
+            if (ext_ids.get(ovn_const.OVN_NEUTRON_DIGEST_EXT_ID_KEY) !=
+                    neutron_digests.get(lswitch_name) or
+                    ext_ids.get(ovn_const.OVN_NB_DIGEST_EXT_ID_KEY) !=
+                    nb_digest):
+                changed.add(lswitch_name)
+        if not changed:
+            LOG.debug('OVN-NB Sync no network changed since the last check')
+            return
+
+        network_ids = [name.replace('neutron-', '', 1) for name in changed]
+        out_of_sync = self.sync_networks_and_ports(ctx, network_ids)
+        out_of_sync |= self.sync_acls(ctx, network_ids)
+        LOG.info(_LI("OVN-NB Sync %(changed)d networks changed since the "
+                     "last check, %(out_of_sync)d were out of sync"),
+                 {'changed': len(changed), 'out_of_sync': len(out_of_sync)})
+        if self.mode != SYNC_MODE_REPAIR:
+            return
+
+        # The digests of the networks repaired now are stored by the next
+        # check, once the IDL holds the repaired rows.
+        units = []
+        for lswitch_name in changed - out_of_sync:
+            if (lswitch_name not in nb_digests or
+                    lswitch_name not in neutron_digests):
+                continue
+            units.append([
+                self.ovn_api.set_lswitch_ext_id(
+                    lswitch_name, (ovn_const.OVN_NEUTRON_DIGEST_EXT_ID_KEY,
+                                   neutron_digests[lswitch_name])),
+                self.ovn_api.set_lswitch_ext_id(
+                    lswitch_name, (ovn_const.OVN_NB_DIGEST_EXT_ID_KEY,
+                                   nb_digests[lswitch_name][0]))])
+        self._commit_in_chunks('network digests', units)
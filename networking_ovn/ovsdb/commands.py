@@ -10,15 +10,34 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import time
+
 import six
 
 from neutron.agent.ovsdb.native.commands import BaseCommand
 from neutron.agent.ovsdb.native import idlutils
 
 from networking_ovn._i18n import _
+from networking_ovn.common import accounting
+from networking_ovn.common import acl as ovn_acl
+from networking_ovn.common import constants as ovn_const
+from networking_ovn.common import exceptions as ovn_exc
+from networking_ovn.common import stats
 from networking_ovn.common import utils
 
 
+def row_by_value(idl, table, column, match, *default):
+    # A scan of the whole table, timed per table and accounted to the
+    # request being served.
+    if accounting.current() is not None:
+        accounting.add_row_scan(len(idl.tables[table].rows))
+    start = time.time()
+    try:
+        return idlutils.row_by_value(idl, table, column, match, *default)
+    finally:
+        stats.observe('row_lookup', table, time.time() - start)
+
+
 class AddLSwitchCommand(BaseCommand):
     def __init__(self, api, name, may_exist, **columns):
         super(AddLSwitchCommand, self).__init__(api)
@@ -28,8 +47,8 @@ class AddLSwitchCommand(BaseCommand):
 
     def run_idl(self, txn):
         if self.may_exist:
-            lswitch = idlutils.row_by_value(self.api.idl, 'Logical_Switch',
-                                            'name', self.name, None)
+            lswitch = row_by_value(self.api.idl, 'Logical_Switch',
+                                   'name', self.name, None)
             if lswitch:
                 return
         row = txn.insert(self.api._tables['Logical_Switch'])
@@ -46,8 +65,8 @@ class DelLSwitchCommand(BaseCommand):
 
     def run_idl(self, txn):
         try:
-            lswitch = idlutils.row_by_value(self.api.idl, 'Logical_Switch',
-                                            'name', self.name)
+            lswitch = row_by_value(self.api.idl, 'Logical_Switch',
+                                   'name', self.name)
         except idlutils.RowNotFound:
             if self.if_exists:
                 return
@@ -67,8 +86,8 @@ class LSwitchSetExternalIdCommand(BaseCommand):
 
     def run_idl(self, txn):
         try:
-            lswitch = idlutils.row_by_value(self.api.idl, 'Logical_Switch',
-                                            'name', self.name)
+            lswitch = row_by_value(self.api.idl, 'Logical_Switch',
+                                   'name', self.name)
 
         except idlutils.RowNotFound:
             if self.if_exists:
@@ -93,16 +112,16 @@ class AddLogicalPortCommand(BaseCommand):
 
     def run_idl(self, txn):
         try:
-            lswitch = idlutils.row_by_value(self.api.idl, 'Logical_Switch',
-                                            'name', self.lswitch)
+            lswitch = row_by_value(self.api.idl, 'Logical_Switch',
+                                   'name', self.lswitch)
             ports = getattr(lswitch, 'ports', [])
         except idlutils.RowNotFound:
             msg = _("Logical Switch %s does not exist") % self.lswitch
             raise RuntimeError(msg)
         if self.may_exist:
-            port = idlutils.row_by_value(self.api.idl,
-                                         'Logical_Port', 'name',
-                                         self.lport, None)
+            port = row_by_value(self.api.idl,
+                                'Logical_Port', 'name',
+                                self.lport, None)
             if port:
                 return
 
@@ -126,8 +145,8 @@ class SetLogicalPortCommand(BaseCommand):
 
     def run_idl(self, txn):
         try:
-            port = idlutils.row_by_value(self.api.idl, 'Logical_Port',
-                                         'name', self.lport)
+            port = row_by_value(self.api.idl, 'Logical_Port',
+                                'name', self.lport)
         except idlutils.RowNotFound:
             if self.if_exists:
                 return
@@ -147,10 +166,10 @@ class DelLogicalPortCommand(BaseCommand):
 
     def run_idl(self, txn):
         try:
-            lport = idlutils.row_by_value(self.api.idl, 'Logical_Port',
-                                          'name', self.lport)
-            lswitch = idlutils.row_by_value(self.api.idl, 'Logical_Switch',
-                                            'name', self.lswitch)
+            lport = row_by_value(self.api.idl, 'Logical_Port',
+                                 'name', self.lport)
+            lswitch = row_by_value(self.api.idl, 'Logical_Switch',
+                                   'name', self.lswitch)
             ports = getattr(lswitch, 'ports', [])
         except idlutils.RowNotFound:
             if self.if_exists:
@@ -174,8 +193,8 @@ class AddLRouterCommand(BaseCommand):
 
     def run_idl(self, txn):
         if self.may_exist:
-            lrouter = idlutils.row_by_value(self.api.idl, 'Logical_Router',
-                                            'name', self.name, None)
+            lrouter = row_by_value(self.api.idl, 'Logical_Router',
+                                   'name', self.name, None)
             if lrouter:
                 return
 
@@ -194,8 +213,8 @@ class UpdateLRouterCommand(BaseCommand):
 
     def run_idl(self, txn):
         try:
-            lrouter = idlutils.row_by_value(self.api.idl, 'Logical_Router',
-                                            'name', self.name, None)
+            lrouter = row_by_value(self.api.idl, 'Logical_Router',
+                                   'name', self.name, None)
         except idlutils.RowNotFound:
             if self.if_exists:
                 return
@@ -216,8 +235,8 @@ class DelLRouterCommand(BaseCommand):
 
     def run_idl(self, txn):
         try:
-            lrouter = idlutils.row_by_value(self.api.idl, 'Logical_Router',
-                                            'name', self.name)
+            lrouter = row_by_value(self.api.idl, 'Logical_Router',
+                                   'name', self.name)
         except idlutils.RowNotFound:
             if self.if_exists:
                 return
@@ -237,14 +256,14 @@ class AddLRouterPortCommand(BaseCommand):
     def run_idl(self, txn):
 
         try:
-            lrouter = idlutils.row_by_value(self.api.idl, 'Logical_Router',
-                                            'name', self.lrouter)
+            lrouter = row_by_value(self.api.idl, 'Logical_Router',
+                                   'name', self.lrouter)
         except idlutils.RowNotFound:
             msg = _("Logical Router %s does not exist") % self.lrouter
             raise RuntimeError(msg)
         try:
-            idlutils.row_by_value(self.api.idl, 'Logical_Router_Port',
-                                  'name', self.name)
+            row_by_value(self.api.idl, 'Logical_Router_Port',
+                         'name', self.name)
             # TODO(chandrav) This might be a case of multiple prefixes
             # on the same port. yet to figure out if and how OVN needs
             # to cater to this case
@@ -269,17 +288,17 @@ class DelLRouterPortCommand(BaseCommand):
 
     def run_idl(self, txn):
         try:
-            lrouter_port = idlutils.row_by_value(self.api.idl,
-                                                 'Logical_Router_Port',
-                                                 'name', self.name)
+            lrouter_port = row_by_value(self.api.idl,
+                                        'Logical_Router_Port',
+                                        'name', self.name)
         except idlutils.RowNotFound:
             if self.if_exists:
                 return
             msg = _("Logical Router Port %s does not exist") % self.name
             raise RuntimeError(msg)
         try:
-            lrouter = idlutils.row_by_value(self.api.idl, 'Logical_Router',
-                                            'name', self.lrouter)
+            lrouter = row_by_value(self.api.idl, 'Logical_Router',
+                                   'name', self.lrouter)
         except idlutils.RowNotFound:
             msg = _("Logical Router %s does not exist") % self.lrouter
             raise RuntimeError(msg)
@@ -299,8 +318,8 @@ class SetLRouterPortInLPortCommand(BaseCommand):
 
     def run_idl(self, txn):
         try:
-            port = idlutils.row_by_value(self.api.idl, 'Logical_Port',
-                                         'name', self.lport)
+            port = row_by_value(self.api.idl, 'Logical_Port',
+                                'name', self.lport)
         except idlutils.RowNotFound:
             msg = _("Logical Port %s does not exist") % self.lport
             raise RuntimeError(msg)
@@ -319,8 +338,8 @@ class AddACLCommand(BaseCommand):
 
     def run_idl(self, txn):
         try:
-            lswitch = idlutils.row_by_value(self.api.idl, 'Logical_Switch',
-                                            'name', self.lswitch)
+            lswitch = row_by_value(self.api.idl, 'Logical_Switch',
+                                   'name', self.lswitch)
         except idlutils.RowNotFound:
             msg = _("Logical Switch %s does not exist") % self.lswitch
             raise RuntimeError(msg)
@@ -344,8 +363,8 @@ class DelACLCommand(BaseCommand):
 
     def run_idl(self, txn):
         try:
-            lswitch = idlutils.row_by_value(self.api.idl, 'Logical_Switch',
-                                            'name', self.lswitch)
+            lswitch = row_by_value(self.api.idl, 'Logical_Switch',
+                                   'name', self.lswitch)
         except idlutils.RowNotFound:
             if self.if_exists:
                 return
@@ -467,8 +486,8 @@ class UpdateACLsCommand(BaseCommand):
         lswitch_ovsdb_dict = {}
         for switch_name in self.lswitch_names:
             switch_name = utils.ovn_name(switch_name)
-            lswitch = idlutils.row_by_value(self.api.idl, 'Logical_Switch',
-                                            'name', switch_name)
+            lswitch = row_by_value(self.api.idl, 'Logical_Switch',
+                                   'name', switch_name)
             lswitch_ovsdb_dict[switch_name] = lswitch
         if self.is_add_acl:
             acl_add_values_dict = {}
@@ -528,6 +547,86 @@ class UpdateACLsCommand(BaseCommand):
             setattr(lswitch, 'acls', acls)
 
 
+class UpdateLSwitchACLsCommand(BaseCommand):
+    def __init__(self, api, lswitch, lport_acl_keys, replace, if_exists):
+        """This command updates the shared ACLs of a logical switch
+
+        @param lswitch: Logical Switch Name
+        @type lswitch: string
+        @param lport_acl_keys: Dictionary of lswitch ACL keys indexed by
+                               lport. An lport is removed from every
+                               shared ACL whose key is not listed for it.
+        @type lport_acl_keys: {}
+        @param replace: If the shared ACLs should be rebuilt from
+                        lport_acl_keys alone, dropping all other lports.
+        @type replace: Boolean.
+        @param if_exists: Do not fail if the lswitch does not exist
+        @type if_exists: Boolean.
+        """
+        super(UpdateLSwitchACLsCommand, self).__init__(api)
+        self.lswitch = lswitch
+        self.lport_acl_keys = lport_acl_keys
+        self.replace = replace
+        self.if_exists = if_exists
+
+    def run_idl(self, txn):
+        try:
+            lswitch = row_by_value(self.api.idl, 'Logical_Switch',
+                                   'name', self.lswitch)
+        except idlutils.RowNotFound:
+            if self.if_exists:
+                return
+            msg = _("Logical Switch %s does not exist") % self.lswitch
+            raise RuntimeError(msg)
+
+        lswitch.verify('acls')
+        acls = getattr(lswitch, 'acls', [])
+
+        acl_rows = {}
+        acl_members = {}
+        for acl in acls:
+            ext_ids = getattr(acl, 'external_ids', {})
+            key = ext_ids.get(ovn_const.OVN_LSWITCH_ACL_EXT_ID_KEY)
+            if key is None:
+                continue
+            # The members are read from the shared ACL and written back
+            # rewritten: were the ACL updated by another transaction
+            # meanwhile, e.g. adding another port of the lswitch, this one
+            # must be retried, not drop the other port from the ACL.
+            acl.verify('external_ids')
+            acl.verify('match')
+            acl_rows[key] = acl
+            lports = ext_ids.get(
+                ovn_const.OVN_LSWITCH_ACL_LPORTS_EXT_ID_KEY, '')
+            acl_members[key] = (set() if self.replace
+                                else set(lports.split()))
+
+        for lport, keys in six.iteritems(self.lport_acl_keys):
+            for lports in six.itervalues(acl_members):
+                lports.discard(lport)
+            for key in keys:
+                acl_members.setdefault(key, set()).add(lport)
+
+        for key, lports in six.iteritems(acl_members):
+            row = acl_rows.get(key)
+            if not lports:
+                if row is not None:
+                    acls.remove(row)
+                    row.delete()
+                continue
+            acl = ovn_acl.lswitch_acl(self.lswitch, key, lports)
+            del acl['lswitch']
+            if row is None:
+                row = txn.insert(self.api._tables['ACL'])
+                for col, val in acl.items():
+                    setattr(row, col, val)
+                acls.append(row.uuid)
+            elif getattr(row, 'match', None) != acl['match']:
+                row.match = acl['match']
+                row.external_ids = acl['external_ids']
+        setattr(lswitch, 'acls', acls)
+
+
 class AddStaticRouteCommand(BaseCommand):
     def __init__(self, api, lrouter, **columns):
         super(AddStaticRouteCommand, self).__init__(api)
@@ -536,8 +635,8 @@ class AddStaticRouteCommand(BaseCommand):
 
     def run_idl(self, txn):
         try:
-            lrouter = idlutils.row_by_value(self.api.idl, 'Logical_Router',
-                                            'name', self.lrouter)
+            lrouter = row_by_value(self.api.idl, 'Logical_Router',
+                                   'name', self.lrouter)
         except idlutils.RowNotFound:
             msg = _("Logical Router %s does not exist") % self.lrouter
             raise RuntimeError(msg)
@@ -561,8 +660,8 @@ class DelStaticRouteCommand(BaseCommand):
 
     def run_idl(self, txn):
         try:
-            lrouter = idlutils.row_by_value(self.api.idl, 'Logical_Router',
-                                            'name', self.lrouter)
+            lrouter = row_by_value(self.api.idl, 'Logical_Router',
+                                   'name', self.lrouter)
         except idlutils.RowNotFound:
             if self.if_exists:
                 return
@@ -580,3 +679,25 @@ class DelStaticRouteCommand(BaseCommand):
                 route.delete()
                 break
         setattr(lrouter, 'static_routes', static_routes)
+
+
+class CheckRevisionNumberCommand(BaseCommand):
+    def __init__(self, api, table, name, revision):
+        super(CheckRevisionNumberCommand, self).__init__(api)
+        self.table = table
+        self.name = name
+        self.revision = revision
+
+    def run_idl(self, txn):
+        row = row_by_value(self.api.idl, self.table, 'name',
+                           self.name, None)
+        if not row:
+            return
+        # Another writer stamping the row before this transaction commits
+        # makes it fail and be retried against the new revision.
+        row.verify('external_ids')
+        current = row.external_ids.get(ovn_const.OVN_REV_NUM_EXT_ID_KEY)
+        if current is not None and int(current) > int(self.revision):
+            raise ovn_exc.RevisionConflict(table=self.table, name=self.name,
+                                           current=current,
+                                           revision=self.revision)
@@ -10,56 +10,320 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+import threading
+import time
+
+from oslo_log import log
+from ovs import json as ovs_json
+from ovs import jsonrpc
 import six
 
+from neutron.agent.ovsdb import api
 from neutron.agent.ovsdb import impl_idl
-from neutron.agent.ovsdb.native import connection
 from neutron.agent.ovsdb.native import idlutils
 
-from networking_ovn._i18n import _
+from networking_ovn._i18n import _, _LI
+from networking_ovn.common import accounting
 from networking_ovn.common import config as cfg
 from networking_ovn.common import constants as ovn_const
+from networking_ovn.common import stats
 from networking_ovn.common import utils
 from networking_ovn.ovsdb import commands as cmd
 from networking_ovn.ovsdb import ovn_api
 from networking_ovn.ovsdb import ovsdb_monitor
 
+# Columns covered by the digests of the logical switches.
+LPORT_DIGEST_COLUMNS = ('name', 'type', 'addresses', 'port_security',
+                        'options', 'parent_name', 'tag', 'enabled')
+ACL_DIGEST_COLUMNS = ('priority', 'direction', 'match', 'action',
+                      'log', 'external_ids')
+# Transaction priority classes, highest first.
+TXN_PRIORITIES = (ovn_const.TXN_PRIORITY_CRITICAL,
+                  ovn_const.TXN_PRIORITY_BULK)
+# Number of times in a row a waiting transaction class can be passed over
+# for a higher one before it gets the next free slot.
+TXN_MAX_SKIPS = 10
+# Interval in seconds between two logs of the transaction queue statistics.
+TXN_STATS_LOG_INTERVAL = 300
+
+LOG = log.getLogger(__name__)
+
+
+def get_connection():
+    return ovsdb_monitor.OvnConnection(cfg.get_ovn_ovsdb_connection(),
+                                       cfg.get_ovn_ovsdb_timeout(),
+                                       'OVN_Northbound')
+
+
+def _reads_tables(f):
+    """Hold the lock of the IDL tables while reading them.
+
+    See ovsdb_monitor.OvnConnection.
+    """
+    @six.wraps(f)
+    def wrapper(self, *args, **kwargs):
+        with self.ovsdb_connection.idl_lock:
+            return f(self, *args, **kwargs)
+    return wrapper
+
+
+class TransactionScheduler(object):
+    """Hands the OVN NB DB connection to the transactions by priority.
+
+    The connection commits the transactions one at a time, so a large
+    transaction delays all the ones queued behind it.  A transaction
+    waits here for one of the [ovn] ovsdb_critical_concurrency slots
+    before being queued to the connection.  Bulk transactions take at most
+    [ovn] ovsdb_bulk_concurrency of them, a free slot goes to the waiting
+    critical transactions first, and the waiting transactions of a class
+    are served round robin between their tenants.  So that steady critical
+    traffic does not starve them, the bulk transactions get the next free
+    slot once passed over TXN_MAX_SKIPS times in a row.
+    """
+
+    def __init__(self, limits):
+        # {priority: maximum number of transactions holding a slot}
+        self._limits = limits
+        self._slots = max(six.itervalues(limits))
+        self._lock = threading.Lock()
+        self._running = dict.fromkeys(TXN_PRIORITIES, 0)
+        # {priority: times in a row passed over for a higher priority}
+        self._skips = dict.fromkeys(TXN_PRIORITIES, 0)
+        # {priority: {tenant_id: deque of events}}, the next tenant served
+        # first.
+        self._waiting = dict((priority, collections.OrderedDict())
+                             for priority in TXN_PRIORITIES)
+        self._stats = dict((priority, {'count': 0, 'wait': 0.0,
+                                       'max_wait': 0.0})
+                           for priority in TXN_PRIORITIES)
+        self._last_stats_log = time.time()
+
+    def acquire(self, priority, tenant_id=None, timeout=None):
+        """Wait for a slot.
+
+        @param priority: priority class of the transaction
+        @param tenant_id: tenant the transaction is committed for
+        @param timeout: maximum time to wait in seconds, no limit if None
+        @return: the time waited in seconds, None if no slot was given
+                 before the timeout
+        """
+        start = time.time()
+        event = threading.Event()
+        with self._lock:
+            self._waiting[priority].setdefault(
+                tenant_id, collections.deque()).append(event)
+            self._dispatch()
+        if not event.wait(timeout):
+            with self._lock:
+                # The slot may have been given since the wait timed out.
+                if not event.is_set():
+                    waiting = self._waiting[priority]
+                    waiting[tenant_id].remove(event)
+                    if not waiting[tenant_id]:
+                        del waiting[tenant_id]
+                    return None
+        wait = time.time() - start
+        with self._lock:
+            stats = self._stats[priority]
+            stats['count'] += 1
+            stats['wait'] += wait
+            stats['max_wait'] = max(stats['max_wait'], wait)
+        return wait
+
+    def release(self, priority):
+        with self._lock:
+            self._running[priority] -= 1
+            self._dispatch()
+        if time.time() - self._last_stats_log > TXN_STATS_LOG_INTERVAL:
+            self._last_stats_log = time.time()
+            LOG.info(_LI("OVN NB DB transaction queue statistics: %s"),
+                     self.get_stats())
+
+    def _dispatch(self):
+        # Called with the lock held.
+        while sum(six.itervalues(self._running)) < self._slots:
+            ready = [priority for priority in TXN_PRIORITIES
+                     if self._waiting[priority] and
+                     self._running[priority] < self._limits[priority]]
+            if not ready:
+                return
+            starved = [priority for priority in ready
+                       if self._skips[priority] >= TXN_MAX_SKIPS]
+            priority = (starved or ready)[0]
+            for skipped in ready:
+                self._skips[skipped] += 1
+            self._skips[priority] = 0
+
+            waiting = self._waiting[priority]
+            tenant_id, events = waiting.popitem(last=False)
+            event = events.popleft()
+            if events:
+                # The tenant waits behind the other tenants for its next
+                # transaction.
+                waiting[tenant_id] = events
+            self._running[priority] += 1
+            event.set()
+
+    def get_stats(self):
+        """Return the queue wait times and depth of each priority class.
+
+        @return: {priority: {'count', 'wait', 'max_wait', 'avg_wait',
+                             'waiting', 'running'}}, wait times in seconds
+        """
+        result = {}
+        with self._lock:
+            for priority in TXN_PRIORITIES:
+                stats = dict(self._stats[priority])
+                stats['avg_wait'] = (stats['wait'] / stats['count']
+                                     if stats['count'] else 0.0)
+                stats['waiting'] = sum(
+                    len(events)
+                    for events in six.itervalues(self._waiting[priority]))
+                stats['running'] = self._running[priority]
+                result[priority] = stats
+        return result
+
 
-def get_connection(trigger=None):
-    # The trigger is the start() method of the NeutronWorker class
-    if trigger and trigger.im_class == ovsdb_monitor.OvnWorker:
-        cls = ovsdb_monitor.OvnConnection
-    else:
-        cls = connection.Connection
-    return cls(cfg.get_ovn_ovsdb_connection(),
-               cfg.get_ovn_ovsdb_timeout(), 'OVN_Northbound')
+class TimedCommand(object):
+    """Proxy of a command recording how long its run_idl calls take."""
+
+    def __init__(self, command):
+        self.command = command
+        self.runs = 0
+
+    def run_idl(self, txn):
+        self.runs += 1
+        start = time.time()
+        try:
+            self.command.run_idl(txn)
+        finally:
+            stats.observe('command_run_idl', self.command.__class__.__name__,
+                          time.time() - start)
+
+    def __getattr__(self, name):
+        return getattr(self.command, name)
+
+    def __str__(self):
+        return str(self.command)
+
+
+class OvnTransaction(impl_idl.Transaction):
+    """Transaction committed once given a slot by the scheduler.
+
+    Its cost is accounted to the request it was created for, and its
+    latencies are recorded in the statistics of the process.
+    """
+
+    def __init__(self, api, ovsdb_connection, timeout, check_error=False,
+                 log_errors=True, scheduler=None,
+                 priority=ovn_const.TXN_PRIORITY_CRITICAL, tenant_id=None):
+        super(OvnTransaction, self).__init__(api, ovsdb_connection, timeout,
+                                             check_error, log_errors)
+        self.scheduler = scheduler
+        self.priority = priority
+        self.tenant_id = tenant_id
+        self.cost = accounting.current()
+
+    def commit(self):
+        start = time.time()
+        wait = self.scheduler.acquire(self.priority, self.tenant_id,
+                                      timeout=self.timeout)
+        if wait is None:
+            raise api.TimeoutException(
+                _("Commands %(commands)s exceeded timeout %(timeout)d "
+                  "seconds waiting for a transaction slot") %
+                {'commands': self.commands, 'timeout': self.timeout})
+        try:
+            return super(OvnTransaction, self).commit()
+        finally:
+            self.scheduler.release(self.priority)
+            duration = time.time() - start
+            accounting.add_transaction(self.cost, len(self.commands), wait,
+                                       duration)
+            stats.observe('transaction_queue_wait', self.priority, wait)
+            stats.observe('transaction_round_trip', self.priority, duration)
+
+    def do_commit(self):
+        commands = self.commands
+        self.commands = [TimedCommand(command) for command in commands]
+        start = time.time()
+        try:
+            # Run by the connection thread, the row scans of the commands
+            # are accounted to the request of the transaction.
+            with accounting.bind(self.cost):
+                return super(OvnTransaction, self).do_commit()
+        finally:
+            # The commands are run again when the transaction is retried.
+            retries = max(self.commands[0].runs - 1, 0) if commands else 0
+            self.commands = commands
+            stats.observe('transaction_commit', self.priority,
+                          time.time() - start)
+            stats.incr('transactions', self.priority)
+            if retries:
+                stats.incr('transaction_retries', self.priority, retries)
+
+
+def _record_transact_sizes(idl):
+    """Record the size of the transact requests sent by idl."""
+    session = idl._session
+    send = session.send
+
+    def send_and_record(msg):
+        if (msg.type == jsonrpc.Message.T_REQUEST and
+                msg.method == 'transact'):
+            stats.observe('transaction_bytes', 'transact',
+                          len(ovs_json.to_string(msg.params)),
+                          stats.SIZE_BUCKETS)
+        return send(msg)
+
+    session.send = send_and_record
 
 
 class OvsdbOvnIdl(ovn_api.API):
 
     ovsdb_connection = None
+    txn_scheduler = None
 
     def __init__(self, driver, trigger=None):
         super(OvsdbOvnIdl, self).__init__()
         if OvsdbOvnIdl.ovsdb_connection is None:
-            OvsdbOvnIdl.ovsdb_connection = get_connection(trigger)
-        if isinstance(OvsdbOvnIdl.ovsdb_connection,
-                      ovsdb_monitor.OvnConnection):
+            OvsdbOvnIdl.ovsdb_connection = get_connection()
+        if OvsdbOvnIdl.txn_scheduler is None:
+            OvsdbOvnIdl.txn_scheduler = TransactionScheduler({
+                ovn_const.TXN_PRIORITY_CRITICAL:
+                    cfg.get_ovn_ovsdb_critical_concurrency(),
+                ovn_const.TXN_PRIORITY_BULK:
+                    cfg.get_ovn_ovsdb_bulk_concurrency()})
+            stats.register_provider('transaction_queues',
+                                    OvsdbOvnIdl.txn_scheduler.get_stats)
+        # The trigger is the start() method of the NeutronWorker class
+        if trigger and trigger.im_class == ovsdb_monitor.OvnWorker:
             OvsdbOvnIdl.ovsdb_connection.start(driver)
         else:
             OvsdbOvnIdl.ovsdb_connection.start()
         self.idl = OvsdbOvnIdl.ovsdb_connection.idl
         self.ovsdb_timeout = cfg.get_ovn_ovsdb_timeout()
+        if not getattr(self.idl, '_transact_sizes_recorded', False):
+            _record_transact_sizes(self.idl)
+            self.idl._transact_sizes_recorded = True
 
     @property
     def _tables(self):
         return self.idl.tables
 
-    def transaction(self, check_error=False, log_errors=True, **kwargs):
-        return impl_idl.Transaction(self,
-                                    OvsdbOvnIdl.ovsdb_connection,
-                                    self.ovsdb_timeout,
-                                    check_error, log_errors)
+    def transaction(self, check_error=False, log_errors=True,
+                    priority=ovn_const.TXN_PRIORITY_CRITICAL, tenant_id=None,
+                    **kwargs):
+        return OvnTransaction(self,
+                              OvsdbOvnIdl.ovsdb_connection,
+                              self.ovsdb_timeout,
+                              check_error, log_errors,
+                              scheduler=OvsdbOvnIdl.txn_scheduler,
+                              priority=priority, tenant_id=tenant_id)
+
+    def get_transaction_stats(self):
+        return OvsdbOvnIdl.txn_scheduler.get_stats()
 
     def create_lswitch(self, lswitch_name, may_exist=True, **columns):
         return cmd.AddLSwitchCommand(self, lswitch_name,
@@ -95,24 +359,37 @@ class OvsdbOvnIdl(ovn_api.API):
             raise RuntimeError(_("Currently only supports "
                                  "delete by lport-name"))
 
+    @_reads_tables
     def get_all_logical_switches_ids(self):
         result = {}
         for row in self._tables['Logical_Switch'].rows.values():
             result[row.name] = row.external_ids
         return result
 
+    @_reads_tables
     def get_logical_switch_ids(self, lswitch_name):
-        for row in self._tables['Logical_Switch'].rows.values():
-            if row.name == lswitch_name:
-                return row.external_ids
-        return {}
+        try:
+            return cmd.row_by_value(self.idl, 'Logical_Switch', 'name',
+                                    lswitch_name).external_ids
+        except idlutils.RowNotFound:
+            return {}
 
+    @_reads_tables
     def get_all_logical_ports_ids(self):
         result = {}
         for row in self._tables['Logical_Port'].rows.values():
             result[row.name] = row.external_ids
         return result
 
+    @_reads_tables
+    def get_all_logical_ports_columns(self, columns):
+        result = {}
+        for row in self._tables['Logical_Port'].rows.values():
+            result[row.name] = dict((column, getattr(row, column, None))
+                                    for column in columns)
+        return result
+
+    @_reads_tables
     def get_all_logical_switches_with_ports(self):
         result = []
         for lswitch in self._tables['Logical_Switch'].rows.values():
@@ -127,6 +404,43 @@ class OvsdbOvnIdl(ovn_api.API):
                            'ports': ports})
         return result
 
+    @_reads_tables
+    def get_all_logical_switch_digests(self):
+        """Digest the logical ports and ACLs of every Neutron lswitch
+
+        The lswitch external_ids are not covered by the digest, so storing
+        the digests there does not change them.
+
+        @return: {lswitch_name: (digest, lswitch external_ids)}
+        """
+        result = {}
+        for lswitch in self._tables['Logical_Switch'].rows.values():
+            if ovn_const.OVN_NETWORK_NAME_EXT_ID_KEY not in (
+                lswitch.external_ids):
+                continue
+            lports = sorted(
+                [self._get_row_digest(lport, LPORT_DIGEST_COLUMNS)
+                 for lport in getattr(lswitch, 'ports', [])])
+            acls = sorted(
+                [self._get_row_digest(acl, ACL_DIGEST_COLUMNS)
+                 for acl in getattr(lswitch, 'acls', [])])
+            result[lswitch.name] = (utils.digest(lports, acls),
+                                    dict(lswitch.external_ids))
+        return result
+
+    @staticmethod
+    def _get_row_digest(row, columns):
+        values = []
+        for column in columns:
+            value = getattr(row, column, None)
+            if isinstance(value, list):
+                value = sorted(value)
+            elif isinstance(value, dict):
+                value = dict(value)
+            values.append(value)
+        return utils.digest(*values)
+
+    @_reads_tables
     def get_all_logical_routers_with_rports(self):
         """Get logical Router ports associated with all logical Routers
 
@@ -140,6 +454,7 @@ class OvsdbOvnIdl(ovn_api.API):
                            'ports': lrports})
         return result
 
+    @_reads_tables
     def get_acls_for_lswitches(self, lswitch_names):
         """Get the existing set of acls that belong to the logical switches
 
@@ -159,10 +474,10 @@ class OvsdbOvnIdl(ovn_api.API):
         lswitch_ovsdb_dict = {}
         for lswitch_name in lswitch_names:
             try:
-                lswitch = idlutils.row_by_value(self.idl,
-                                                'Logical_Switch',
-                                                'name',
-                                                utils.ovn_name(lswitch_name))
+                lswitch = cmd.row_by_value(self.idl,
+                                           'Logical_Switch',
+                                           'name',
+                                           utils.ovn_name(lswitch_name))
             except idlutils.RowNotFound:
                 # It is possible for the logical switch to be deleted
                 # while we are searching for it by name in idl.
@@ -223,6 +538,14 @@ class OvsdbOvnIdl(ovn_api.API):
                                      need_compare=need_compare,
                                      is_add_acl=is_add_acl)
 
+    def update_lswitch_acls(self, lswitch, lport_acl_keys, replace=False,
+                            if_exists=True):
+        return cmd.UpdateLSwitchACLsCommand(self, lswitch, lport_acl_keys,
+                                            replace, if_exists)
+
+    def check_revision_number(self, table, name, revision):
+        return cmd.CheckRevisionNumberCommand(self, table, name, revision)
+
     def add_static_route(self, lrouter, **columns):
         return cmd.AddStaticRouteCommand(self, lrouter, **columns)
 
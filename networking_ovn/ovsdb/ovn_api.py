@@ -25,6 +25,15 @@ class API(object):
         :type check_error:  bool
         :param log_errors:  Log an error if the transaction fails?
         :type log_errors:   bool
+        :param priority:    TXN_PRIORITY_CRITICAL for changes on the path of
+                            a user request, e.g. a VM boot, or
+                            TXN_PRIORITY_BULK for fan-outs and repairs,
+                            committed after the critical ones
+        :type priority:     string
+        :param tenant_id:   Tenant the transaction is committed for, the
+                            transactions of a priority are committed round
+                            robin between tenants
+        :type tenant_id:    string
         :returns: A new transaction
         :rtype: :class:`Transaction`
         """
@@ -138,6 +147,15 @@ class API(object):
         :returns: dictionary with lport name and ext ids
         """
 
+    @abc.abstractmethod
+    def get_all_logical_ports_columns(self, columns):
+        """Returns the given columns of all logical ports
+
+        :param columns: The names of the columns
+        :type columns:  list
+        :returns:       dictionary with lport name and {column: value}
+        """
+
     @abc.abstractmethod
     def create_lrouter(self, name, may_exist=True, **columns):
         """Create a command to add an OVN lrouter
@@ -264,6 +282,42 @@ class API(object):
         :type is_add_acl:             bool
         """
 
+    @abc.abstractmethod
+    def update_lswitch_acls(self, lswitch, lport_acl_keys, replace=False,
+                            if_exists=True):
+        """Update the ACLs shared by the lports of a logical switch.
+
+        :param lswitch:        The logical switch the ACLs belong to.
+        :type lswitch:         string
+        :param lport_acl_keys: Dictionary of lswitch ACL keys indexed by
+                               lport. An empty list of keys removes the
+                               lport from all shared ACLs.
+        :type lport_acl_keys:  {}
+        :param replace:        Rebuild the shared ACLs from lport_acl_keys
+                               only, instead of updating the given lports.
+        :type replace:         bool
+        :param if_exists:      Do not fail if the lswitch does not exist
+        :type if_exists:       bool
+        :returns:              :class:`Command` with no result
+        """
+
+    @abc.abstractmethod
+    def check_revision_number(self, table, name, revision):
+        """Create a command checking a row is not newer than a revision
+
+        The command fails the transaction with RevisionConflict when the
+        row was already written from a newer revision of its Neutron
+        resource, so that an out of order update is dropped as a whole.
+
+        :param table:        The table of the row
+        :type table:         string
+        :param name:         The name of the row
+        :type name:          string
+        :param revision:     The revision number of the Neutron resource
+        :type revision:      int
+        :returns:            :class:`Command` with no result
+        """
+
     @abc.abstractmethod
     def add_static_route(self, lrouter, **columns):
         """Add static route to logical router.
@@ -14,15 +14,22 @@
 
 import atexit
 from eventlet import greenthread
+from eventlet import tpool
+import hashlib
+import os
 import Queue
 import retrying
 import threading
+import time
 
 from oslo_log import log
+from oslo_serialization import jsonutils
 from ovs.db import idl
 from ovs import poller
 
-from networking_ovn._i18n import _LE
+from networking_ovn._i18n import _LE, _LI, _LW
+from networking_ovn.common import config as ovn_config
+from networking_ovn.common import stats
 from networking_ovn.ovsdb import row_event
 from neutron.agent.ovsdb.native import connection
 from neutron.agent.ovsdb.native import helpers
@@ -32,6 +39,10 @@ from neutron import worker
 
 LOG = log.getLogger(__name__)
 
+# Minimum interval in seconds between two warnings about the lag of the
+# notifications, or about the depth of their queues.
+NOTIFY_LAG_WARNING_INTERVAL = 60
+
 
 class LogicalPortCreateUpEvent(row_event.RowEvent):
     """Row create event - Logical_Port 'up' = True.
@@ -113,16 +124,42 @@ class LogicalPortUpdateDownEvent(row_event.RowEvent):
 
 
 class OvnNbNotifyHandler(object):
+    """Runs the watched events matching the OVN NB DB notifications.
+
+    The notifications are queued with the time they were received, so
+    that the lag of the events, the time from the notification to the
+    start of their run, can be recorded along with their run time, per
+    RowEvent class.  A warning is logged when the lag exceeds
+    [ovn] notify_lag_warning.
+
+    The notifications are handled by [ovn] notify_workers greenthreads,
+    each draining its own queue.  The notifications of a row always go to
+    the same queue, by the hash of the row uuid, so that the events of a
+    logical port are run in order while those of different ports are run
+    concurrently.  The queues are not bounded: notify() is called by the
+    OVN NB DB connection, which also commits the transactions of the
+    workers, so waiting there for a worker to catch up would deadlock.  A
+    warning is logged instead when a queue holds more than
+    [ovn] notify_queue_warning notifications.
+    """
 
-    STOP_EVENT = ("STOP", None, None, None)
+    STOP_EVENT = ("STOP", None, None, None, None)
 
     def __init__(self, driver):
         self.driver = driver
         self.__watched_events = set()
         self.__lock = threading.Lock()
-        self.notifications = Queue.Queue()
-        self.notify_thread = greenthread.spawn_n(self.notify_loop)
+        self.notification_queues = [
+            Queue.Queue() for i in range(ovn_config.get_ovn_notify_workers())]
+        self.processed = 0
+        self.max_lag = 0.0
+        self.max_depth = 0
+        self._last_lag_warning = 0
+        self._last_depth_warning = 0
+        self.notify_threads = [greenthread.spawn(self.notify_loop, queue)
+                               for queue in self.notification_queues]
         atexit.register(self.shutdown)
+        stats.register_provider('notify_queue', self.get_stats)
 
     def matching_events(self, event, row, updates):
         with self.__lock:
@@ -157,31 +194,97 @@ class OvnNbNotifyHandler(object):
                     pass
 
     def shutdown(self):
-        self.notifications.put(OvnNbNotifyHandler.STOP_EVENT)
+        for queue in self.notification_queues:
+            queue.put(OvnNbNotifyHandler.STOP_EVENT)
 
-    def notify_loop(self):
+    def notify_loop(self, notifications):
         while True:
             try:
-                match, event, row, updates = self.notifications.get()
+                notification = notifications.get()
+                match, event, row, updates, queued_at = notification
                 if (not isinstance(match, row_event.RowEvent) and
-                        (match, event, row, updates) == (
-                            OvnNbNotifyHandler.STOP_EVENT)):
-                    self.notifications.task_done()
+                        notification == OvnNbNotifyHandler.STOP_EVENT):
+                    notifications.task_done()
                     break
-                match.run(event, row, updates)
+                start = time.time()
+                self._record_lag(match, start - queued_at)
+                try:
+                    match.run(event, row, updates)
+                finally:
+                    self.processed += 1
+                    stats.observe('notify_run', match.__class__.__name__,
+                                  time.time() - start)
                 if match.ONETIME:
                     self.unwatch_event(match)
-                self.notifications.task_done()
+                notifications.task_done()
             except Exception:
                 # If any unexpected exception happens we don't want the
                 # notify_loop to exit.
                 LOG.exception(_LE('Unexpected exception in notify_loop'))
 
+    def _record_lag(self, match, lag):
+        stats.observe('notify_lag', match.__class__.__name__, lag)
+        self.max_lag = max(self.max_lag, lag)
+        now = time.time()
+        if (lag > ovn_config.get_ovn_notify_lag_warning() and
+                now - self._last_lag_warning > NOTIFY_LAG_WARNING_INTERVAL):
+            self._last_lag_warning = now
+            LOG.warning(_LW("OVN NB DB notifications are handled %(lag).1f "
+                            "seconds after being received, %(depth)d "
+                            "notifications are queued"),
+                        {'lag': lag,
+                         'depth': sum(queue.qsize()
+                                      for queue in self.notification_queues)})
+
+    def get_stats(self):
+        """Return the depth of the queues and the lag of the notifications.
+
+        @return: dict with the number of notifications queued as depth,
+                 and per worker as worker_depths, the time in seconds the
+                 oldest of them has been queued as oldest_age, the number
+                 of notifications handled so far, the maximum lag seen and
+                 the maximum depth of a worker queue seen
+        """
+        depths = []
+        oldest = None
+        for queue in self.notification_queues:
+            with queue.mutex:
+                depths.append(len(queue.queue))
+                # None for the STOP_EVENT.
+                queued_at = queue.queue[0][4] if queue.queue else None
+                if queued_at is not None:
+                    oldest = (queued_at if oldest is None
+                              else min(oldest, queued_at))
+        oldest_age = time.time() - oldest if oldest is not None else 0.0
+        return {'depth': sum(depths),
+                'worker_depths': depths,
+                'oldest_age': oldest_age,
+                'processed': self.processed,
+                'max_lag': self.max_lag,
+                'max_depth': self.max_depth}
+
+    def _get_queue(self, row):
+        index = hash(row.uuid) % len(self.notification_queues)
+        return self.notification_queues[index]
+
     def notify(self, event, row, updates=None):
         matching = self.matching_events(
             event, row, updates)
+        if not matching:
+            return
+        now = time.time()
+        queue = self._get_queue(row)
         for match in matching:
-            self.notifications.put((match, event, row, updates))
+            queue.put((match, event, row, updates, now))
+        self._record_depth(queue.qsize(), now)
+
+    def _record_depth(self, depth, now):
+        self.max_depth = max(self.max_depth, depth)
+        if (depth > ovn_config.get_ovn_notify_queue_warning() and
+                now - self._last_depth_warning > NOTIFY_LAG_WARNING_INTERVAL):
+            self._last_depth_warning = now
+            LOG.warning(_LW("%d OVN NB DB notifications are queued for a "
+                            "notify worker"), depth)
 
 
 class OvnIdl(idl.Idl):
@@ -194,6 +297,8 @@ class OvnIdl(idl.Idl):
         self._lp_create_down_event = LogicalPortCreateDownEvent(driver)
 
         self.notify_handler = OvnNbNotifyHandler(driver)
+        # Set while the IDL is run on a native thread, see OvnConnection.
+        self.deferred_notifications = None
         self.notify_handler.watch_events([self._lp_create_up_event,
                                           self._lp_create_down_event,
                                           self._lp_update_up_event,
@@ -218,6 +323,9 @@ class OvnIdl(idl.Idl):
         self.event_lock_name = "neutron_ovn_event_lock"
 
     def notify(self, event, row, updates=None):
+        if self.deferred_notifications is not None:
+            self.deferred_notifications.append((event, row, updates))
+            return
         # Do not handle the notification if the event lock is requested,
         # but not granted by the ovsdb-server.
         if (self.is_lock_contended and not self.has_lock):
@@ -243,42 +351,207 @@ class OvnIdl(idl.Idl):
 
 
 class OvnConnection(connection.Connection):
+    """Connection to the OVN NB DB.
+
+    With [ovn] ovsdb_native_thread, Idl.run(), which receives, parses and
+    applies the OVSDB messages without yielding, is run on a native thread
+    of the eventlet thread pool while the connection greenthread waits.
+    On a greenthread, a large update, e.g. the initial dump of the
+    database, would hold every other greenthread of the process, the ones
+    handling API requests among them, until applied.
+
+    The greenthreads reading the tables of the IDL hold idl_lock, which the
+    connection greenthread holds while the IDL is run.  The OvnIdl
+    notifications, which queue events for greenthreads, are deferred until
+    the run is over and then handled by the connection greenthread.  The
+    OVSDB transactions are still committed by the connection greenthread.
+
+    With [ovn] ovsdb_schema_cache_dir, the schema of the database is read
+    from a file of that directory, per connection and schema name, instead
+    of being fetched from the ovsdb-server, and only fetched to create the
+    file.  The cached schema is checked by the IDL monitoring the tables and
+    columns it gives: were one of them dropped from the database, the IDL
+    would get no reply, and the start is retried with the fetched schema.
+    The OVN worker also fetches the schema once started, to update the
+    file when the version of the schema changed.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(OvnConnection, self).__init__(*args, **kwargs)
+        self.idl_lock = threading.Lock()
 
-    def start(self, driver):
+    def start(self, driver=None):
         # The implementation of this function is same as the base class start()
-        # except that OvnIdl object is created instead of idl.Idl
+        # except that, given the driver, OvnIdl object is created instead of
+        # idl.Idl, that the IDL run is wrapped and that the schema may be
+        # read from its cache.
         with self.lock:
             if self.idl is not None:
                 return
 
-            try:
-                helper = idlutils.get_schema_helper(self.connection,
-                                                    self.schema_name)
-            except Exception:
-                # We may have failed do to set-manager not being called
-                helpers.enable_connection_uri(self.connection)
-
-                # There is a small window for a race, so retry up to a second
-                @retrying.retry(wait_exponential_multiplier=10,
-                                stop_max_delay=1000)
-                def do_get_schema_helper():
-                    return idlutils.get_schema_helper(self.connection,
-                                                      self.schema_name)
-                helper = do_get_schema_helper()
-
-            helper.register_all()
-            self.idl = OvnIdl(driver, self.connection, helper)
-            self.idl.set_lock(self.idl.event_lock_name)
-            idlutils.wait_for_change(self.idl, self.timeout)
-            # We would have received the initial dump of all the logical
-            # ports as events by now. Unwatch the create events for
-            # logical ports as it is no longer necessary.
-            self.idl.unwatch_logical_port_create_events()
+            cache_file = self._get_schema_cache_file()
+            helper = None
+            if cache_file:
+                helper = self._load_schema_helper(cache_file)
+            if helper:
+                try:
+                    self._start_idl(driver, helper)
+                except Exception:
+                    LOG.warning(_LW("Unable to start the %(schema)s IDL "
+                                    "with the schema cached in %(file)s, "
+                                    "fetching it"),
+                                {'schema': self.schema_name,
+                                 'file': cache_file})
+                    self._stop_idl()
+                    helper = None
+                else:
+                    if driver:
+                        greenthread.spawn_n(self._check_schema_cache,
+                                            cache_file, helper)
+            if not helper:
+                helper = self._fetch_schema_helper()
+                if cache_file:
+                    self._write_schema_cache(cache_file, helper)
+                self._start_idl(driver, helper)
+
+            if driver:
+                # We would have received the initial dump of all the logical
+                # ports as events by now. Unwatch the create events for
+                # logical ports as it is no longer necessary.
+                self.idl.unwatch_logical_port_create_events()
             self.poller = poller.Poller()
             self.thread = threading.Thread(target=self.run)
             self.thread.setDaemon(True)
             self.thread.start()
 
+    def _start_idl(self, driver, helper):
+        helper.register_all()
+        if driver:
+            self.idl = OvnIdl(driver, self.connection, helper)
+            self.idl.set_lock(self.idl.event_lock_name)
+        else:
+            self.idl = idl.Idl(self.connection, helper)
+        self._wrap_idl_run(ovn_config.is_ovn_ovsdb_native_thread())
+        idlutils.wait_for_change(self.idl, self.timeout)
+
+    def _stop_idl(self):
+        if self.idl is None:
+            return
+        if isinstance(self.idl, OvnIdl):
+            self.idl.notify_handler.shutdown()
+        self.idl.close()
+        self.idl = None
+
+    def _fetch_schema_helper(self):
+        try:
+            return idlutils.get_schema_helper(self.connection,
+                                              self.schema_name)
+        except Exception:
+            # We may have failed do to set-manager not being called
+            helpers.enable_connection_uri(self.connection)
+
+            # There is a small window for a race, so retry up to a second
+            @retrying.retry(wait_exponential_multiplier=10,
+                            stop_max_delay=1000)
+            def do_get_schema_helper():
+                return idlutils.get_schema_helper(self.connection,
+                                                  self.schema_name)
+            return do_get_schema_helper()
+
+    def _get_schema_cache_file(self):
+        cache_dir = ovn_config.get_ovn_ovsdb_schema_cache_dir()
+        if not cache_dir:
+            return None
+        key = hashlib.sha1(self.connection.encode('utf-8')).hexdigest()
+        return os.path.join(cache_dir,
+                            '%s-%s.ovsschema' % (self.schema_name, key[:16]))
+
+    def _load_schema_helper(self, cache_file):
+        """Return the schema helper of the cached schema.
+
+        @param cache_file: the file caching the schema
+        @type cache_file: string
+        @return: the schema helper, None if the schema is not cached
+        """
+        try:
+            with open(cache_file) as f:
+                schema_json = jsonutils.load(f)
+        except IOError:
+            return None
+        except ValueError:
+            LOG.warning(_LW("Ignoring the corrupt OVSDB schema cache %s"),
+                        cache_file)
+            return None
+        return idl.SchemaHelper(schema_json=schema_json)
+
+    def _write_schema_cache(self, cache_file, helper):
+        # Write then rename, the workers starting meanwhile must not read
+        # a truncated schema.
+        tmp_file = '%s.%d.tmp' % (cache_file, os.getpid())
+        try:
+            with open(tmp_file, 'w') as f:
+                jsonutils.dump(helper.schema_json, f)
+            os.rename(tmp_file, cache_file)
+        except (IOError, OSError) as e:
+            LOG.warning(_LW("Unable to cache the OVSDB schema in %(file)s: "
+                            "%(error)s"), {'file': cache_file, 'error': e})
+
+    def _check_schema_cache(self, cache_file, cached_helper):
+        """Update the cached schema if its version changed.
+
+        @param cache_file: the file caching the schema
+        @type cache_file: string
+        @param cached_helper: the schema helper of the cached schema
+        @type cached_helper: ovs.db.idl.SchemaHelper
+        """
+        try:
+            helper = self._fetch_schema_helper()
+        except Exception:
+            LOG.exception(_LE("Unable to fetch the %s schema to check its "
+                              "cache"), self.schema_name)
+            return
+        cached_version = cached_helper.schema_json.get('version')
+        version = helper.schema_json.get('version')
+        if version == cached_version:
+            return
+        self._write_schema_cache(cache_file, helper)
+        LOG.info(_LI("The %(schema)s schema cached in %(file)s was updated "
+                     "from version %(cached)s to %(version)s, the "
+                     "neutron-server processes started with the cached "
+                     "version must be restarted"),
+                 {'schema': self.schema_name, 'file': cache_file,
+                  'cached': cached_version, 'version': version})
+
+    def _wrap_idl_run(self, native):
+        """Wrap the IDL run to record its duration, and run it natively.
+
+        @param native: whether to run the IDL on a native thread
+        @type native: bool
+        """
+        run = self.idl.run
+        key = 'native' if native else 'greenthread'
+
+        def wrapper():
+            start = time.time()
+            if not native:
+                try:
+                    return run()
+                finally:
+                    stats.observe('idl_run', key, time.time() - start)
+
+            notifications = []
+            self.idl.deferred_notifications = notifications
+            try:
+                with self.idl_lock:
+                    return tpool.execute(run)
+            finally:
+                self.idl.deferred_notifications = None
+                stats.observe('idl_run', key, time.time() - start)
+                for notification in notifications:
+                    self.idl.notify(*notification)
+
+        self.idl.run = wrapper
+
 
 class OvnWorker(worker.NeutronWorker):
     def start(self):
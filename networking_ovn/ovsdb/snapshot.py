@@ -0,0 +1,313 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Offline copies of the OVN Northbound database.
+
+A snapshot is loaded into rows shaped like the ones of the OVSDB IDL, so
+that the read methods of OvsdbOvnIdl work on it unchanged.  Two kinds of
+files are supported:
+
+ * an OVSDB standalone database file, i.e. a copy of ovnnb_db.db or the
+   output of 'ovsdb-client backup', which embeds its schema;
+ * a JSON dump made with
+   'ovsdb-client dump --format=json --data=json <server> OVN_Northbound',
+   along with the schema given by 'ovsdb-client get-schema', as the dump
+   does not tell the sets of one value from scalars.
+"""
+
+import json
+import threading
+
+import six
+
+from networking_ovn._i18n import _
+from networking_ovn.ovsdb import impl_idl_ovn
+
+DB_FILE_MAGIC = b'OVSDB JSON '
+# Value of the scalar columns left out of the rows, by atomic type.
+ATOM_DEFAULTS = {'integer': 0, 'real': 0.0, 'boolean': False, 'string': ''}
+
+
+class SnapshotRow(object):
+    """A row of a snapshot, with the columns as attributes."""
+
+    def __init__(self, uuid, data):
+        self.uuid = uuid
+        self._data = data
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__['_data'][name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __repr__(self):
+        return 'SnapshotRow(%s)' % self.uuid
+
+
+class SnapshotTable(object):
+
+    def __init__(self, name):
+        self.name = name
+        self.rows = {}
+
+
+class SnapshotIdl(object):
+    """The tables of a snapshot, in place of an ovs.db.idl.Idl."""
+
+    def __init__(self, tables):
+        self.tables = tables
+
+
+class SnapshotConnection(object):
+    """Stands for the OVSDB connection of the IDL a snapshot replaces.
+
+    The read methods of OvsdbOvnIdl hold the lock of the IDL tables of
+    the connection, no one updates the tables of a snapshot though.
+    """
+
+    def __init__(self):
+        self.idl_lock = threading.Lock()
+
+
+class OvsdbSnapshotIdl(impl_idl_ovn.OvsdbOvnIdl):
+    """Read-only OVN NB API answering from a snapshot.
+
+    The commands can still be created, so that a log mode sync runs
+    unchanged, but no transaction can be committed.
+    """
+
+    def __init__(self, idl):
+        self.idl = idl
+        self.ovsdb_timeout = None
+        # No OvsdbOvnIdl, and so no connection, is created by an audit
+        # of a snapshot.
+        self.ovsdb_connection = SnapshotConnection()
+
+    def transaction(self, check_error=False, log_errors=True, **kwargs):
+        raise RuntimeError(_("The OVN NB snapshot is read-only"))
+
+
+def load(path, schema_path=None):
+    """Load a snapshot of the OVN NB database.
+
+    @param path: OVSDB database file or JSON dump of the database
+    @type  path: string
+    @param schema_path: OVSDB schema of the database, only needed for a
+                        JSON dump
+    @type  schema_path: string
+    @return: SnapshotIdl of the database
+    """
+    with open(path, 'rb') as f:
+        content = f.read()
+    if content.startswith(DB_FILE_MAGIC):
+        records = _read_db_file(content)
+        schema = records.pop(0)
+        rows = _replay(schema, records)
+    else:
+        if not schema_path:
+            raise ValueError(_("A schema file is needed to load the JSON "
+                               "dump %s") % path)
+        with open(schema_path) as f:
+            schema = json.load(f)
+        rows = _read_dump(content.decode('utf-8'))
+    return _build_idl(schema, rows)
+
+
+def _read_db_file(content):
+    """Return the JSON records of an OVSDB standalone database file.
+
+    Each record is a 'OVSDB JSON <length> <sha1>' header line followed by
+    a JSON text of <length> bytes.
+    """
+    records = []
+    offset = 0
+    while offset < len(content):
+        end = content.find(b'\n', offset)
+        if end < 0:
+            end = len(content)
+        header = content[offset:end].strip()
+        offset = end + 1
+        if not header:
+            continue
+        if not header.startswith(DB_FILE_MAGIC):
+            raise ValueError(_("Unsupported OVSDB file record %s") %
+                             header[:64].decode('utf-8', 'replace'))
+        length = int(header.split()[2])
+        records.append(json.loads(
+            content[offset:offset + length].decode('utf-8')))
+        offset += length
+    if not records:
+        raise ValueError(_("The OVSDB file has no schema"))
+    return records
+
+
+def _replay(schema, records):
+    """Apply the transaction records of a database file.
+
+    Records flagged with _is_diff hold the difference of the modified
+    set and map columns instead of their new value.
+
+    @return: {table: {uuid: {column: OVSDB JSON value}}}
+    """
+    rows = {}
+    for record in records:
+        is_diff = record.get('_is_diff', False)
+        for table, changes in six.iteritems(record):
+            if table.startswith('_'):
+                # _date, _comment and _is_diff are not tables.
+                continue
+            columns = schema['tables'][table]['columns']
+            table_rows = rows.setdefault(table, {})
+            for uuid, row in six.iteritems(changes):
+                if row is None:
+                    table_rows.pop(uuid, None)
+                elif uuid not in table_rows or not is_diff:
+                    table_rows.setdefault(uuid, {}).update(row)
+                else:
+                    old_row = table_rows[uuid]
+                    for column, diff in six.iteritems(row):
+                        old_row[column] = _apply_diff(
+                            old_row.get(column), diff,
+                            columns[column]['type'])
+    return rows
+
+
+def _items(value):
+    if value is None:
+        return []
+    if isinstance(value, list) and value[0] in ('set', 'map'):
+        return value[1]
+    return [value]
+
+
+def _apply_diff(value, diff, column_type):
+    """Apply the diff of a column to its OVSDB JSON value.
+
+    Set diffs toggle their values.  Map diffs remove the pairs they
+    repeat and add or replace the others.
+    """
+    if (not isinstance(column_type, dict) or
+            (column_type.get('min', 1) == 1 and
+             column_type.get('max', 1) == 1)):
+        return diff
+    if 'value' in column_type:
+        pairs = dict((json.dumps(k, sort_keys=True), [k, v])
+                     for k, v in _items(value))
+        for k, v in _items(diff):
+            key = json.dumps(k, sort_keys=True)
+            if key in pairs and pairs[key][1] == v:
+                del pairs[key]
+            else:
+                pairs[key] = [k, v]
+        return ['map', list(pairs.values())]
+    atoms = dict((json.dumps(atom, sort_keys=True), atom)
+                 for atom in _items(value))
+    for atom in _items(diff):
+        key = json.dumps(atom, sort_keys=True)
+        if key in atoms:
+            del atoms[key]
+        else:
+            atoms[key] = atom
+    return ['set', list(atoms.values())]
+
+
+def _read_dump(content):
+    """Return the rows of an 'ovsdb-client dump' in JSON format.
+
+    The dump is a sequence of JSON objects, one per table, with a
+    '<table> table' caption, the column headings and the rows.
+
+    @return: {table: {uuid: {column: OVSDB JSON value}}}
+    """
+    decoder = json.JSONDecoder()
+    rows = {}
+    offset = 0
+    content = content.strip()
+    while offset < len(content):
+        table, offset = decoder.raw_decode(content, offset)
+        while offset < len(content) and content[offset].isspace():
+            offset += 1
+        name = table['caption'].rsplit(' ', 1)[0]
+        table_rows = rows.setdefault(name, {})
+        for values in table.get('data', []):
+            row = dict(zip(table['headings'], values))
+            uuid = row.pop('_uuid')[1]
+            row.pop('_version', None)
+            table_rows[uuid] = row
+    return rows
+
+
+def _build_idl(schema, rows):
+    tables = {}
+    for name in schema['tables']:
+        tables[name] = SnapshotTable(name)
+        for uuid, row in six.iteritems(rows.get(name, {})):
+            tables[name].rows[uuid] = SnapshotRow(uuid, row)
+
+    # Decode the values once all the rows exist, so that references can
+    # point to the rows of any table.
+    for name, table_schema in six.iteritems(schema['tables']):
+        columns = table_schema['columns']
+        for row in tables[name].rows.values():
+            data = {}
+            for column, column_schema in six.iteritems(columns):
+                data[column] = _decode_datum(row._data.get(column),
+                                             column_schema['type'], tables)
+            row._data = data
+    return SnapshotIdl(tables)
+
+
+def _decode_datum(value, column_type, tables):
+    """Decode an OVSDB JSON value as the IDL would.
+
+    Maps are dicts, scalars (exactly one value) are bare values and the
+    other sets, including the optional values, are lists.  References are
+    replaced by the rows they point to, dangling ones are dropped.
+    """
+    if not isinstance(column_type, dict):
+        column_type = {'key': column_type}
+    key_type = column_type['key']
+    value_type = column_type.get('value')
+    n_min = column_type.get('min', 1)
+    n_max = column_type.get('max', 1)
+
+    items = _items(value)
+    if value_type is not None:
+        result = {}
+        for k, v in items:
+            k = _decode_atom(k, key_type, tables)
+            v = _decode_atom(v, value_type, tables)
+            if k is not None and v is not None:
+                result[k] = v
+        return result
+
+    atoms = [_decode_atom(item, key_type, tables) for item in items]
+    atoms = [atom for atom in atoms if atom is not None]
+    if n_min == 1 and n_max == 1:
+        if atoms:
+            return atoms[0]
+        atomic_type = (key_type.get('type')
+                       if isinstance(key_type, dict) else key_type)
+        return ATOM_DEFAULTS.get(atomic_type)
+    return atoms
+
+
+def _decode_atom(value, atom_type, tables):
+    if isinstance(value, list):
+        # ["uuid", <uuid>]
+        value = value[1]
+    ref_table = (atom_type.get('refTable')
+                 if isinstance(atom_type, dict) else None)
+    if ref_table:
+        return tables[ref_table].rows.get(value)
+    return value
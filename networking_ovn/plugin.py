@@ -12,6 +12,7 @@
 #    under the License.
 
 import collections
+import weakref
 
 import netaddr
 
@@ -67,15 +68,18 @@ from neutron.extensions import extra_dhcp_opt as edo_ext
 from neutron.extensions import portbindings
 from neutron.extensions import portsecurity as psec
 from neutron.extensions import providernet as pnet
-from neutron.objects.qos import policy as qos_policy
 from neutron.objects.qos import rule as qos_rule
 from neutron.services.qos import qos_consts
 
 from networking_ovn._i18n import _, _LE, _LI, _LW
+from networking_ovn.common import accounting
 from networking_ovn.common import acl as acl_utils
+from networking_ovn.common import cache
 from networking_ovn.common import config
 from networking_ovn.common import constants as ovn_const
+from networking_ovn.common import exceptions as ovn_exc
 from networking_ovn.common import extensions
+from networking_ovn.common import stats
 from networking_ovn.common import utils
 from networking_ovn import ovn_nb_sync
 from networking_ovn.ovsdb import impl_idl_ovn
@@ -117,10 +121,17 @@ class OVNPlugin(db_base_plugin_v2.NeutronDbPluginV2,
         self._setup_base_binding_dict()
 
         self.core_ext_handler = qos_core.QosCoreResourceExtension()
+        self._subnet_cache = cache.SubnetCache()
+        self._subnet_cache.subscribe()
+        # The QoS options are only cached for the duration of a request,
+        # see _get_qos_cache().
+        self._qos_cache = None
+        self._qos_request_caches = weakref.WeakKeyDictionary()
         registry.subscribe(self.post_fork_initialize, resources.PROCESS,
                            events.AFTER_CREATE)
         callbacks_registry.subscribe(self._handle_qos_notification,
                                      callbacks_resources.QOS_POLICY)
+        stats.install_signal_handler()
         self._setup_dhcp()
         self._start_rpc_notifiers()
 
@@ -221,6 +232,7 @@ class OVNPlugin(db_base_plugin_v2.NeutronDbPluginV2,
             fanout=False)
         return self.conn.consume_in_threads()
 
+    @accounting.track
     def _handle_qos_notification(self, qos_policy, event_type):
         if event_type == callbacks_events.UPDATED:
             if hasattr(qos_policy, "rules"):
@@ -231,19 +243,52 @@ class OVNPlugin(db_base_plugin_v2.NeutronDbPluginV2,
                     self._update_network_qos(
                         context, binding.network_id, qos_policy.id)
 
-                port_bindings = qos_policy.get_bound_ports()
-                for binding in port_bindings:
-                    port = self.get_port(context, binding.port_id)
-                    qos_options = self.qos_get_ovn_port_options(
-                        context, port)
+                port_ids = [binding.port_id
+                            for binding in qos_policy.get_bound_ports()]
+                self._update_ports_qos(context, port_ids, qos_policy.id)
 
-                    binding_profile = self.get_data_from_binding_profile(
-                        context, port)
-                    ovn_port_info = self.get_ovn_port_options(binding_profile,
-                                                              qos_options,
-                                                              port)
-                    self._update_port_in_ovn(context, port,
-                                             port, ovn_port_info)
+    def _update_ports_qos(self, context, port_ids, policy_id):
+        """Set the QoS options of the ports bound to a policy.
+
+        The options of the policy are computed once and the ports loaded
+        in one query.  The ports the rules of the policy do not apply to
+        get the options of their network policy, as in
+        qos_get_ovn_port_options.  The vtep ports have no QoS options.
+        """
+        if not port_ids:
+            return
+        rules, policy_options = self._get_qos_cache(context).get_policy(
+            context, policy_id)
+        lport_options = []
+        for port in self.get_ports(context, filters={'id': port_ids}):
+            binding_profile = self.get_data_from_binding_profile(context,
+                                                                 port)
+            if binding_profile.get('vtep_physical_switch'):
+                continue
+            if all(rule.should_apply_to_port(port) for rule in rules):
+                options = policy_options
+            else:
+                options = self.qos_get_ovn_port_options(context, port)
+            lport_options.append((port['id'], options))
+        self._set_lports_qos_options(lport_options)
+
+    def _set_lports_qos_options(self, lport_options):
+        """Set the options column of logical ports, and only this one.
+
+        @param lport_options: (lport name, options) of the logical ports,
+                              set in transactions of at most
+                              [ovn] qos_transaction_size ports
+        @type  lport_options: []
+        """
+        chunk_size = config.get_ovn_qos_transaction_size()
+        for start in range(0, len(lport_options), chunk_size):
+            with self._ovn.transaction(
+                    check_error=True,
+                    priority=ovn_const.TXN_PRIORITY_BULK) as txn:
+                for lport_name, options in lport_options[
+                        start:start + chunk_size]:
+                    txn.add(self._ovn.set_lport(lport_name=lport_name,
+                                                options=options))
 
     def _get_attribute(self, obj, attribute):
         res = obj.get(attribute)
@@ -281,6 +326,7 @@ class OVNPlugin(db_base_plugin_v2.NeutronDbPluginV2,
         return (nets if not fields else
                 [self._fields(net, fields) for net in nets])
 
+    @accounting.track
     def create_network(self, context, network):
         net = network['network']  # obviously..
         ext_ids = {}
@@ -348,29 +394,37 @@ class OVNPlugin(db_base_plugin_v2.NeutronDbPluginV2,
         # Create a logical switch with a name equal to the Neutron network
         # UUID.  This provides an easy way to refer to the logical switch
         # without having to track what UUID OVN assigned to it.
+        with self._ovn.transaction(check_error=True,
+                                   tenant_id=network['tenant_id']) as txn:
+            for cmd in self._create_network_in_ovn_cmds(network, ext_ids,
+                                                        physnet, segid):
+                txn.add(cmd)
+        return network
+
+    def _create_network_in_ovn_cmds(self, network, ext_ids,
+                                    physnet=None, segid=None):
         ext_ids.update({
             ovn_const.OVN_NETWORK_NAME_EXT_ID_KEY: network['name']
         })
-
+        utils.stamp_revision_number(ext_ids, network)
         lswitch_name = utils.ovn_name(network['id'])
-        with self._ovn.transaction(check_error=True) as txn:
-            txn.add(self._ovn.create_lswitch(
+        cmds = [self._ovn.create_lswitch(lswitch_name=lswitch_name,
+                                         external_ids=ext_ids)]
+        if physnet:
+            vlan_id = None
+            if segid is not None:
+                vlan_id = int(segid)
+            cmds.append(self._ovn.create_lport(
+                lport_name='provnet-%s' % network['id'],
                 lswitch_name=lswitch_name,
-                external_ids=ext_ids))
-            if physnet:
-                vlan_id = None
-                if segid is not None:
-                    vlan_id = int(segid)
-                txn.add(self._ovn.create_lport(
-                    lport_name='provnet-%s' % network['id'],
-                    lswitch_name=lswitch_name,
-                    addresses=['unknown'],
-                    external_ids=None,
-                    type='localnet',
-                    tag=vlan_id,
-                    options={'network_name': physnet}))
-        return network
-
+                addresses=['unknown'],
+                external_ids=None,
+                type='localnet',
+                tag=vlan_id,
+                options={'network_name': physnet}))
+        return cmds
+
+    @accounting.track
     def delete_network(self, context, network_id):
         first_try = True
         while True:
@@ -422,10 +476,53 @@ class OVNPlugin(db_base_plugin_v2.NeutronDbPluginV2,
             utils.ovn_name(network_id),
             ext_id).execute(check_error=True)
 
+    def _set_network_revision_number(self, network):
+        # Stamp the lswitch with the revision and name of the network,
+        # unless it was already updated from a newer revision.
+        revision = utils.get_revision_number(network)
+        if revision is None:
+            return
+        lswitch_name = utils.ovn_name(network['id'])
+        try:
+            with self._ovn.transaction(check_error=True,
+                                       log_errors=False) as txn:
+                txn.add(self._ovn.check_revision_number(
+                    'Logical_Switch', lswitch_name, revision))
+                txn.add(self._ovn.set_lswitch_ext_id(
+                    lswitch_name,
+                    [ovn_const.OVN_NETWORK_NAME_EXT_ID_KEY, network['name']]))
+                txn.add(self._ovn.set_lswitch_ext_id(
+                    lswitch_name,
+                    [ovn_const.OVN_REV_NUM_EXT_ID_KEY, str(revision)]))
+        except ovn_exc.RevisionConflict as e:
+            LOG.debug('Dropping out of order update of network %(id)s: '
+                      '%(error)s', {'id': network['id'], 'error': e})
+
+    def _get_qos_cache(self, context):
+        """Return the QoS options cache of the request of a context.
+
+        Any neutron-server process may change the QoS policies and the
+        network policies, and the API workers are not notified, so the
+        options are cached per request, and read from the DB again by the
+        next one.  The sync utility, during which nothing changes the DB,
+        sets a cache of its own for the whole run.
+        """
+        if self._qos_cache is not None:
+            return self._qos_cache
+        qos_cache = self._qos_request_caches.get(context)
+        if qos_cache is None:
+            qos_cache = cache.QosOptionsCache(self._qos_render_ovn_options)
+            self._qos_request_caches[context] = qos_cache
+        return qos_cache
+
     def _qos_get_ovn_options(self, context, policy_id):
-        all_rules = qos_rule.get_rules(context, policy_id)
+        return self._get_qos_cache(context).get_policy(context,
+                                                       policy_id)[1]
+
+    @staticmethod
+    def _qos_render_ovn_options(rules):
         options = {}
-        for rule in all_rules:
+        for rule in rules:
             if isinstance(rule, qos_rule.QosBandwidthLimitRule):
                 if rule.max_kbps:
                     options['policing_rate'] = str(rule.max_kbps)
@@ -468,12 +565,10 @@ class OVNPlugin(db_base_plugin_v2.NeutronDbPluginV2,
             context, policy_id)
 
         if qos_rule_options is not None:
-            with self._ovn.transaction(check_error=True) as txn:
-                for port_id in port_ids:
-                    txn.add(self._ovn.set_lport(
-                        lport_name=port_id,
-                        options=qos_rule_options))
+            self._set_lports_qos_options(
+                [(port_id, qos_rule_options) for port_id in port_ids])
 
+    @accounting.track
     def update_network(self, context, network_id, network):
         pnet._raise_if_updates_provider_attributes(network['network'])
         # FIXME(arosen) - rollback...
@@ -493,36 +588,32 @@ class OVNPlugin(db_base_plugin_v2.NeutronDbPluginV2,
                 self.core_ext_handler.process_fields(
                     context, base_core.NETWORK, net_dict, updated_network)
 
+        self._set_network_revision_number(updated_network)
         if 'qos_policy_id' in net_dict:
+            self._get_qos_cache(context).invalidate_network(network_id)
             self._update_network_qos(
                 context, network_id, net_dict['qos_policy_id'])
 
         return updated_network
 
     def qos_get_ovn_port_options(self, context, port):
+        """Return the QoS options of a port.
+
+        The port gets the options of its own policy, or else of its network
+        policy, if all the rules of the policy apply to it.  The policies
+        are resolved through the QoS options cache of the request.
+        """
+        qos_cache = self._get_qos_cache(context)
         port_policy_id = port.get("qos_policy_id", None)
-        nw_policy = qos_policy.QosPolicy.get_network_policy(
+        nw_policy_id = qos_cache.get_network_policy_id(
             context, port['network_id'])
-        nw_policy_id = nw_policy.id if nw_policy else None
 
-        for policy_id in [port_policy_id, nw_policy_id, None]:
+        for policy_id in [port_policy_id, nw_policy_id]:
             if not policy_id:
                 continue
-
-            should_apply = True
-
-            all_rules = qos_rule.get_rules(
-                context, policy_id)
-            for rule in all_rules:
-                if not rule.should_apply_to_port(port):
-                    should_apply = False
-                    break
-
-            if should_apply:
-                break
-
-        if policy_id:
-            return self._qos_get_ovn_options(context, policy_id)
+            rules, options = qos_cache.get_policy(context, policy_id)
+            if all(rule.should_apply_to_port(port) for rule in rules):
+                return options
         return {}
 
     def _ovn_extend_port_attributes(self, result, portdb):
@@ -534,6 +625,7 @@ class OVNPlugin(db_base_plugin_v2.NeutronDbPluginV2,
     db_base_plugin_v2.NeutronDbPluginV2.register_dict_extend_funcs(
         attr.PORTS, ['_ovn_extend_port_attributes'])
 
+    @accounting.track
     def update_port(self, context, id, port):
         pdict = port['port']
         with context.session.begin(subtransactions=True):
@@ -653,30 +745,50 @@ class OVNPlugin(db_base_plugin_v2.NeutronDbPluginV2,
 
     def _update_port_in_ovn(self, context, original_port, port,
                             ovn_port_info):
-        external_ids = {
-            ovn_const.OVN_PORT_NAME_EXT_ID_KEY: port['name']}
-        with self._ovn.transaction(check_error=True) as txn:
-            txn.add(self._ovn.set_lport(lport_name=port['id'],
-                    addresses=ovn_port_info.addresses,
-                    external_ids=external_ids,
-                    parent_name=ovn_port_info.parent_name,
-                    tag=ovn_port_info.tag,
-                    type=ovn_port_info.type,
-                    options=ovn_port_info.options,
-                    enabled=port['admin_state_up'],
-                    port_security=ovn_port_info.port_security))
-            # Note that the ovsdb IDL suppresses the transaction down to what
-            # has actually changed.
-            txn.add(self._ovn.delete_acl(
-                    utils.ovn_name(port['network_id']),
-                    port['id']))
-            sg_ports_cache = {}
-            subnet_cache = {}
-            acls_new = self._add_acls(context, port,
-                                      sg_ports_cache=sg_ports_cache,
-                                      subnet_cache=subnet_cache)
-            for acl in acls_new:
-                txn.add(self._ovn.add_acl(**acl))
+        external_ids = utils.stamp_revision_number(
+            {ovn_const.OVN_PORT_NAME_EXT_ID_KEY: port['name']}, port)
+        revision = utils.get_revision_number(port)
+        sg_ports_cache = {}
+        subnet_cache = {}
+        try:
+            # RevisionConflict is handled below, do not log it as a
+            # transaction error.
+            with self._ovn.transaction(check_error=True,
+                                       log_errors=False,
+                                       tenant_id=port['tenant_id']) as txn:
+                if revision is not None:
+                    txn.add(self._ovn.check_revision_number(
+                        'Logical_Port', port['id'], revision))
+                txn.add(self._ovn.set_lport(lport_name=port['id'],
+                        addresses=ovn_port_info.addresses,
+                        external_ids=external_ids,
+                        parent_name=ovn_port_info.parent_name,
+                        tag=ovn_port_info.tag,
+                        type=ovn_port_info.type,
+                        options=ovn_port_info.options,
+                        enabled=port['admin_state_up'],
+                        port_security=ovn_port_info.port_security))
+                # Note that the ovsdb IDL suppresses the transaction down to
+                # what has actually changed.
+                txn.add(self._ovn.delete_acl(
+                        utils.ovn_name(port['network_id']),
+                        port['id']))
+                acls_new = self._add_acls(context, port,
+                                          sg_ports_cache=sg_ports_cache,
+                                          subnet_cache=subnet_cache)
+                for acl in acls_new:
+                    txn.add(self._ovn.add_acl(**acl))
+                lswitch_acl_keys = self._get_lswitch_acl_keys(context, port,
+                                                              subnet_cache)
+                txn.add(self._ovn.update_lswitch_acls(
+                        utils.ovn_name(port['network_id']),
+                        {port['id']: lswitch_acl_keys}))
+        except ovn_exc.RevisionConflict as e:
+            # The port was already updated from a newer revision by a
+            # concurrent request, which also refreshed its remote groups.
+            LOG.debug('Dropping out of order update of port %(id)s: '
+                      '%(error)s', {'id': port['id'], 'error': e})
+            return port
 
         # Refresh remote security groups for changed security groups
         old_sg_ids = set(original_port.get('security_groups', []))
@@ -798,6 +910,7 @@ class OVNPlugin(db_base_plugin_v2.NeutronDbPluginV2,
                     cfg.CONF.ovn.vhost_sock_dir, port_res['id'])
                 })
 
+    @accounting.track
     def create_port(self, context, port):
         pdict = port['port']
         with context.session.begin(subtransactions=True):
@@ -907,7 +1020,7 @@ class OVNPlugin(db_base_plugin_v2.NeutronDbPluginV2,
         if subnet_id in subnet_cache:
             return subnet_cache[subnet_id]
         else:
-            subnet = self.get_subnet(context, subnet_id)
+            subnet = self._subnet_cache.get_subnet(self, context, subnet_id)
             if subnet:
                 subnet_cache[subnet_id] = subnet
             return subnet
@@ -944,9 +1057,8 @@ class OVNPlugin(db_base_plugin_v2.NeutronDbPluginV2,
         if r['remote_group_id'] in sg_ports_cache:
             sg_ports = sg_ports_cache[r['remote_group_id']]
         else:
-            filters = {'security_group_id': [r['remote_group_id']]}
-            sg_ports = self._get_port_security_group_bindings(
-                elevated_context, filters)
+            sg_ports = self._get_sg_port_bindings(elevated_context,
+                                                  r['remote_group_id'])
             sg_ports_cache[r['remote_group_id']] = sg_ports
         sg_ports = [p for p in sg_ports if p['port_id'] != port['id']]
         if not sg_ports:
@@ -1011,45 +1123,15 @@ class OVNPlugin(db_base_plugin_v2.NeutronDbPluginV2,
                "external_ids": {'neutron:lport': port['id']}}
         return acl
 
-    def _add_acl_dhcp(self, context, port, subnet_cache):
-        # Allow DHCP responses through from source IPs on the local subnet.
-        # We do this even if DHCP isn't enabled.  It could be enabled later.
-        # We could hook into handling when it's enabled/disabled for a subnet,
-        # but this code is temporary anyway.  It's likely no longer needed
-        # once OVN native DHCP support merges, which is under development and
-        # review already.
-        # TODO(russellb) Remove this once OVN native DHCP support is merged.
-        acl_list = []
-        for ip in port['fixed_ips']:
-            subnet = self._acl_get_subnet_from_cache(context, subnet_cache,
-                                                     ip['subnet_id'])
-            if subnet['ip_version'] != 4:
-                continue
-            acl = {"lswitch": utils.ovn_name(port['network_id']),
-                   "lport": port['id'],
-                   "priority": ovn_const.ACL_PRIORITY_ALLOW,
-                   "action": ovn_const.ACL_ACTION_ALLOW,
-                   "log": False,
-                   "direction": 'to-lport',
-                   "match": ('outport == "%s" && ip4 && ip4.src == %s && '
-                             'udp && udp.src == 67 && udp.dst == 68'
-                             ) % (port['id'], subnet['cidr']),
-                   "external_ids": {'neutron:lport': port['id']}}
-            acl_list.append(acl)
-            acl = {"lswitch": utils.ovn_name(port['network_id']),
-                   "lport": port['id'],
-                   "priority": ovn_const.ACL_PRIORITY_ALLOW,
-                   "action": ovn_const.ACL_ACTION_ALLOW,
-                   "log": False,
-                   "direction": 'from-lport',
-                   "match": ('inport == "%s" && ip4 && '
-                             '(ip4.dst == 255.255.255.255 || '
-                             'ip4.dst == %s) && '
-                             'udp && udp.src == 68 && udp.dst == 67'
-                             ) % (port['id'], subnet['cidr']),
-                   "external_ids": {'neutron:lport': port['id']}}
-            acl_list.append(acl)
-        return acl_list
+    def _get_lswitch_acl_keys(self, context, port, subnet_cache=None):
+        if not port.get('security_groups'):
+            return []
+        if subnet_cache is None:
+            subnet_cache = {}
+        subnets = [self._acl_get_subnet_from_cache(context, subnet_cache,
+                                                   ip['subnet_id'])
+                   for ip in port['fixed_ips']]
+        return acl_utils.lswitch_acl_keys_for_port(port, subnets)
 
     def _add_acls(self, context, port,
                   sg_cache=None, sg_ports_cache=None, subnet_cache=None):
@@ -1058,12 +1140,13 @@ class OVNPlugin(db_base_plugin_v2.NeutronDbPluginV2,
         if not sec_groups:
             return acl_list
 
-        # Drop all IP traffic to and from the logical port by default.
-        acl_list += acl_utils.drop_all_ip_traffic_for_port(port)
+        # NOTE: Dropping all IP traffic to and from the logical port by
+        # default and allowing DHCP are done by ACLs shared by all the
+        # port-secured ports of the logical switch, see
+        # _get_lswitch_acl_keys().
 
         if subnet_cache is None:
             subnet_cache = {}
-        acl_list += self._add_acl_dhcp(context, port, subnet_cache)
 
         # We often need a list of all ports on a security group.  Cache these
         # results so we only do the query once throughout this processing.
@@ -1089,31 +1172,22 @@ class OVNPlugin(db_base_plugin_v2.NeutronDbPluginV2,
         return acl_list
 
     def create_port_in_ovn(self, context, port, ovn_port_info):
-        external_ids = {ovn_const.OVN_PORT_NAME_EXT_ID_KEY: port['name']}
         lswitch_name = utils.ovn_name(port['network_id'])
 
-        with self._ovn.transaction(check_error=True) as txn:
-            # The lport_name *must* be neutron port['id'].  It must match the
-            # iface-id set in the Interfaces table of the Open_vSwitch
-            # database which nova sets to be the port ID.
-            txn.add(self._ovn.create_lport(
-                    lport_name=port['id'],
-                    lswitch_name=lswitch_name,
-                    addresses=ovn_port_info.addresses,
-                    external_ids=external_ids,
-                    parent_name=ovn_port_info.parent_name,
-                    tag=ovn_port_info.tag,
-                    enabled=port.get('admin_state_up'),
-                    options=ovn_port_info.options,
-                    type=ovn_port_info.type,
-                    port_security=ovn_port_info.port_security))
+        with self._ovn.transaction(check_error=True,
+                                   tenant_id=port['tenant_id']) as txn:
             sg_ports_cache = {}
             subnet_cache = {}
-            acls_new = self._add_acls(context, port,
-                                      sg_ports_cache=sg_ports_cache,
-                                      subnet_cache=subnet_cache)
-            for acl in acls_new:
-                txn.add(self._ovn.add_acl(**acl))
+            for cmd in self._create_port_in_ovn_cmds(
+                    context, port, ovn_port_info,
+                    sg_ports_cache=sg_ports_cache,
+                    subnet_cache=subnet_cache):
+                txn.add(cmd)
+            lswitch_acl_keys = self._get_lswitch_acl_keys(context, port,
+                                                          subnet_cache)
+            if lswitch_acl_keys:
+                txn.add(self._ovn.update_lswitch_acls(
+                        lswitch_name, {port['id']: lswitch_acl_keys}))
 
         if len(port.get('fixed_ips')):
             for sg_id in port.get('security_groups', []):
@@ -1123,33 +1197,74 @@ class OVNPlugin(db_base_plugin_v2.NeutronDbPluginV2,
 
         return port
 
+    def _create_port_in_ovn_cmds(self, context, port, ovn_port_info,
+                                 sg_cache=None, sg_ports_cache=None,
+                                 subnet_cache=None):
+        external_ids = utils.stamp_revision_number(
+            {ovn_const.OVN_PORT_NAME_EXT_ID_KEY: port['name']}, port)
+        # The lport_name *must* be neutron port['id'].  It must match the
+        # iface-id set in the Interfaces table of the Open_vSwitch
+        # database which nova sets to be the port ID.
+        cmds = [self._ovn.create_lport(
+                lport_name=port['id'],
+                lswitch_name=utils.ovn_name(port['network_id']),
+                addresses=ovn_port_info.addresses,
+                external_ids=external_ids,
+                parent_name=ovn_port_info.parent_name,
+                tag=ovn_port_info.tag,
+                enabled=port.get('admin_state_up'),
+                options=ovn_port_info.options,
+                type=ovn_port_info.type,
+                port_security=ovn_port_info.port_security)]
+        acls_new = self._add_acls(context, port, sg_cache=sg_cache,
+                                  sg_ports_cache=sg_ports_cache,
+                                  subnet_cache=subnet_cache)
+        for acl in acls_new:
+            cmds.append(self._ovn.add_acl(**acl))
+        return cmds
+
+    def _get_sg_port_bindings(self, context, sg_id):
+        # Always read from the Neutron DB: were a port added by another
+        # neutron-server process missing from a cached membership, the
+        # ACLs rendered from it would never be rendered again.
+        filters = {'security_group_id': [sg_id]}
+        return self._get_port_security_group_bindings(context, filters)
+
+    def _get_referencing_sgs(self, context, sg_id):
+        filters = {'remote_group_id': [sg_id]}
+        rules = self.get_security_group_rules(
+            context, filters, fields=['security_group_id'])
+        return set(r['security_group_id'] for r in rules)
+
     def _refresh_remote_security_group(self, context, sec_group,
                                        sg_ports_cache=None,
                                        exclude_ports=None,
                                        subnet_cache=None):
         # For sec_group, refresh acls for all other security groups that have
         # rules referencing sec_group as 'remote_group'.
-        filters = {'remote_group_id': [sec_group]}
         # Elevate the context so that we can see sec-groups and port-sg
         # bindings that do not belong to the current tenant.
         elevated_context = context.elevated()
-        refering_rules = self.get_security_group_rules(
-            elevated_context, filters, fields=['security_group_id'])
-        sg_ids = set(r['security_group_id'] for r in refering_rules)
+        sg_ids = self._get_referencing_sgs(elevated_context, sec_group)
         for sg_id in sg_ids:
             self._update_acls_for_security_group(elevated_context, sg_id,
                                                  sg_ports_cache,
                                                  exclude_ports,
                                                  subnet_cache=subnet_cache)
 
+    @accounting.track
     def delete_port(self, context, port_id, l3_port_check=True):
         port = self.get_port(context, port_id)
         num_fixed_ips = len(port.get('fixed_ips'))
-        with self._ovn.transaction(check_error=True) as txn:
+        with self._ovn.transaction(check_error=True,
+                                   tenant_id=port['tenant_id']) as txn:
             txn.add(self._ovn.delete_lport(port_id,
                     utils.ovn_name(port['network_id'])))
             txn.add(self._ovn.delete_acl(
                     utils.ovn_name(port['network_id']), port['id']))
+            if port.get('security_groups'):
+                txn.add(self._ovn.update_lswitch_acls(
+                        utils.ovn_name(port['network_id']), {port['id']: []}))
 
         sg_ids = port.get('security_groups', [])
 
@@ -1187,6 +1302,7 @@ class OVNPlugin(db_base_plugin_v2.NeutronDbPluginV2,
             response_data[psec.PORTSECURITY] = (
                 db_data['port_security'][psec.PORTSECURITY])
 
+    @accounting.track
     def create_router(self, context, router):
         router = super(OVNPlugin, self).create_router(
             context, router)
@@ -1210,6 +1326,7 @@ class OVNPlugin(db_base_plugin_v2.NeutronDbPluginV2,
         router_name = utils.ovn_name(router['id'])
         external_ids = {ovn_const.OVN_ROUTER_NAME_EXT_ID_KEY:
                         router.get('name', 'no_router_name')}
+        utils.stamp_revision_number(external_ids, router)
         enabled = router.get('admin_state_up')
         with self._ovn.transaction(check_error=True) as txn:
             txn.add(self._ovn.create_lrouter(router_name,
@@ -1217,6 +1334,7 @@ class OVNPlugin(db_base_plugin_v2.NeutronDbPluginV2,
                                              enabled=enabled
                                              ))
 
+    @accounting.track
     def delete_router(self, context, router_id):
         router_name = utils.ovn_name(router_id)
         ret_val = super(OVNPlugin, self).delete_router(context,
@@ -1224,6 +1342,7 @@ class OVNPlugin(db_base_plugin_v2.NeutronDbPluginV2,
         self._ovn.delete_lrouter(router_name).execute(check_error=True)
         return ret_val
 
+    @accounting.track
     def update_router(self, context, id, router):
         original_router = self.get_router(context, id)
         result = super(OVNPlugin, self).update_router(
@@ -1238,7 +1357,14 @@ class OVNPlugin(db_base_plugin_v2.NeutronDbPluginV2,
             if enabled != original_router['admin_state_up']:
                 update['enabled'] = enabled
 
-        if 'name' in router['router']:
+        revision = utils.get_revision_number(result)
+        if revision is not None:
+            # Keep the revision of the lrouter up to date, even when none
+            # of its columns changed.
+            update['external_ids'] = utils.stamp_revision_number(
+                {ovn_const.OVN_ROUTER_NAME_EXT_ID_KEY: result['name']},
+                result)
+        elif 'name' in router['router']:
             if router['router']['name'] != original_router['name']:
                 external_ids = {ovn_const.OVN_ROUTER_NAME_EXT_ID_KEY:
                                 router['router']['name']}
@@ -1252,7 +1378,13 @@ class OVNPlugin(db_base_plugin_v2.NeutronDbPluginV2,
 
         if update or added or removed:
             try:
-                with self._ovn.transaction(check_error=True) as txn:
+                # RevisionConflict is handled below, do not log it as a
+                # transaction error.
+                with self._ovn.transaction(check_error=True,
+                                           log_errors=False) as txn:
+                    if revision is not None:
+                        txn.add(self._ovn.check_revision_number(
+                            'Logical_Router', router_name, revision))
                     if update:
                         txn.add(self._ovn.update_lrouter(router_name,
                                 **update))
@@ -1266,6 +1398,11 @@ class OVNPlugin(db_base_plugin_v2.NeutronDbPluginV2,
                         txn.add(self._ovn.delete_static_route(router_name,
                                 ip_prefix=route['destination'],
                                 nexthop=route['nexthop']))
+            except ovn_exc.RevisionConflict as e:
+                # The router was already updated from a newer revision by
+                # a concurrent request.
+                LOG.debug('Dropping out of order update of router %(id)s: '
+                          '%(error)s', {'id': id, 'error': e})
             except Exception:
                 LOG.exception(_LE('Unable to update lrouter for %s'), id)
                 super(OVNPlugin, self).update_router(context,
@@ -1299,6 +1436,7 @@ class OVNPlugin(db_base_plugin_v2.NeutronDbPluginV2,
             txn.add(self._ovn.set_lrouter_port_in_lport(port['id'],
                                                         lrouter_port_name))
 
+    @accounting.track
     def add_router_interface(self, context, router_id, interface_info):
         router_interface_info = super(OVNPlugin, self).add_router_interface(
             context, router_id, interface_info)
@@ -1312,6 +1450,7 @@ class OVNPlugin(db_base_plugin_v2.NeutronDbPluginV2,
         self.create_lrouter_port_in_ovn(context, router_id, port)
         return router_interface_info
 
+    @accounting.track
     def remove_router_interface(self, context, router_id, interface_info):
         if not config.is_ovn_l3():
             LOG.debug("OVN L3 mode is disabled, skipping "
@@ -1359,8 +1498,7 @@ class OVNPlugin(db_base_plugin_v2.NeutronDbPluginV2,
                                         rule=None, is_add_acl=True):
         if exclude_ports is None:
             exclude_ports = []
-        filters = {'security_group_id': [security_group_id]}
-        sg_ports = self._get_port_security_group_bindings(context, filters)
+        sg_ports = self._get_sg_port_bindings(context, security_group_id)
         sg_cache = {}
         if sg_ports_cache is None:
             sg_ports_cache = {}
@@ -1397,23 +1535,32 @@ class OVNPlugin(db_base_plugin_v2.NeutronDbPluginV2,
                                           sg_ports_cache, subnet_cache)
                 acl_new_values_dict[port['id']] = acls_new
 
-        self._ovn.update_acls(list(lswitch_names),
-                              iter(port_list),
-                              acl_new_values_dict,
-                              need_compare=need_compare,
-                              is_add_acl=is_add_acl).execute(check_error=True)
-
+        # A fan-out to all the ports of the group, committed after the
+        # latency critical transactions.
+        tenant_id = port_list[0]['tenant_id'] if port_list else None
+        with self._ovn.transaction(check_error=True,
+                                   priority=ovn_const.TXN_PRIORITY_BULK,
+                                   tenant_id=tenant_id) as txn:
+            txn.add(self._ovn.update_acls(list(lswitch_names),
+                                          iter(port_list),
+                                          acl_new_values_dict,
+                                          need_compare=need_compare,
+                                          is_add_acl=is_add_acl))
+
+    @accounting.track
     def update_security_group(self, context, id, security_group):
         res = super(OVNPlugin, self).update_security_group(context, id,
                                                            security_group)
         self._update_acls_for_security_group(context, id)
         return res
 
+    @accounting.track
     def delete_security_group(self, context, id):
         super(OVNPlugin, self).delete_security_group(context, id)
         # Neutron will only delete a security group if it is not associated
         # with any active ports, so we have nothing to do here.
 
+    @accounting.track
     def create_security_group_rule(self, context, security_group_rule):
         res = super(OVNPlugin, self).create_security_group_rule(
             context, security_group_rule)
@@ -1427,6 +1574,7 @@ class OVNPlugin(db_base_plugin_v2.NeutronDbPluginV2,
                                              is_add_acl=True)
         return res
 
+    @accounting.track
     def delete_security_group_rule(self, context, id):
         security_group_rule = self.get_security_group_rule(context, id)
         group_id = security_group_rule['security_group_id']
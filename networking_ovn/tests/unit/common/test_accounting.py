@@ -0,0 +1,67 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+
+import mock
+from oslo_config import cfg
+
+from networking_ovn.common import accounting
+from networking_ovn.tests import base
+
+
+class TestAccounting(base.TestCase):
+
+    def setUp(self):
+        super(TestAccounting, self).setUp()
+        cfg.CONF.set_override('request_accounting', True, 'ovn')
+        self.addCleanup(cfg.CONF.clear_override, 'request_accounting',
+                        'ovn')
+        mock.patch.object(accounting, '_register_query_listener').start()
+        self.log = mock.patch.object(accounting, 'LOG').start()
+        self.addCleanup(mock.patch.stopall)
+
+    @accounting.track
+    def update_port(self, num_scans):
+        cost = accounting.current()
+        accounting.add_transaction(cost, 3, 0.5, 2.0)
+        accounting.add_transaction(cost, 2, 0.0, 1.0)
+        if cost is not None:
+            # Work done by another thread for the request.
+            with accounting.bind(cost):
+                accounting.add_row_scan(num_scans)
+        accounting._count_query()
+        self.sg_callback()
+        return cost
+
+    @accounting.track
+    def sg_callback(self):
+        accounting.add_transaction(accounting.current(), 10, 0.0, 1.0)
+
+    def test_track(self):
+        cost = self.update_port(5)
+        self.assertIsNone(accounting.current())
+        self.assertEqual(1, self.log.info.call_count)
+        summary = self.log.info.call_args[0][1]
+        del summary['duration']
+        # The nested entry point is accounted to the outer one.
+        self.assertEqual({'request': 'update_port', 'transactions': 3,
+                          'commands': 15, 'row_scans': 5, 'db_queries': 1,
+                          'ovn_time': 4.0, 'queue_wait': 0.5}, summary)
+        self.assertEqual('update_port', cost.name)
+
+    def test_track_disabled(self):
+        cfg.CONF.set_override('request_accounting', False, 'ovn')
+        self.assertIsNone(self.update_port(0))
+        self.assertFalse(self.log.info.called)
+        accounting._count_query()
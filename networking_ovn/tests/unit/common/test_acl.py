@@ -45,55 +45,122 @@ class TestACLs(base.TestCase):
             lambda *args, **kwargs: mock.MagicMock())
         patcher.start()
 
-    def test_drop_all_ip_traffic_for_port(self):
-        acls = ovn_acl.drop_all_ip_traffic_for_port(self.fake_port)
-        acl_to_lport = {'action': 'drop', 'direction': 'to-lport',
-                        'external_ids': {'neutron:lport':
-                                         self.fake_port['id']},
-                        'log': False, 'lport': self.fake_port['id'],
-                        'lswitch': 'neutron-network_id1',
-                        'match': 'outport == "fake_port_id1" && ip',
-                        'priority': 1001}
-        acl_from_lport = {'action': 'drop', 'direction': 'from-lport',
-                          'external_ids': {'neutron:lport':
-                                           self.fake_port['id']},
-                          'log': False, 'lport': self.fake_port['id'],
-                          'lswitch': 'neutron-network_id1',
-                          'match': 'inport == "fake_port_id1" && ip',
-                          'priority': 1001}
-        for acl in acls:
-            if 'to-lport' in acl.values():
-                self.assertEqual(acl_to_lport, acl)
-            if 'from-lport' in acl.values():
-                self.assertEqual(acl_from_lport, acl)
-
-    def test_add_acl_dhcp(self):
-        acls = ovn_acl.add_acl_dhcp(self.fake_port, self.fake_subnet)
-
-        expected_match_to_lport = (
-            'outport == "%s" && ip4 && ip4.src == %s && udp && udp.src == 67 '
-            '&& udp.dst == 68') % (self.fake_port['id'],
-                                   self.fake_subnet['cidr'])
-        acl_to_lport = {'action': 'allow', 'direction': 'to-lport',
-                        'external_ids': {'neutron:lport': 'fake_port_id1'},
-                        'log': False, 'lport': 'fake_port_id1',
-                        'lswitch': 'neutron-network_id1',
-                        'match': expected_match_to_lport, 'priority': 1002}
-        expected_match_from_lport = (
-            'inport == "%s" && ip4 && '
-            '(ip4.dst == 255.255.255.255 || ip4.dst == %s) && '
-            'udp && udp.src == 68 && udp.dst == 67'
-        ) % (self.fake_port['id'], self.fake_subnet['cidr'])
-        acl_from_lport = {'action': 'allow', 'direction': 'from-lport',
-                          'external_ids': {'neutron:lport': 'fake_port_id1'},
-                          'log': False, 'lport': 'fake_port_id1',
-                          'lswitch': 'neutron-network_id1',
-                          'match': expected_match_from_lport, 'priority': 1002}
-        for acl in acls:
-            if 'to-lport' in acl.values():
-                self.assertEqual(acl_to_lport, acl)
-            if 'from-lport' in acl.values():
-                self.assertEqual(acl_from_lport, acl)
+    def test_lswitch_acl_keys_for_port(self):
+        self.fake_port['security_groups'] = ['sg1']
+        fake_subnet_v6 = {'id': 'subnet_id2',
+                          'ip_version': 6,
+                          'cidr': 'fd00::/64'}
+        keys = ovn_acl.lswitch_acl_keys_for_port(
+            self.fake_port, [self.fake_subnet, fake_subnet_v6])
+        self.assertEqual(['drop:from-lport', 'drop:to-lport',
+                          'dhcp:from-lport:1.1.1.0/24',
+                          'dhcp:to-lport:1.1.1.0/24'], keys)
+
+    def test_lswitch_acl_keys_for_port_no_sec_group(self):
+        self.fake_port['security_groups'] = []
+        keys = ovn_acl.lswitch_acl_keys_for_port(self.fake_port,
+                                                 [self.fake_subnet])
+        self.assertEqual([], keys)
+
+    def test_lswitch_acl_drop(self):
+        lports = ['port2', 'port1']
+        acl = ovn_acl.lswitch_acl('neutron-network_id1', 'drop:to-lport',
+                                  lports)
+        self.assertEqual(
+            {'action': 'drop', 'direction': 'to-lport',
+             'external_ids': {'neutron:lswitch_acl': 'drop:to-lport',
+                              'neutron:lports': 'port1 port2'},
+             'log': False, 'lswitch': 'neutron-network_id1',
+             'match': 'outport == {"port1", "port2"} && ip',
+             'priority': 1001}, acl)
+        acl = ovn_acl.lswitch_acl('neutron-network_id1', 'drop:from-lport',
+                                  lports)
+        self.assertEqual('inport == {"port1", "port2"} && ip', acl['match'])
+
+    def test_lswitch_acl_dhcp(self):
+        acl = ovn_acl.lswitch_acl('neutron-network_id1',
+                                  'dhcp:to-lport:1.1.1.0/24', ['port1'])
+        self.assertEqual(
+            {'action': 'allow', 'direction': 'to-lport',
+             'external_ids': {'neutron:lswitch_acl':
+                              'dhcp:to-lport:1.1.1.0/24',
+                              'neutron:lports': 'port1'},
+             'log': False, 'lswitch': 'neutron-network_id1',
+             'match': ('outport == {"port1"} && ip4 && '
+                       'ip4.src == 1.1.1.0/24 && udp && udp.src == 67 '
+                       '&& udp.dst == 68'),
+             'priority': 1002}, acl)
+        acl = ovn_acl.lswitch_acl('neutron-network_id1',
+                                  'dhcp:from-lport:1.1.1.0/24', ['port1'])
+        self.assertEqual(
+            'inport == {"port1"} && ip4 && '
+            '(ip4.dst == 255.255.255.255 || ip4.dst == 1.1.1.0/24) && '
+            'udp && udp.src == 68 && udp.dst == 67', acl['match'])
+
+    def test_update_lswitch_acls(self):
+        drop_acl = mock.Mock(
+            match='inport == {"port1", "port2"} && ip',
+            external_ids={'neutron:lswitch_acl': 'drop:from-lport',
+                          'neutron:lports': 'port1 port2'})
+        dhcp_acl = mock.Mock(
+            match='inport == {"port1"} && ip4',
+            external_ids={'neutron:lswitch_acl':
+                          'dhcp:from-lport:1.1.1.0/24',
+                          'neutron:lports': 'port1'})
+        port_acl = mock.Mock(external_ids={'neutron:lport': 'port1'})
+        lswitch_obj = mock.Mock(acls=[drop_acl, dhcp_acl, port_acl])
+        txn = mock.Mock()
+        with mock.patch('neutron.agent.ovsdb.native.idlutils.row_by_value',
+                        return_value=lswitch_obj):
+            cmd.UpdateLSwitchACLsCommand(
+                mock.Mock(), 'neutron-network_id1',
+                {'port1': [], 'port3': ['drop:from-lport',
+                                        'drop:to-lport']},
+                False, True).run_idl(txn)
+
+        self.assertEqual('inport == {"port2", "port3"} && ip',
+                         drop_acl.match)
+        self.assertEqual('port2 port3',
+                         drop_acl.external_ids['neutron:lports'])
+        dhcp_acl.delete.assert_called_once_with()
+        self.assertFalse(port_acl.delete.called)
+        self.assertEqual(1, txn.insert.call_count)
+        new_acl = txn.insert.return_value
+        self.assertEqual('outport == {"port3"} && ip', new_acl.match)
+        self.assertEqual([drop_acl, port_acl, new_acl.uuid],
+                         lswitch_obj.acls)
+
+    def test_update_lswitch_acls_concurrent(self):
+        # Both transactions read the drop ACL with port1 only.
+        drop_acl = mock.Mock(
+            match='inport == {"port1"} && ip',
+            external_ids={'neutron:lswitch_acl': 'drop:from-lport',
+                          'neutron:lports': 'port1'})
+        lswitch_obj = mock.Mock(acls=[drop_acl])
+
+        def update(lport):
+            with mock.patch(
+                    'neutron.agent.ovsdb.native.idlutils.row_by_value',
+                    return_value=lswitch_obj):
+                cmd.UpdateLSwitchACLsCommand(
+                    mock.Mock(), 'neutron-network_id1',
+                    {lport: ['drop:from-lport']},
+                    False, True).run_idl(mock.Mock())
+
+        update('port3')
+        # The columns read are verified, the transaction adding port3
+        # fails to commit once the one adding port2 did.
+        drop_acl.verify.assert_has_calls([mock.call('external_ids'),
+                                          mock.call('match')])
+        drop_acl.match = 'inport == {"port1", "port2"} && ip'
+        drop_acl.external_ids = {'neutron:lswitch_acl': 'drop:from-lport',
+                                 'neutron:lports': 'port1 port2'}
+        # Retried, it reads the ACL as updated.
+        update('port3')
+        self.assertEqual('inport == {"port1", "port2", "port3"} && ip',
+                         drop_acl.match)
+        self.assertEqual('port1 port2 port3',
+                         drop_acl.external_ids['neutron:lports'])
 
     def _test_add_sg_rule_acl_for_port(self, sg_rule, direction, match):
         port = {'id': 'port-id',
@@ -0,0 +1,169 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+import mock
+
+from neutron.callbacks import events
+from neutron.callbacks import resources
+
+from networking_ovn.common import cache
+from networking_ovn.tests import base
+
+
+class TestSecurityGroupIndex(base.TestCase):
+
+    def setUp(self):
+        super(TestSecurityGroupIndex, self).setUp()
+        self.index = cache.SecurityGroupIndex()
+        self.plugin = mock.Mock()
+        self.plugin._get_port_security_group_bindings.return_value = [
+            {'port_id': 'port1', 'security_group_id': 'sg1'},
+            {'port_id': 'port2', 'security_group_id': 'sg1'}]
+        self.plugin.get_security_group_rules.return_value = [
+            {'security_group_id': 'sg2'}, {'security_group_id': 'sg3'}]
+        self.context = mock.Mock()
+
+    def _port_ids(self, sg_id):
+        return sorted(b['port_id'] for b in
+                      self.index.get_sg_ports(self.plugin, self.context,
+                                              sg_id))
+
+    def test_get_sg_ports_cached(self):
+        self.assertEqual(['port1', 'port2'], self._port_ids('sg1'))
+        self.assertEqual(['port1', 'port2'], self._port_ids('sg1'))
+        self.assertEqual(
+            1, self.plugin._get_port_security_group_bindings.call_count)
+        stats = self.index.get_stats()[cache.SG_PORTS]
+        self.assertEqual({'hits': 1, 'misses': 1, 'hit_rate': 0.5,
+                          'entries': 1}, stats)
+
+    def test_expiry(self):
+        self.index = cache.SecurityGroupIndex(max_age=10)
+        with mock.patch('time.time', return_value=100):
+            self._port_ids('sg1')
+        with mock.patch('time.time', return_value=105):
+            self._port_ids('sg1')
+        self.assertEqual(
+            1, self.plugin._get_port_security_group_bindings.call_count)
+        with mock.patch('time.time', return_value=111):
+            self._port_ids('sg1')
+        self.assertEqual(
+            2, self.plugin._get_port_security_group_bindings.call_count)
+
+    def test_get_referencing_sgs(self):
+        for _i in range(2):
+            self.assertEqual(set(['sg2', 'sg3']),
+                             self.index.get_referencing_sgs(
+                                 self.plugin, self.context, 'sg1'))
+        self.plugin.get_security_group_rules.assert_called_once_with(
+            self.context.elevated.return_value,
+            {'remote_group_id': ['sg1']}, fields=['security_group_id'])
+        stats = self.index.get_stats()[cache.SG_REFS]
+        self.assertEqual({'hits': 1, 'misses': 1, 'hit_rate': 0.5,
+                          'entries': 1}, stats)
+
+
+class TestSubnetCache(base.TestCase):
+
+    def setUp(self):
+        super(TestSubnetCache, self).setUp()
+        self.cache = cache.SubnetCache(max_size=2)
+        self.plugin = mock.Mock()
+        self.plugin.get_subnet.side_effect = (
+            lambda context, subnet_id, fields: {'id': subnet_id,
+                                                'ip_version': 4,
+                                                'cidr': '10.0.0.0/24'})
+        self.context = mock.Mock()
+
+    def _get(self, subnet_id):
+        return self.cache.get_subnet(self.plugin, self.context, subnet_id)
+
+    def test_get_subnet_cached(self):
+        self.assertEqual('subnet1', self._get('subnet1')['id'])
+        self.assertEqual('subnet1', self._get('subnet1')['id'])
+        self.plugin.get_subnet.assert_called_once_with(
+            self.context.elevated.return_value, 'subnet1',
+            fields=cache.SUBNET_FIELDS)
+        self.assertEqual({'hits': 1, 'misses': 1, 'hit_rate': 0.5,
+                          'entries': 1}, self.cache.get_stats())
+
+    def test_lru_eviction(self):
+        self._get('subnet1')
+        self._get('subnet2')
+        # subnet1 becomes the most recently used, subnet2 is evicted.
+        self._get('subnet1')
+        self._get('subnet3')
+        self.assertEqual(3, self.plugin.get_subnet.call_count)
+        self._get('subnet1')
+        self.assertEqual(3, self.plugin.get_subnet.call_count)
+        self._get('subnet2')
+        self.assertEqual(4, self.plugin.get_subnet.call_count)
+
+    def test_subnet_callback_invalidates(self):
+        self._get('subnet1')
+        self._get('subnet2')
+        self.cache._subnet_callback(resources.SUBNET, events.AFTER_UPDATE,
+                                    None, subnet={'id': 'subnet1'})
+        self.cache._subnet_callback(resources.SUBNET, events.AFTER_DELETE,
+                                    None, subnet_id='subnet2')
+        self.assertEqual(0, self.cache.get_stats()['entries'])
+        self._get('subnet1')
+        self.assertEqual(3, self.plugin.get_subnet.call_count)
+
+
+class TestQosOptionsCache(base.TestCase):
+
+    def setUp(self):
+        super(TestQosOptionsCache, self).setUp()
+        self.render = mock.Mock(return_value={'policing_rate': '50'})
+        self.cache = cache.QosOptionsCache(self.render)
+        self.policy = mock.Mock(id='policy1', rules=['rule1'])
+        self.get_object = self._patch_policy('get_object', self.policy)
+        self.get_network_policy = self._patch_policy('get_network_policy',
+                                                     self.policy)
+        self.context = mock.Mock()
+
+    def _patch_policy(self, method, policy):
+        patcher = mock.patch.object(cache.qos_policy.QosPolicy, method,
+                                    return_value=policy)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def test_get_policy_cached(self):
+        for _i in range(2):
+            self.assertEqual((['rule1'], {'policing_rate': '50'}),
+                             self.cache.get_policy(self.context, 'policy1'))
+        self.get_object.assert_called_once_with(
+            self.context.elevated.return_value, id='policy1')
+        self.render.assert_called_once_with(['rule1'])
+        self.assertEqual({'hits': 1, 'misses': 1, 'hit_rate': 0.5,
+                          'entries': 1}, self.cache.get_stats())
+
+    def test_get_policy_missing(self):
+        self.get_object.return_value = None
+        self.assertEqual(([], {}),
+                         self.cache.get_policy(self.context, 'policy1'))
+
+    def test_get_network_policy_id_caches_policy(self):
+        for _i in range(2):
+            self.assertEqual('policy1', self.cache.get_network_policy_id(
+                self.context, 'net1'))
+        self.cache.get_policy(self.context, 'policy1')
+        self.assertEqual(1, self.get_network_policy.call_count)
+        self.assertFalse(self.get_object.called)
+
+        self.cache.invalidate_network('net1')
+        self.get_network_policy.return_value = None
+        self.assertIsNone(self.cache.get_network_policy_id(self.context,
+                                                           'net1'))
@@ -0,0 +1,106 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+
+import mock
+
+from networking_ovn.common import constants as ovn_const
+from networking_ovn.common import journal
+from networking_ovn.tests import base
+
+
+class TestOvnJournal(base.TestCase):
+
+    def setUp(self):
+        super(TestOvnJournal, self).setUp()
+        self.handler = mock.Mock()
+        self.journal = journal.OvnJournal(
+            {(ovn_const.JOURNAL_TYPE_PORT, ovn_const.JOURNAL_OP_CREATE):
+             self.handler})
+        self.db = mock.patch.object(journal, 'journal_db').start()
+        mock.patch.object(journal, 'n_context').start()
+        mock.patch.object(journal.config, 'get_ovn_journal_max_retries',
+                          return_value=2).start()
+        self.sleep = mock.patch.object(journal.greenthread, 'sleep').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def _row(self, seqnum, network_id='net1',
+             operation=ovn_const.JOURNAL_OP_CREATE):
+        return {'seqnum': seqnum, 'object_type': ovn_const.JOURNAL_TYPE_PORT,
+                'object_uuid': 'port%d' % seqnum, 'network_id': network_id,
+                'operation': operation, 'retry_count': 0,
+                'data': {'resource': {'id': 'port%d' % seqnum},
+                         'original': None}}
+
+    def test_record(self):
+        context = mock.Mock()
+        port = {'id': 'port1', 'network_id': 'net1'}
+        journal.record(context, ovn_const.JOURNAL_TYPE_PORT,
+                       ovn_const.JOURNAL_OP_CREATE, port)
+        self.db.create_pending_row.assert_called_once_with(
+            context.session, ovn_const.JOURNAL_TYPE_PORT, 'port1', 'net1',
+            ovn_const.JOURNAL_OP_CREATE, {'resource': port, 'original': None})
+
+    def test_dispatch_by_network(self):
+        rows = [self._row(1, 'net1'), self._row(2, 'net2'),
+                self._row(3, 'net1')]
+        self.db.claim_pending_rows.return_value = rows
+        with mock.patch.object(self.journal, '_pool') as pool:
+            self.assertTrue(self.journal._dispatch())
+        self.assertEqual(
+            [mock.call(self.journal._replay, [rows[0], rows[2]]),
+             mock.call(self.journal._replay, [rows[1]])],
+            pool.spawn_n.call_args_list)
+
+        self.db.claim_pending_rows.return_value = []
+        self.assertFalse(self.journal._dispatch())
+
+    def test_replay(self):
+        self.journal._replay([self._row(1), self._row(2)])
+        self.assertEqual([mock.call({'id': 'port1'}, None),
+                          mock.call({'id': 'port2'}, None)],
+                         self.handler.call_args_list)
+        self.assertEqual(2, self.db.delete_row.call_count)
+        self.assertEqual(2, self.journal._counters['replayed'])
+
+    def test_replay_retry(self):
+        self.handler.side_effect = [RuntimeError, None]
+        self.journal._replay([self._row(1)])
+        self.db.update_retry_count.assert_called_once_with(mock.ANY, 1, 1)
+        self.sleep.assert_called_once_with(1)
+        self.db.delete_row.assert_called_once_with(mock.ANY, 1)
+        self.assertEqual({'replayed': 1, 'retried': 1, 'failed': 0},
+                         self.journal._counters)
+
+    def test_replay_fail(self):
+        self.handler.side_effect = [RuntimeError] * 3 + [None]
+        self.journal._replay([self._row(1), self._row(2)])
+        # The first row is given up on after 2 retries, then the second
+        # row is replayed.
+        self.assertEqual(4, self.handler.call_count)
+        self.db.fail_row.assert_called_once_with(mock.ANY, 1)
+        self.db.delete_row.assert_called_once_with(mock.ANY, 2)
+        self.assertEqual({'replayed': 1, 'retried': 2, 'failed': 1},
+                         self.journal._counters)
+
+    def test_replay_no_handler(self):
+        self.journal._replay(
+            [self._row(1, operation=ovn_const.JOURNAL_OP_DELETE)])
+        self.assertFalse(self.handler.called)
+        self.db.fail_row.assert_called_once_with(mock.ANY, 1)
+
+    def test_replay_db_error_releases_rows(self):
+        self.db.delete_row.side_effect = [None, RuntimeError]
+        self.journal._replay([self._row(1), self._row(2), self._row(3)])
+        self.db.release_rows.assert_called_once_with(mock.ANY, [2, 3])
@@ -0,0 +1,79 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+
+import collections
+import os
+
+import mock
+from oslo_config import cfg
+from oslo_serialization import jsonutils
+
+from networking_ovn.common import stats
+from networking_ovn.tests import base
+
+
+class TestHistogram(base.TestCase):
+
+    def test_observe(self):
+        histogram = stats.Histogram((1, 10, 100))
+        for value in (0.5, 1, 2, 3, 50, 500):
+            histogram.observe(value)
+        self.assertEqual(
+            {'count': 6, 'sum': 556.5, 'max': 500, 'p50': 10, 'p90': 500,
+             'p99': 500, 'buckets': {'le_1': 2, 'le_10': 2, 'le_100': 1,
+                                     'inf': 1}},
+            histogram.to_dict())
+
+    def test_empty(self):
+        self.assertEqual(0, stats.Histogram().percentile(99))
+
+
+class TestStats(base.TestCase):
+
+    def setUp(self):
+        super(TestStats, self).setUp()
+        mock.patch.object(stats, '_histograms',
+                          collections.defaultdict(dict)).start()
+        mock.patch.object(stats, '_counters', collections.defaultdict(
+            lambda: collections.defaultdict(int))).start()
+        mock.patch.object(stats, '_providers', {}).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_get_stats(self):
+        stats.observe('command_run_idl', 'AddACLCommand', 0.003)
+        stats.incr('transaction_retries', 'bulk')
+        stats.incr('transaction_retries', 'bulk', 2)
+        stats.register_provider('journal', lambda: {'depth': 3})
+        stats.register_provider('broken', mock.Mock(side_effect=Exception))
+        result = stats.get_stats()
+        self.assertEqual(
+            1, result['histograms']['command_run_idl']['AddACLCommand'][
+                'buckets']['le_0.005'])
+        self.assertEqual({'transaction_retries': {'bulk': 3}},
+                         result['counters'])
+        self.assertEqual({'depth': 3}, result['journal'])
+        self.assertNotIn('broken', result)
+
+    def test_dump(self):
+        dump_dir = os.path.dirname(
+            self.create_tempfiles([('placeholder', '')])[0])
+        cfg.CONF.set_override('stats_dump_dir', dump_dir, 'ovn')
+        self.addCleanup(cfg.CONF.clear_override, 'stats_dump_dir', 'ovn')
+        stats.incr('transactions', 'critical')
+        stats.dump()
+        with open(os.path.join(dump_dir, 'networking-ovn-stats-%d.json' %
+                               os.getpid())) as f:
+            self.assertEqual({'critical': 1},
+                             jsonutils.load(f)['counters']['transactions'])
@@ -0,0 +1,141 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+import mock
+from oslo_serialization import jsonutils
+
+from networking_ovn.common import sync_report
+from networking_ovn.tests import base
+
+
+class TestSyncReport(base.TestCase):
+
+    def setUp(self):
+        super(TestSyncReport, self).setUp()
+        self.report = sync_report.SyncReport('log', sample_size=2,
+                                             log_limit=3)
+
+    def test_add_discrepancy(self):
+        with mock.patch.object(sync_report, 'LOG') as log:
+            for i in range(5):
+                self.report.add_discrepancy('port_missing_in_ovn',
+                                            'p%d' % i, 'Port %s missing')
+            self.report.add_discrepancy('port_acls', 'p1')
+            self.report.add_discrepancy('port_drifted', 'p2',
+                                        'Port %(port)s drifted',
+                                        {'port': 'p2'})
+        # Only the first log_limit discrepancies of a kind are logged.
+        self.assertEqual(
+            [mock.call('Port %s missing', 'p0'),
+             mock.call('Port %s missing', 'p1'),
+             mock.call('Port %s missing', 'p2'),
+             mock.call('Port %(port)s drifted', {'port': 'p2'})],
+            log.warning.call_args_list)
+        report = self.report.to_dict()
+        self.assertEqual(
+            {'port_missing_in_ovn': {'count': 5, 'samples': ['p0', 'p1']},
+             'port_acls': {'count': 1, 'samples': ['p1']},
+             'port_drifted': {'count': 1, 'samples': ['p2']}},
+            report['discrepancies'])
+        self.assertEqual(7, report['total_discrepancies'])
+
+        with mock.patch.object(sync_report, 'LOG') as log:
+            self.report.finish()
+        self.assertEqual(1, log.warning.call_count)
+
+    def test_phases_and_transactions(self):
+        self.report.start_phase('sync_acls')
+        self.report.count_query()
+        self.report.count_query()
+        self.report.add_transaction(3, 0.5)
+        self.report.add_transaction(5, 0.25)
+        self.report.end_phase('sync_acls', sync_report.PHASE_SUCCEEDED, 2)
+        # Queries outside of a phase are not counted.
+        self.report.count_query()
+        self.report.end_phase('sync_routers_and_rports',
+                              sync_report.PHASE_SKIPPED)
+
+        report = self.report.to_dict()
+        self.assertEqual(
+            {'sync_acls': {'status': 'succeeded', 'duration': 2,
+                           'db_queries': 2},
+             'sync_routers_and_rports': {'status': 'skipped',
+                                         'duration': 0.0,
+                                         'db_queries': 0}},
+            report['phases'])
+        self.assertEqual({'count': 2, 'commands': 8, 'max_commands': 5,
+                          'duration': 0.75}, report['transactions'])
+
+    def test_merge(self):
+        other = sync_report.SyncReport('log', sample_size=2)
+        other.start_phase('sync_acls')
+        other.count_query()
+        other.end_phase('sync_acls', sync_report.PHASE_FAILED, 3)
+        other.add_transaction(4, 1)
+        other.add_discrepancy('port_acls', 'p3')
+        other.add_discrepancy('port_acls', 'p4')
+        self.report.start_phase('sync_acls')
+        self.report.end_phase('sync_acls', sync_report.PHASE_SUCCEEDED, 1)
+        self.report.add_transaction(2, 0.5)
+        self.report.add_discrepancy('port_acls', 'p1')
+
+        self.report.merge(other.to_dict())
+        report = self.report.to_dict()
+        self.assertEqual({'sync_acls': {'status': 'failed', 'duration': 3,
+                                        'db_queries': 1}},
+                         report['phases'])
+        self.assertEqual({'count': 2, 'commands': 6, 'max_commands': 4,
+                          'duration': 1.5}, report['transactions'])
+        self.assertEqual({'port_acls': {'count': 3,
+                                        'samples': ['p1', 'p3']}},
+                         report['discrepancies'])
+
+    def test_peak_rss(self):
+        other = sync_report.SyncReport('log')
+        with mock.patch.object(sync_report.resource, 'getrusage') as usage:
+            usage.return_value.ru_maxrss = 300
+            other.finish()
+            self.assertEqual(300, other.to_dict()['peak_rss_kib'])
+
+            # The largest peak RSS of the merged runs is kept.
+            self.report.merge(other.to_dict())
+            usage.return_value.ru_maxrss = 200
+            self.report.finish()
+        self.assertEqual(300, self.report.to_dict()['peak_rss_kib'])
+
+    def test_time_to_first_comparison(self):
+        report = sync_report.SyncReport('log', process_started_at=100)
+        self.assertIsNone(report.to_dict()['time_to_first_comparison'])
+        with mock.patch.object(sync_report.time, 'time', side_effect=[
+                105, 107]):
+            report.mark_comparison()
+            report.mark_comparison()
+            report.mark_comparison()
+        self.assertEqual(105, report.first_comparison_at)
+
+        other = sync_report.SyncReport('log', process_started_at=100)
+        other.first_comparison_at = 103
+        report.merge(other.to_dict())
+        self.assertEqual(3, report.to_dict()['time_to_first_comparison'])
+
+    def test_write(self):
+        self.report.add_discrepancy('router_missing_in_ovn', 'r1')
+        self.report.finish()
+        path = self.create_tempfiles([('report', '')], ext='.json')[0]
+        self.report.write(path)
+        with open(path) as f:
+            report = jsonutils.load(f)
+        self.assertEqual('log', report['mode'])
+        self.assertEqual(1, report['total_discrepancies'])
+        self.assertIsNotNone(report['duration'])
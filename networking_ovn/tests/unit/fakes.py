@@ -30,6 +30,8 @@ class FakeOvsdbOvnIdl(object):
         self.get_all_logical_switches_ids = mock.Mock()
         self.get_logical_switch_ids = mock.Mock()
         self.get_all_logical_ports_ids = mock.Mock()
+        self.get_all_logical_ports_columns = mock.Mock()
+        self.get_all_logical_switch_digests = mock.Mock()
         self.create_lrouter = mock.Mock()
         self.update_lrouter = mock.Mock()
         self.delete_lrouter = mock.Mock()
@@ -39,6 +41,8 @@ class FakeOvsdbOvnIdl(object):
         self.add_acl = mock.Mock()
         self.delete_acl = mock.Mock()
         self.update_acls = mock.Mock()
+        self.update_lswitch_acls = mock.Mock()
+        self.check_revision_number = mock.Mock()
         self.idl = mock.Mock()
         self.add_static_route = mock.Mock()
         self.delete_static_route = mock.Mock()
@@ -0,0 +1,150 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+import collections
+
+import mock
+from neutron.agent.ovsdb import api
+
+from networking_ovn.common import constants as ovn_const
+from networking_ovn.ovsdb import impl_idl_ovn
+from networking_ovn.tests import base
+
+CRITICAL = ovn_const.TXN_PRIORITY_CRITICAL
+BULK = ovn_const.TXN_PRIORITY_BULK
+
+
+class TestTransactionScheduler(base.TestCase):
+
+    def setUp(self):
+        super(TestTransactionScheduler, self).setUp()
+        self.scheduler = impl_idl_ovn.TransactionScheduler(
+            {CRITICAL: 2, BULK: 1})
+        self.served = []
+
+    def _wait(self, priority, tenant_id, name):
+        # Queue a transaction as acquire() does, without blocking.
+        event = mock.Mock()
+        event.set.side_effect = lambda: self.served.append(name)
+        with self.scheduler._lock:
+            self.scheduler._waiting[priority].setdefault(
+                tenant_id, collections.deque()).append(event)
+            self.scheduler._dispatch()
+
+    def test_priority_and_fairness(self):
+        # Free slots are taken right away.
+        self.scheduler.acquire(BULK, 'tenant1')
+        self.scheduler.acquire(CRITICAL, 'tenant1')
+        self._wait(BULK, 'tenant1', 'bulk1')
+        self._wait(CRITICAL, 'tenant1', 'critical1')
+        self._wait(CRITICAL, 'tenant1', 'critical2')
+        self._wait(CRITICAL, 'tenant2', 'critical3')
+        self.assertEqual([], self.served)
+
+        for i in range(4):
+            self.scheduler.release(CRITICAL)
+        # The critical transactions go first, round robin between tenants,
+        # and the bulk one waits for the bulk slot.
+        self.assertEqual(['critical1', 'critical3', 'critical2'],
+                         self.served)
+        self.scheduler.release(BULK)
+        self.assertEqual('bulk1', self.served[-1])
+
+    def test_bulk_not_starved(self):
+        self.scheduler = impl_idl_ovn.TransactionScheduler(
+            {CRITICAL: 1, BULK: 1})
+        self.scheduler.acquire(CRITICAL)
+        self._wait(BULK, None, 'bulk')
+        for i in range(4):
+            self._wait(CRITICAL, None, 'critical%d' % i)
+
+        with mock.patch.object(impl_idl_ovn, 'TXN_MAX_SKIPS', 2):
+            for i in range(2):
+                self.scheduler.release(CRITICAL)
+            # Passed over twice, the bulk transaction gets the next slot.
+            self.scheduler.release(CRITICAL)
+            self.assertEqual(['critical0', 'critical1', 'bulk'],
+                             self.served)
+            self.scheduler.release(BULK)
+        self.assertEqual('critical2', self.served[-1])
+
+    def test_acquire_timeout(self):
+        self.scheduler.acquire(BULK)
+        self.scheduler.acquire(CRITICAL)
+
+        self.assertIsNone(self.scheduler.acquire(CRITICAL, 'tenant1',
+                                                 timeout=0.01))
+        # The transaction given up is not waiting for a slot anymore.
+        self.assertEqual({}, self.scheduler._waiting[CRITICAL])
+        self.scheduler.release(CRITICAL)
+        self.assertEqual(0, self.scheduler.get_stats()[CRITICAL]['running'])
+
+    def test_get_stats(self):
+        with mock.patch.object(impl_idl_ovn.time, 'time',
+                               side_effect=[10, 10.5, 20, 20]):
+            self.scheduler.acquire(BULK)
+            self.scheduler.acquire(CRITICAL)
+        self._wait(CRITICAL, None, 'critical')
+        stats = self.scheduler.get_stats()
+        self.assertEqual({'count': 1, 'wait': 0.5, 'max_wait': 0.5,
+                          'avg_wait': 0.5, 'waiting': 0, 'running': 1},
+                         stats[BULK])
+        self.assertEqual(1, stats[CRITICAL]['waiting'])
+        self.assertEqual(1, stats[CRITICAL]['running'])
+
+
+class TestOvnTransaction(base.TestCase):
+
+    def test_commit_timeout(self):
+        scheduler = mock.Mock()
+        scheduler.acquire.return_value = None
+        txn = impl_idl_ovn.OvnTransaction(mock.Mock(), mock.Mock(), 5,
+                                          scheduler=scheduler)
+
+        with mock.patch.object(impl_idl_ovn.impl_idl.Transaction,
+                               'commit') as commit:
+            self.assertRaises(api.TimeoutException, txn.commit)
+
+        scheduler.acquire.assert_called_once_with(CRITICAL, None, timeout=5)
+        self.assertFalse(commit.called)
+        self.assertFalse(scheduler.release.called)
+
+    def test_do_commit_stats(self):
+        command = type('AddACLCommand', (object,), {})()
+        command.run_idl = mock.Mock()
+        command.result = 'result'
+        txn = impl_idl_ovn.OvnTransaction(mock.Mock(), mock.Mock(), 5,
+                                          priority=BULK)
+        txn.commands = [command]
+
+        def do_commit(self):
+            # Retried once.
+            for i in range(2):
+                for cmd in self.commands:
+                    cmd.run_idl(None)
+            return [cmd.result for cmd in self.commands]
+
+        with mock.patch.object(impl_idl_ovn.impl_idl.Transaction,
+                               'do_commit', do_commit), \
+                mock.patch.object(impl_idl_ovn, 'stats') as stats:
+            self.assertEqual(['result'], txn.do_commit())
+
+        self.assertEqual([command], txn.commands)
+        self.assertEqual(2, command.run_idl.call_count)
+        self.assertEqual(3, stats.observe.call_count)
+        stats.observe.assert_any_call('command_run_idl', 'AddACLCommand',
+                                      mock.ANY)
+        stats.observe.assert_called_with('transaction_commit', BULK,
+                                         mock.ANY)
+        stats.incr.assert_called_with('transaction_retries', BULK, 1)
@@ -13,12 +13,15 @@
 #    under the License.
 
 import mock
+import os
 import time
 import uuid
 
+from oslo_config import cfg
 from ovs.db import idl as ovs_idl
 
 from networking_ovn.ovsdb import ovsdb_monitor
+from networking_ovn.tests import base
 from networking_ovn.tests.unit import test_ovn_plugin
 
 
@@ -167,3 +170,192 @@ class TestOvnIdlNotifyHandler(test_ovn_plugin.OVNPluginTestCase):
         self.idl.notify_handler.notify = mock.Mock()
         self.idl.notify("create", mock.ANY)
         self.assertTrue(self.idl.notify_handler.notify.called)
+
+    def test_notify_deferred(self):
+        self.idl.deferred_notifications = []
+        self.idl.notify_handler.notify = mock.Mock()
+        self.idl.notify("create", mock.ANY)
+        self.assertFalse(self.idl.notify_handler.notify.called)
+        self.assertEqual([("create", mock.ANY, None)],
+                         self.idl.deferred_notifications)
+
+    def test_notify_lag(self):
+        handler = self.idl.notify_handler
+        with mock.patch.object(ovsdb_monitor, 'LOG') as log, \
+                mock.patch.object(ovsdb_monitor.time, 'time',
+                                  return_value=100):
+            handler._record_lag(mock.Mock(), 40)
+            handler._record_lag(mock.Mock(), 50)
+        # Warnings are rate limited.
+        self.assertEqual(1, log.warning.call_count)
+        self.assertEqual(50, handler.max_lag)
+
+        # Queues the notify loops do not drain.
+        handler.notification_queues = [ovsdb_monitor.Queue.Queue(),
+                                       ovsdb_monitor.Queue.Queue()]
+        handler.notification_queues[0].put(
+            (mock.Mock(), 'create', None, None, 95))
+        handler.notification_queues[1].put(
+            (mock.Mock(), 'create', None, None, 90))
+        with mock.patch.object(ovsdb_monitor.time, 'time', return_value=100):
+            result = handler.get_stats()
+        self.assertEqual(2, result['depth'])
+        self.assertEqual([1, 1], result['worker_depths'])
+        self.assertEqual(10, result['oldest_age'])
+
+    def test_notify_same_row_same_queue(self):
+        handler = self.idl.notify_handler
+        # Queues the notify loops do not drain.
+        handler.notification_queues = [ovsdb_monitor.Queue.Queue()
+                                       for i in range(4)]
+        match = mock.Mock()
+        rows = [mock.Mock(uuid=uuid.uuid4()) for i in range(2)]
+        with mock.patch.object(handler, 'matching_events',
+                               return_value=(match,)):
+            handler.notify('update', rows[0])
+            handler.notify('create', rows[1])
+            handler.notify('delete', rows[0])
+        queue = handler._get_queue(rows[0])
+        self.assertEqual(
+            [(match, 'update', rows[0], None, mock.ANY),
+             (match, 'delete', rows[0], None, mock.ANY)],
+            [item for item in queue.queue if item[2] is rows[0]])
+        self.assertEqual(3, handler.get_stats()['depth'])
+
+    def test_notify_queue_beyond_warning(self):
+        cfg.CONF.set_override('notify_queue_warning', 1, 'ovn')
+        self.addCleanup(cfg.CONF.clear_override, 'notify_queue_warning',
+                        'ovn')
+        handler = self.idl.notify_handler
+        queue = ovsdb_monitor.Queue.Queue()
+        handler.notification_queues = [queue]
+        row = mock.Mock(uuid=uuid.uuid4())
+        match = mock.Mock(ONETIME=False)
+
+        def run(event, row, updates):
+            if event != 'create':
+                return
+            # The handler commits a transaction, during which the OVN NB DB
+            # connection keeps receiving notifications for its queue.
+            for i in range(3):
+                handler.notify('update', row)
+            queue.put(ovsdb_monitor.OvnNbNotifyHandler.STOP_EVENT)
+
+        match.run.side_effect = run
+        with mock.patch.object(handler, 'matching_events',
+                               return_value=(match,)), \
+                mock.patch.object(ovsdb_monitor, 'LOG') as log:
+            handler.notify('create', row)
+            # Run in this greenthread, it would hang were notify() waiting
+            # for the queue to be drained.
+            handler.notify_loop(queue)
+        # The notifications received during the run are handled after it.
+        self.assertEqual(4, match.run.call_count)
+        self.assertEqual(0, queue.qsize())
+        self.assertEqual(3, handler.get_stats()['max_depth'])
+        self.assertEqual(1, log.warning.call_count)
+
+    def test_get_stats_stop_event(self):
+        handler = self.idl.notify_handler
+        queue = ovsdb_monitor.Queue.Queue()
+        handler.notification_queues = [queue]
+        queue.put(ovsdb_monitor.OvnNbNotifyHandler.STOP_EVENT)
+        result = handler.get_stats()
+        self.assertEqual(1, result['depth'])
+        self.assertEqual(0.0, result['oldest_age'])
+
+
+class TestOvnConnection(base.TestCase):
+
+    def setUp(self):
+        super(TestOvnConnection, self).setUp()
+        self.conn = ovsdb_monitor.OvnConnection('remote', 5,
+                                                'OVN_Northbound')
+        self.conn.idl = mock.Mock(deferred_notifications=None)
+
+    def test_wrap_idl_run_native(self):
+        def run():
+            self.assertTrue(self.conn.idl_lock.locked())
+            # As OvnIdl.notify() does on the native thread.
+            self.conn.idl.deferred_notifications.append(
+                ('create', 'row', None))
+            return True
+
+        self.conn.idl.run = run
+        with mock.patch.object(ovsdb_monitor.tpool, 'execute',
+                               side_effect=lambda f: f()) as execute:
+            self.conn._wrap_idl_run(True)
+            self.assertTrue(self.conn.idl.run())
+        self.assertTrue(execute.called)
+        self.conn.idl.notify.assert_called_once_with('create', 'row', None)
+        self.assertIsNone(self.conn.idl.deferred_notifications)
+        self.assertFalse(self.conn.idl_lock.locked())
+
+    def test_wrap_idl_run_greenthread(self):
+        self.conn.idl.run.return_value = False
+        with mock.patch.object(ovsdb_monitor.tpool, 'execute') as execute, \
+                mock.patch.object(ovsdb_monitor, 'stats') as stats:
+            self.conn._wrap_idl_run(False)
+            self.assertFalse(self.conn.idl.run())
+        self.assertFalse(execute.called)
+        stats.observe.assert_called_once_with('idl_run', 'greenthread',
+                                              mock.ANY)
+
+    def _set_schema_cache_dir(self):
+        cache_dir = os.path.dirname(
+            self.create_tempfiles([('placeholder', '')])[0])
+        cfg.CONF.set_override('ovsdb_schema_cache_dir', cache_dir, 'ovn')
+        self.addCleanup(cfg.CONF.clear_override, 'ovsdb_schema_cache_dir',
+                        'ovn')
+        return self.conn._get_schema_cache_file()
+
+    def test_schema_cache(self):
+        cache_file = self._set_schema_cache_dir()
+        self.assertIsNone(self.conn._load_schema_helper(cache_file))
+        self.conn._write_schema_cache(
+            cache_file, mock.Mock(schema_json=OVN_NB_SCHEMA))
+        helper = self.conn._load_schema_helper(cache_file)
+        self.assertEqual(OVN_NB_SCHEMA, helper.schema_json)
+
+    def test_check_schema_cache(self):
+        cached_helper = mock.Mock(schema_json={'version': '2.0.1'})
+        helper = mock.Mock(schema_json={'version': '2.0.1'})
+        with mock.patch.object(self.conn, '_fetch_schema_helper',
+                               return_value=helper), \
+                mock.patch.object(self.conn, '_write_schema_cache') as write:
+            self.conn._check_schema_cache('cache', cached_helper)
+            self.assertFalse(write.called)
+            helper.schema_json = {'version': '2.0.2'}
+            self.conn._check_schema_cache('cache', cached_helper)
+            write.assert_called_once_with('cache', helper)
+
+    def _test_start_from_schema_cache(self, start_errors):
+        self.conn.idl = None
+        cache_file = self._set_schema_cache_dir()
+        self.conn._write_schema_cache(
+            cache_file, mock.Mock(schema_json=OVN_NB_SCHEMA))
+        fetched_helper = mock.Mock(schema_json=OVN_NB_SCHEMA)
+        with mock.patch.object(self.conn, '_start_idl',
+                               side_effect=start_errors) as start_idl, \
+                mock.patch.object(self.conn, '_stop_idl') as stop_idl, \
+                mock.patch.object(self.conn, '_fetch_schema_helper',
+                                  return_value=fetched_helper) as fetch, \
+                mock.patch.object(ovsdb_monitor, 'threading'), \
+                mock.patch.object(ovsdb_monitor, 'poller'):
+            self.conn.start()
+        return start_idl, stop_idl, fetch, fetched_helper
+
+    def test_start_from_schema_cache(self):
+        start_idl, stop_idl, fetch, _ = self._test_start_from_schema_cache(
+            [None])
+        self.assertFalse(fetch.called)
+        self.assertFalse(stop_idl.called)
+        helper = start_idl.call_args[0][1]
+        self.assertEqual(OVN_NB_SCHEMA, helper.schema_json)
+
+    def test_start_from_stale_schema_cache(self):
+        start_idl, stop_idl, fetch, fetched_helper = (
+            self._test_start_from_schema_cache([Exception('Timeout'), None]))
+        self.assertTrue(stop_idl.called)
+        self.assertTrue(fetch.called)
+        start_idl.assert_called_with(None, fetched_helper)
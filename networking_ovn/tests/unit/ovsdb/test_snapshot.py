@@ -0,0 +1,135 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+from oslo_serialization import jsonutils
+
+from networking_ovn.common import constants as ovn_const
+from networking_ovn.ovsdb import impl_idl_ovn
+from networking_ovn.ovsdb import snapshot
+from networking_ovn.tests import base
+
+SCHEMA = {
+    'name': 'OVN_Northbound',
+    'tables': {
+        'Logical_Switch': {'columns': {
+            'name': {'type': 'string'},
+            'ports': {'type': {'key': {'type': 'uuid',
+                                       'refTable': 'Logical_Port'},
+                               'min': 0, 'max': 'unlimited'}},
+            'external_ids': {'type': {'key': 'string', 'value': 'string',
+                                      'min': 0, 'max': 'unlimited'}}}},
+        'Logical_Port': {'columns': {
+            'name': {'type': 'string'},
+            'enabled': {'type': {'key': 'boolean', 'min': 0, 'max': 1}},
+            'addresses': {'type': {'key': 'string', 'min': 0,
+                                   'max': 'unlimited'}},
+            'external_ids': {'type': {'key': 'string', 'value': 'string',
+                                      'min': 0, 'max': 'unlimited'}}}}}}
+
+NETWORK_EXT_IDS = ['map', [[ovn_const.OVN_NETWORK_NAME_EXT_ID_KEY, 'net1']]]
+PORT_EXT_IDS = ['map', [[ovn_const.OVN_PORT_NAME_EXT_ID_KEY, 'port']]]
+
+
+class TestSnapshot(base.TestCase):
+
+    def _create_file(self, name, content):
+        return self.create_tempfiles([(name, content)], ext='')[0]
+
+    def _create_db_file(self, records):
+        content = ''
+        for record in [SCHEMA] + records:
+            text = jsonutils.dumps(record)
+            content += 'OVSDB JSON %d 0\n%s\n' % (len(text), text)
+        return self._create_file('ovnnb_db.db', content)
+
+    def test_load_db_file(self):
+        path = self._create_db_file([
+            {'Logical_Port': {'p1': {'name': 'port1',
+                                     'addresses': 'mac1 10.0.0.2'}},
+             'Logical_Switch': {'s1': {'name': 'neutron-n1',
+                                       'ports': ['uuid', 'p1'],
+                                       'external_ids': NETWORK_EXT_IDS}}},
+            {'_date': 1, 'Logical_Port': {'p2': {
+                'name': 'port2', 'enabled': False,
+                'external_ids': PORT_EXT_IDS}},
+             'Logical_Switch': {'s1': {'ports': ['set', [['uuid', 'p1'],
+                                                         ['uuid', 'p2']]]}}},
+            {'Logical_Port': {'p1': None}}])
+
+        idl = snapshot.load(path)
+        lswitch = idl.tables['Logical_Switch'].rows['s1']
+        self.assertEqual('neutron-n1', lswitch.name)
+        # The reference to the deleted port is dropped.
+        self.assertEqual(['port2'], [lport.name for lport in lswitch.ports])
+        lport = idl.tables['Logical_Port'].rows['p2']
+        self.assertEqual([False], lport.enabled)
+        self.assertEqual([], lport.addresses)
+
+        api = snapshot.OvsdbSnapshotIdl(idl)
+        self.assertEqual([{'name': 'neutron-n1', 'ports': ['port2']}],
+                         api.get_all_logical_switches_with_ports())
+        self.assertRaises(RuntimeError, api.transaction)
+
+    def test_load_db_file_diff_records(self):
+        path = self._create_db_file([
+            {'Logical_Port': {'p1': {'name': 'port1'},
+                              'p2': {'name': 'port2'}},
+             'Logical_Switch': {'s1': {'name': 'neutron-n1',
+                                       'ports': ['uuid', 'p1'],
+                                       'external_ids': NETWORK_EXT_IDS}}},
+            {'_is_diff': True,
+             'Logical_Switch': {'s1': {
+                 'ports': ['set', [['uuid', 'p1'], ['uuid', 'p2']]],
+                 'external_ids': ['map', [['k', 'v']]]}}}])
+
+        lswitch = snapshot.load(path).tables['Logical_Switch'].rows['s1']
+        self.assertEqual(['port2'], [lport.name for lport in lswitch.ports])
+        self.assertEqual({ovn_const.OVN_NETWORK_NAME_EXT_ID_KEY: 'net1',
+                          'k': 'v'}, lswitch.external_ids)
+
+    def test_load_dump(self):
+        tables = [
+            {'caption': 'Logical_Port table',
+             'headings': ['_uuid', '_version', 'addresses', 'enabled',
+                          'external_ids', 'name'],
+             'data': [[['uuid', 'p1'], ['uuid', 'v1'], 'mac1 10.0.0.2',
+                       ['set', []], PORT_EXT_IDS, 'port1']]},
+            {'caption': 'Logical_Switch table',
+             'headings': ['_uuid', '_version', 'external_ids', 'name',
+                          'ports'],
+             'data': [[['uuid', 's1'], ['uuid', 'v2'], NETWORK_EXT_IDS,
+                       'neutron-n1', ['uuid', 'p1']]]}]
+        path = self._create_file(
+            'nb.json', '\n'.join(jsonutils.dumps(t) for t in tables))
+        schema_path = self._create_file('nb.ovsschema',
+                                        jsonutils.dumps(SCHEMA))
+
+        self.assertRaises(ValueError, snapshot.load, path)
+        api = snapshot.OvsdbSnapshotIdl(snapshot.load(path, schema_path))
+        self.assertEqual([{'name': 'neutron-n1', 'ports': ['port1']}],
+                         api.get_all_logical_switches_with_ports())
+        self.assertEqual(
+            {'port1': {'addresses': ['mac1 10.0.0.2'], 'enabled': []}},
+            api.get_all_logical_ports_columns(['addresses', 'enabled']))
+
+    def test_read_without_connection(self):
+        path = self._create_db_file([
+            {'Logical_Switch': {'s1': {'name': 'neutron-n1',
+                                       'external_ids': NETWORK_EXT_IDS}}}])
+
+        # An audit of a snapshot never connects to the OVN NB DB.
+        with mock.patch.object(impl_idl_ovn.OvsdbOvnIdl, 'ovsdb_connection',
+                               None):
+            api = snapshot.OvsdbSnapshotIdl(snapshot.load(path))
+            self.assertEqual([{'name': 'neutron-n1', 'ports': []}],
+                             api.get_all_logical_switches_with_ports())
@@ -12,8 +12,14 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import os
+
 import mock
+from oslo_config import cfg
+from oslo_serialization import jsonutils
+import six
 
+from networking_ovn.common import constants as ovn_const
 from networking_ovn import ovn_nb_sync
 from networking_ovn.ovsdb import impl_idl_ovn
 from networking_ovn.tests.unit import test_ovn_plugin
@@ -202,6 +208,12 @@ class TestOvnNbSync(test_ovn_plugin.OVNPluginTestCase):
         self.plugin._ovn.get_all_logical_switches_with_ports = mock.Mock()
         self.plugin._ovn.get_all_logical_switches_with_ports.return_value = (
             self.lswitches_with_ports)
+        self.plugin._ovn.get_all_logical_switches_ids = mock.Mock(
+            return_value={})
+        self.plugin._ovn.get_all_logical_ports_ids = mock.Mock(
+            return_value={})
+        self.plugin._ovn.get_all_logical_ports_columns = mock.Mock(
+            return_value={})
 
         self.plugin._ovn.get_all_logical_routers_with_rports = mock.Mock()
         self.plugin._ovn.get_all_logical_routers_with_rports.return_value = (
@@ -345,3 +357,592 @@ class TestOvnNbSync(test_ovn_plugin.OVNPluginTestCase):
                                       del_router_list, del_router_port_list,
                                       create_network_list, create_port_list,
                                       del_network_list, del_port_list)
+
+    def _test_sync_all(self, mode, ports_fail=False):
+        self.ovn_nb_sync = ovn_nb_sync.OvnNbSynchronizer(self.plugin,
+                                                         self._ovn, mode)
+        calls = []
+
+        def _phase(name, fail=False):
+            def _run(ctx):
+                calls.append(name)
+                if fail:
+                    raise RuntimeError()
+            _run.__name__ = name
+            return _run
+        self.ovn_nb_sync.sync_networks_and_ports = _phase('ports', ports_fail)
+        self.ovn_nb_sync.sync_acls = _phase('acls')
+        self.ovn_nb_sync.sync_routers_and_rports = _phase('routers')
+        with mock.patch.object(ovn_nb_sync.context, 'get_admin_context'):
+            result = self.ovn_nb_sync.sync_all()
+        return result, calls
+
+    def test_sync_all(self):
+        result, calls = self._test_sync_all('repair')
+        self.assertTrue(result)
+        self.assertEqual('ports', calls[0])
+        self.assertEqual(set(['ports', 'acls', 'routers']), set(calls))
+
+    def test_sync_all_dependency_failed(self):
+        result, calls = self._test_sync_all('repair', ports_fail=True)
+        self.assertFalse(result)
+        self.assertEqual(['ports'], calls)
+
+    def test_sync_all_log_mode_independent_phases(self):
+        result, calls = self._test_sync_all('log', ports_fail=True)
+        self.assertFalse(result)
+        self.assertEqual(set(['ports', 'acls', 'routers']), set(calls))
+
+    def test_sync_all_report(self):
+        report_file = self.get_temp_file_path('report.json')
+        cfg.CONF.set_override('sync_report_file', report_file, 'ovn')
+        self.ovn_nb_sync = ovn_nb_sync.OvnNbSynchronizer(self.plugin,
+                                                         self._ovn, 'log')
+        admin_ctx = ovn_nb_sync.context.get_admin_context()
+
+        def sync_networks_and_ports(ctx):
+            self.plugin.get_networks(admin_ctx)
+            self.ovn_nb_sync.report.add_discrepancy(
+                'network_missing_in_ovn', 'n1')
+
+        def sync_acls(ctx):
+            raise RuntimeError()
+        self.ovn_nb_sync.sync_networks_and_ports = sync_networks_and_ports
+        self.ovn_nb_sync.sync_acls = sync_acls
+        self.ovn_nb_sync.sync_routers_and_rports = mock.Mock(
+            __name__='sync_routers_and_rports')
+        with mock.patch.object(ovn_nb_sync.context, 'get_admin_context'):
+            self.assertFalse(self.ovn_nb_sync.sync_all())
+
+        with open(report_file) as f:
+            report = jsonutils.load(f)
+        phases = report['phases']
+        self.assertEqual('succeeded',
+                         phases['sync_networks_and_ports']['status'])
+        self.assertTrue(phases['sync_networks_and_ports']['db_queries'])
+        self.assertEqual('failed', phases['sync_acls']['status'])
+        self.assertEqual(0, phases['sync_routers_and_rports']['db_queries'])
+        self.assertEqual({'network_missing_in_ovn': {'count': 1,
+                                                     'samples': ['n1']}},
+                         report['discrepancies'])
+
+    def test_commit_in_chunks(self):
+        cfg.CONF.set_override('sync_transaction_size', 3, 'ovn')
+        self.ovn_nb_sync = ovn_nb_sync.OvnNbSynchronizer(self.plugin,
+                                                         self._ovn, 'repair')
+        txns = []
+
+        def _transaction(check_error=False, **kwargs):
+            txn = mock.MagicMock()
+            txn.__enter__.return_value = txn
+            txns.append(txn)
+            return txn
+        self._ovn.transaction = _transaction
+        units = [['c1', 'c2'], [], ['c3', 'c4'], ['c5'],
+                 ['c6', 'c7', 'c8', 'c9']]
+        self.ovn_nb_sync._commit_in_chunks('test', units)
+
+        # The commands of a unit are never split between transactions.
+        self.assertEqual([['c1', 'c2'], ['c3', 'c4', 'c5'],
+                          ['c6', 'c7', 'c8', 'c9']],
+                         [[c[0][0] for c in txn.add.call_args_list]
+                          for txn in txns])
+
+    def test_sync_all_checkpoint(self):
+        checkpoint_file = self.get_temp_file_path('checkpoint')
+        with open(checkpoint_file, 'w') as f:
+            f.write('{"mode": "repair", "completed_phases": ["ports"]}')
+        self.ovn_nb_sync = ovn_nb_sync.OvnNbSynchronizer(
+            self.plugin, self._ovn, 'repair',
+            checkpoint_file=checkpoint_file)
+        calls = []
+
+        def _phase(name, fail=False):
+            def _run(ctx):
+                calls.append(name)
+                if fail:
+                    raise RuntimeError()
+            _run.__name__ = name
+            return _run
+        self.ovn_nb_sync.sync_networks_and_ports = _phase('ports')
+        self.ovn_nb_sync.sync_acls = _phase('acls')
+        self.ovn_nb_sync.sync_routers_and_rports = _phase('routers', True)
+        with mock.patch.object(ovn_nb_sync.context, 'get_admin_context'):
+            self.assertFalse(self.ovn_nb_sync.sync_all())
+        self.assertEqual(set(['acls', 'routers']), set(calls))
+        with open(checkpoint_file) as f:
+            self.assertEqual(
+                {'mode': 'repair', 'completed_phases': ['acls', 'ports']},
+                jsonutils.load(f))
+
+        del calls[:]
+        self.ovn_nb_sync.sync_routers_and_rports = _phase('routers')
+        with mock.patch.object(ovn_nb_sync.context, 'get_admin_context'):
+            self.assertTrue(self.ovn_nb_sync.sync_all())
+        self.assertEqual(['routers'], calls)
+        self.assertFalse(os.path.exists(checkpoint_file))
+
+    def test_sync_networks_and_ports_bulk_rebuild(self):
+        cfg.CONF.set_override('sync_bulk_rebuild', True, 'ovn')
+        self.ovn_nb_sync = ovn_nb_sync.OvnNbSynchronizer(self.plugin,
+                                                         self._ovn, 'repair')
+        self.plugin.get_networks = mock.Mock(return_value=self.networks)
+        self.plugin.get_ports = mock.Mock(return_value=self.ports)
+        self._ovn.get_all_logical_switches_with_ports = mock.Mock(
+            return_value=[])
+        self._ovn.get_all_logical_switches_ids = mock.Mock(return_value={})
+        self._ovn.get_all_logical_ports_ids = mock.Mock(return_value={})
+        self._ovn.get_all_logical_ports_columns = mock.Mock(return_value={})
+        self.plugin.create_network_in_ovn = mock.Mock()
+        self.plugin.create_port_in_ovn = mock.Mock()
+        self.plugin._create_network_in_ovn_cmds = mock.Mock(
+            side_effect=lambda net, ext_ids: ['lswitch-%s' % net['id']])
+        self.plugin._create_port_in_ovn_cmds = mock.Mock(
+            side_effect=lambda ctx, port, info, **kwargs: [
+                'lport-%s' % port['id']])
+        self.plugin._get_lswitch_acl_keys = mock.Mock(return_value=['key'])
+        self.plugin.get_ovn_port_options = mock.Mock()
+        self.plugin.qos_get_ovn_port_options = mock.Mock()
+        self._ovn.update_lswitch_acls = mock.Mock(
+            side_effect=lambda lswitch, lport_acl_keys: 'acls-%s' % lswitch)
+        self.ovn_nb_sync._commit_in_chunks = mock.Mock()
+
+        self.ovn_nb_sync.sync_networks_and_ports(mock.ANY)
+
+        self.assertFalse(self.plugin.create_network_in_ovn.called)
+        self.assertFalse(self.plugin.create_port_in_ovn.called)
+        units = self.ovn_nb_sync._commit_in_chunks.call_args_list[0][0][1]
+        self.assertEqual(
+            sorted(['lswitch-n1', 'lswitch-n2']),
+            sorted(u[0] for u in units[:2]))
+        # The shared ACLs of the lswitches are set before the lports are
+        # created.
+        self.assertEqual(sorted(['acls-neutron-n1', 'acls-neutron-n2']),
+                         sorted(u[0] for u in units[2:4]))
+        self.assertEqual(sorted('lport-%s' % p['id'] for p in self.ports),
+                         sorted(u[0] for u in units[4:]))
+        self._ovn.update_lswitch_acls.assert_any_call(
+            'neutron-n1', {'p1n1': ['key'], 'p2n1': ['key']})
+        # The caches are shared between ports.
+        caches = [c[1] for c in
+                  self.plugin._create_port_in_ovn_cmds.call_args_list]
+        for kwargs in caches[1:]:
+            self.assertIs(caches[0]['sg_ports_cache'],
+                          kwargs['sg_ports_cache'])
+
+    def _test_sync_revision_numbers(self, mode):
+        self.ovn_nb_sync = ovn_nb_sync.OvnNbSynchronizer(self.plugin,
+                                                         self._ovn, mode)
+        rev_key = ovn_const.OVN_REV_NUM_EXT_ID_KEY
+        self.plugin.get_networks = mock.Mock(return_value=[
+            {'id': 'n1', 'name': 'net1', 'revision_number': 3},
+            {'id': 'n2', 'name': 'net2-renamed', 'revision_number': 2,
+             'provider:physical_network': 'physnet1',
+             'provider:network_type': 'vlan',
+             'provider:segmentation_id': 10}])
+        self.plugin.get_ports = mock.Mock(return_value=[
+            {'id': 'p1', 'network_id': 'n1', 'revision_number': 5},
+            {'id': 'p2', 'network_id': 'n1', 'revision_number': 5},
+            {'id': 'p3', 'network_id': 'n2'}])
+        self._ovn.get_all_logical_switches_with_ports = mock.Mock(
+            return_value=[{'name': 'neutron-n1', 'ports': ['p1', 'p2']},
+                          {'name': 'neutron-n2', 'ports': ['p3']}])
+        self._ovn.get_all_logical_switches_ids = mock.Mock(return_value={
+            'neutron-n1': {rev_key: '3'}, 'neutron-n2': {rev_key: '1'}})
+        self._ovn.get_all_logical_ports_ids = mock.Mock(return_value={
+            'p1': {rev_key: '5'}, 'p2': {rev_key: '4'}, 'p3': {}})
+        self._ovn.get_all_logical_ports_columns = mock.Mock(return_value={})
+        self._ovn.transaction = mock.MagicMock()
+        self._ovn.check_revision_number = mock.Mock()
+        self._ovn.set_lswitch_ext_id = mock.Mock()
+        self._ovn.create_lport = mock.Mock()
+        self.plugin._update_port_in_ovn = mock.Mock()
+        self.ovn_nb_sync._get_ovn_port_info = mock.Mock(return_value='info')
+
+        return self.ovn_nb_sync.sync_networks_and_ports(mock.ANY)
+
+    def test_sync_revision_numbers(self):
+        out_of_sync = self._test_sync_revision_numbers('repair')
+        self.assertEqual(set(['neutron-n1', 'neutron-n2']), out_of_sync)
+        # Only the rows written from an older revision are updated, the
+        # resources without revision number are left alone.  The lswitch
+        # is rendered again from the network, not only stamped.
+        self._ovn.check_revision_number.assert_called_once_with(
+            'Logical_Switch', 'neutron-n2', 2)
+        self.assertEqual(
+            sorted([('neutron-n2', (ovn_const.OVN_NETWORK_NAME_EXT_ID_KEY,
+                                    'net2-renamed')),
+                    ('neutron-n2', (ovn_const.OVN_PHYSNET_EXT_ID_KEY,
+                                    'physnet1')),
+                    ('neutron-n2', (ovn_const.OVN_NETTYPE_EXT_ID_KEY,
+                                    'vlan')),
+                    ('neutron-n2', (ovn_const.OVN_SEGID_EXT_ID_KEY, '10')),
+                    ('neutron-n2', (ovn_const.OVN_REV_NUM_EXT_ID_KEY,
+                                    '2'))]),
+            sorted(c[0] for c in
+                   self._ovn.set_lswitch_ext_id.call_args_list))
+        self._ovn.create_lport.assert_called_once_with(
+            lport_name='provnet-n2', lswitch_name='neutron-n2',
+            addresses=['unknown'], external_ids=None, type='localnet',
+            tag=10, options={'network_name': 'physnet1'})
+        port = {'id': 'p2', 'network_id': 'n1', 'revision_number': 5}
+        self.plugin._update_port_in_ovn.assert_called_once_with(
+            mock.ANY, port, port, 'info')
+
+    def test_sync_revision_numbers_log_mode(self):
+        out_of_sync = self._test_sync_revision_numbers('log')
+        self.assertEqual(set(['neutron-n1', 'neutron-n2']), out_of_sync)
+        self.assertFalse(self._ovn.set_lswitch_ext_id.called)
+        self.assertFalse(self.plugin._update_port_in_ovn.called)
+
+    def _test_sync_lport_columns(self, mode):
+        self.ovn_nb_sync = ovn_nb_sync.OvnNbSynchronizer(self.plugin,
+                                                         self._ovn, mode)
+        ports = [{'id': 'p%d' % i, 'network_id': 'n1',
+                  'admin_state_up': True} for i in range(1, 5)]
+        self.plugin.get_networks = mock.Mock(return_value=[{'id': 'n1'}])
+        self.plugin.get_ports = mock.Mock(return_value=ports)
+        self._ovn.get_all_logical_switches_with_ports = mock.Mock(
+            return_value=[{'name': 'neutron-n1',
+                           'ports': ['p1', 'p2', 'p3', 'p4']}])
+        self._ovn.get_all_logical_switches_ids = mock.Mock(return_value={})
+        self._ovn.get_all_logical_ports_ids = mock.Mock(return_value={})
+        in_sync = {'addresses': ['fa:16:3e:00:00:01 10.0.0.2'],
+                   'port_security': ['fa:16:3e:00:00:01 10.0.0.2'],
+                   'options': {'policing_rate': '1000'},
+                   'enabled': []}
+        self._ovn.get_all_logical_ports_columns = mock.Mock(return_value={
+            'p1': in_sync,
+            'p2': dict(in_sync, port_security=[], enabled=[False]),
+            'p3': dict(in_sync, options={})})
+        self.ovn_nb_sync._get_ovn_port_info = mock.Mock(
+            return_value=mock.Mock(
+                addresses=['fa:16:3e:00:00:01 10.0.0.2'],
+                port_security=['fa:16:3e:00:00:01 10.0.0.2'],
+                options={'policing_rate': 1000}))
+        self._ovn.set_lport = mock.Mock(
+            side_effect=lambda lport_name, **columns: (lport_name, columns))
+        self.ovn_nb_sync._commit_in_chunks = mock.Mock()
+
+        out_of_sync = self.ovn_nb_sync.sync_networks_and_ports(mock.ANY)
+        self.assertEqual(set(['neutron-n1']), out_of_sync)
+        # p4 has no logical port and is not compared.
+        self.assertEqual(3, self.ovn_nb_sync._get_ovn_port_info.call_count)
+        return self.ovn_nb_sync._commit_in_chunks.call_args_list[0][0]
+
+    def test_sync_lport_columns(self):
+        phase, units = self._test_sync_lport_columns('repair')
+        self.assertEqual('ports update', phase)
+        # Only the drifted columns are set, all ports in the same chunks.
+        self.assertEqual(
+            [[], [('p2', {'port_security': ['fa:16:3e:00:00:01 10.0.0.2'],
+                          'enabled': True})],
+             [('p3', {'options': {'policing_rate': 1000}})]], units)
+
+    def test_sync_lport_columns_log_mode(self):
+        phase, units = self._test_sync_lport_columns('log')
+        self.assertEqual([[], [], []], units)
+        self.assertFalse(self._ovn.set_lport.called)
+
+    def test_sync_networks_and_ports_shard(self):
+        networks = [{'id': 'n%d' % i} for i in range(8)]
+
+        def _get_networks(ctx, filters=None, **kwargs):
+            ids = (filters or {}).get('id')
+            return [n for n in networks if ids is None or n['id'] in ids]
+        self.plugin.get_networks = mock.Mock(side_effect=_get_networks)
+        self.plugin.get_ports = mock.Mock(return_value=[])
+        self._ovn.get_all_logical_switches_with_ports = mock.Mock(
+            return_value=[{'name': 'neutron-o%d' % i, 'ports': []}
+                          for i in range(8)])
+        self._ovn.get_all_logical_switches_ids = mock.Mock(return_value={})
+        self._ovn.get_all_logical_ports_ids = mock.Mock(return_value={})
+        self._ovn.get_all_logical_ports_columns = mock.Mock(return_value={})
+
+        found = {'network_missing_in_ovn': [],
+                 'network_missing_in_neutron': []}
+        for index in range(3):
+            self.ovn_nb_sync = ovn_nb_sync.OvnNbSynchronizer(
+                self.plugin, self._ovn, 'log', shard=(index, 3))
+            self.ovn_nb_sync.sync_networks_and_ports(mock.ANY)
+            discrepancies = self.ovn_nb_sync.report.discrepancies
+            for category, ids in six.iteritems(found):
+                ids.extend(discrepancies.get(category, {}).get('samples',
+                                                               []))
+        # Each network, and each lswitch left without network, is synced
+        # by exactly one shard.
+        self.assertEqual(sorted(n['id'] for n in networks),
+                         sorted(found['network_missing_in_ovn']))
+        self.assertEqual(['neutron-o%d' % i for i in range(8)],
+                         sorted(found['network_missing_in_neutron']))
+
+    def test_iter_resources(self):
+        resources = [{'id': 'id%d' % i} for i in range(5)]
+
+        def _get_resources(ctx, filters, sorts, limit, marker):
+            self.assertEqual({'id': ['x']}, filters)
+            self.assertEqual([('id', True)], sorts)
+            start = 0
+            if marker:
+                start = [r['id'] for r in resources].index(marker) + 1
+            return resources[start:start + limit]
+        get_resources = mock.Mock(side_effect=_get_resources)
+
+        with mock.patch.object(ovn_nb_sync, 'SYNC_PAGE_SIZE', 2):
+            result = list(ovn_nb_sync.OvnNbSynchronizer._iter_resources(
+                get_resources, mock.ANY, filters={'id': ['x']}))
+        self.assertEqual(resources, result)
+        self.assertEqual([None, 'id1', 'id3'],
+                         [c[1]['marker'] for c in
+                          get_resources.call_args_list])
+
+    def test_sync_acls_lswitch_acls_per_network(self):
+        self.ovn_nb_sync = ovn_nb_sync.OvnNbSynchronizer(self.plugin,
+                                                         self._ovn, 'repair')
+
+        def _lswitch_acl(lswitch, lports):
+            return {'lswitch': lswitch, 'lport': None,
+                    'external_ids': {
+                        ovn_const.OVN_LSWITCH_ACL_EXT_ID_KEY: 'key',
+                        ovn_const.OVN_LSWITCH_ACL_LPORTS_EXT_ID_KEY: lports}}
+        self.ovn_nb_sync.get_acls = mock.Mock(return_value={None: [
+            _lswitch_acl('neutron-n1', 'p1 p2'),
+            _lswitch_acl('neutron-n2', 'p3 p5'),
+            _lswitch_acl('neutron-n3', 'p6')]})
+        self.plugin.get_security_groups = mock.Mock(return_value=[])
+        self.plugin.get_ports = mock.Mock(return_value=[
+            {'id': 'p1', 'network_id': 'n1', 'security_groups': ['sg1']},
+            {'id': 'p2', 'network_id': 'n1', 'security_groups': ['sg1']},
+            {'id': 'p4', 'network_id': 'n1', 'security_groups': []},
+            {'id': 'p3', 'network_id': 'n2', 'security_groups': ['sg1']}])
+        self.plugin._add_acls = mock.Mock(return_value=[])
+        self.plugin._get_lswitch_acl_keys = mock.Mock(return_value=['key'])
+        self._ovn.update_lswitch_acls = mock.Mock()
+        self.ovn_nb_sync._commit_in_chunks = mock.Mock()
+
+        with mock.patch.object(
+                self.ovn_nb_sync, '_get_lswitches_to_repair',
+                side_effect=self.ovn_nb_sync._get_lswitches_to_repair) as \
+                get_lswitches_to_repair:
+            lswitches = self.ovn_nb_sync.sync_acls(mock.ANY)
+
+        self.assertEqual(set(['neutron-n2', 'neutron-n3']), lswitches)
+        # The ports are read ordered by network.
+        self.assertEqual([('network_id', True), ('id', True)],
+                         self.plugin.get_ports.call_args[1]['sorts'])
+        # The shared ACLs are compared one network at a time.
+        self.assertEqual(
+            [['neutron-n1'], ['neutron-n2'], []],
+            [list(c[0][0]) for c in get_lswitches_to_repair.call_args_list])
+        self._ovn.update_lswitch_acls.assert_has_calls(
+            [mock.call('neutron-n2', {'p3': ['key']}, replace=True),
+             mock.call('neutron-n3', {}, replace=True)], any_order=True)
+        self.assertEqual(2, self._ovn.update_lswitch_acls.call_count)
+
+    def test_get_acls_single_query(self):
+        self.ovn_nb_sync = ovn_nb_sync.OvnNbSynchronizer(self.plugin,
+                                                         self._ovn, 'log')
+        ctx = mock.Mock()
+        query = ctx.session.query.return_value.join.return_value
+        query.distinct.return_value = [('n1',), ('n2',)]
+        self._ovn.get_acls_for_lswitches = mock.Mock(
+            return_value=({'p1n1': [{'lport': 'p1n1'}],
+                           'p1n2': [{'lport': 'p1n2'}]}, {}, {}))
+
+        with mock.patch.object(self.ovn_nb_sync, 'get_port') as get_port:
+            acls = self.ovn_nb_sync.get_acls(ctx)
+
+        # The number of DB queries does not depend on the number of ports.
+        self.assertEqual(1, ctx.session.query.call_count)
+        self.assertFalse(get_port.called)
+        self._ovn.get_acls_for_lswitches.assert_called_once_with(
+            set(['n1', 'n2']))
+        self.assertEqual({'p1n1': [{'lport': 'p1n1'}],
+                          'p1n2': [{'lport': 'p1n2'}]}, acls)
+
+    def _test_sync_network_digests(self, mode):
+        self.ovn_nb_sync = ovn_nb_sync.OvnNbSynchronizer(self.plugin,
+                                                         self._ovn, mode)
+        stored = {ovn_const.OVN_NEUTRON_DIGEST_EXT_ID_KEY: 'neutron',
+                  ovn_const.OVN_NB_DIGEST_EXT_ID_KEY: 'nb'}
+        self._ovn.get_all_logical_switch_digests = mock.Mock(return_value={
+            'neutron-n1': ('nb', stored),
+            'neutron-n2': ('nb-changed', stored),
+            'neutron-n3': ('nb', stored),
+            'neutron-n4': ('nb', {})})
+        self._ovn.set_lswitch_ext_id = mock.Mock()
+        self.ovn_nb_sync._update_neutron_digests = mock.Mock(return_value={
+            'neutron-n1': 'neutron', 'neutron-n2': 'neutron',
+            'neutron-n3': 'neutron-changed', 'neutron-n4': 'neutron'})
+        self.ovn_nb_sync.sync_networks_and_ports = mock.Mock(
+            return_value=set(['neutron-n2']))
+        self.ovn_nb_sync.sync_acls = mock.Mock(return_value=set())
+        self.ovn_nb_sync._commit_in_chunks = mock.Mock()
+
+        self.ovn_nb_sync.sync_network_digests(mock.ANY)
+
+        # Only the networks changed since the last check are compared.
+        network_ids = sorted(
+            self.ovn_nb_sync.sync_networks_and_ports.call_args[0][1])
+        self.assertEqual(['n2', 'n3', 'n4'], network_ids)
+        self.assertEqual(network_ids, sorted(
+            self.ovn_nb_sync.sync_acls.call_args[0][1]))
+
+    def test_sync_network_digests(self):
+        self._test_sync_network_digests('repair')
+        # The digests of the networks found in sync are stored.
+        self.assertEqual(4, self._ovn.set_lswitch_ext_id.call_count)
+        self._ovn.set_lswitch_ext_id.assert_has_calls(
+            [mock.call('neutron-n3', (ovn_const.OVN_NEUTRON_DIGEST_EXT_ID_KEY,
+                                      'neutron-changed')),
+             mock.call('neutron-n3', (ovn_const.OVN_NB_DIGEST_EXT_ID_KEY,
+                                      'nb')),
+             mock.call('neutron-n4', (ovn_const.OVN_NEUTRON_DIGEST_EXT_ID_KEY,
+                                      'neutron')),
+             mock.call('neutron-n4', (ovn_const.OVN_NB_DIGEST_EXT_ID_KEY,
+                                      'nb'))], any_order=True)
+        self.assertTrue(self.ovn_nb_sync._commit_in_chunks.called)
+
+    def test_sync_network_digests_log_mode(self):
+        self._test_sync_network_digests('log')
+        self.assertFalse(self._ovn.set_lswitch_ext_id.called)
+        self.assertFalse(self.ovn_nb_sync._commit_in_chunks.called)
+
+    def test_get_neutron_digests(self):
+        self.ovn_nb_sync = ovn_nb_sync.OvnNbSynchronizer(self.plugin,
+                                                         self._ovn, 'log')
+        networks = [{'id': 'n1'}, {'id': 'n2'}]
+        ports = [{'id': 'p1', 'network_id': 'n1', 'security_groups': ['sg1'],
+                  'fixed_ips': [{'ip_address': '10.0.0.1'}]},
+                 {'id': 'p2', 'network_id': 'n2', 'security_groups': ['sg2'],
+                  'fixed_ips': [{'ip_address': '10.0.0.2'}]}]
+        rules = [{'id': 'r1', 'security_group_id': 'sg2',
+                  'remote_group_id': 'sg1'}]
+        self.plugin.get_networks = mock.Mock(return_value=networks)
+        self.plugin.get_ports = mock.Mock(return_value=ports)
+        self.plugin.get_security_group_rules = mock.Mock(return_value=rules)
+
+        digests = self.ovn_nb_sync._get_neutron_digests(mock.ANY)
+        self.assertEqual(set(['neutron-n1', 'neutron-n2']), set(digests))
+        # The order the ports are read in does not matter.
+        self.plugin.get_ports.return_value = list(reversed(ports))
+        self.assertEqual(digests,
+                         self.ovn_nb_sync._get_neutron_digests(mock.ANY))
+
+        # A new member of sg1 changes the ACLs of the ports of n2, which
+        # have sg1 as remote group, not of the ones of n1.
+        ports[0]['fixed_ips'].append({'ip_address': '10.0.0.3'})
+        self.plugin.get_ports.return_value = ports
+        new_digests = self.ovn_nb_sync._get_neutron_digests(mock.ANY)
+        self.assertNotEqual(digests['neutron-n1'], new_digests['neutron-n1'])
+        self.assertNotEqual(digests['neutron-n2'], new_digests['neutron-n2'])
+
+    def test_get_neutron_digests_of_networks(self):
+        self.ovn_nb_sync = ovn_nb_sync.OvnNbSynchronizer(self.plugin,
+                                                         self._ovn, 'log')
+        networks = [{'id': 'n1'}, {'id': 'n2'}]
+        ports = [{'id': 'p1', 'network_id': 'n1', 'security_groups': ['sg1'],
+                  'fixed_ips': [{'ip_address': '10.0.0.1'}]},
+                 {'id': 'p2', 'network_id': 'n2', 'security_groups': ['sg2'],
+                  'fixed_ips': [{'ip_address': '10.0.0.2'}]}]
+        rules = [{'id': 'r1', 'security_group_id': 'sg2',
+                  'remote_group_id': 'sg1'}]
+
+        def _filtered(resources):
+            def _get(context, filters=None, **kwargs):
+                return [r for r in resources
+                        if all(r[key] in values for key, values in
+                               six.iteritems(filters or {}))]
+            return _get
+        self.plugin.get_networks = mock.Mock(side_effect=_filtered(networks))
+        self.plugin.get_ports = mock.Mock(side_effect=_filtered(ports))
+        self.plugin.get_security_group_rules = mock.Mock(
+            side_effect=_filtered(rules))
+        self.plugin._get_port_security_group_bindings = mock.Mock(
+            return_value=[{'port_id': 'p1', 'security_group_id': 'sg1'}])
+
+        digests = self.ovn_nb_sync._get_neutron_digests(mock.ANY)
+        # The member of the remote group sg1 is on n1, it is read to
+        # digest n2 alone the same way.
+        self.assertEqual(
+            {'neutron-n2': digests['neutron-n2']},
+            self.ovn_nb_sync._get_neutron_digests(mock.ANY, ['n2']))
+        self.plugin._get_port_security_group_bindings.assert_called_once_with(
+            mock.ANY, filters={'security_group_id': ['sg1']})
+
+    def test_update_neutron_digests(self):
+        self.ovn_nb_sync = ovn_nb_sync.OvnNbSynchronizer(self.plugin,
+                                                         self._ovn, 'log')
+        self.ovn_nb_sync._get_digest_counts = mock.Mock(return_value='counts')
+        self.ovn_nb_sync._get_neutron_digests = mock.Mock(return_value={
+            'neutron-n1': 'd1', 'neutron-n2': 'd2', 'neutron-n3': 'd3'})
+        self.ovn_nb_sync._get_changed_network_ids = mock.Mock(
+            return_value=set(['n2', 'n3', 'n4']))
+        self.plugin.get_networks = mock.Mock(
+            return_value=[{'id': 'n1', 'updated_at': 'time'}])
+
+        self.assertEqual(
+            {'neutron-n1': 'd1', 'neutron-n2': 'd2', 'neutron-n3': 'd3'},
+            self.ovn_nb_sync._update_neutron_digests(mock.ANY))
+        self.ovn_nb_sync._get_neutron_digests.assert_called_once_with(
+            mock.ANY)
+        self.assertFalse(self.ovn_nb_sync._get_changed_network_ids.called)
+
+        # n3 was deleted, n4 created and n2 changed.
+        self.plugin.get_networks.return_value = [
+            {'id': 'n1'}, {'id': 'n2'}, {'id': 'n4'}]
+        self.ovn_nb_sync._get_neutron_digests.return_value = {
+            'neutron-n2': 'd2-changed', 'neutron-n4': 'd4'}
+        self.assertEqual(
+            {'neutron-n1': 'd1', 'neutron-n2': 'd2-changed',
+             'neutron-n4': 'd4'},
+            self.ovn_nb_sync._update_neutron_digests(mock.ANY))
+        self.assertEqual(['n2', 'n4'], sorted(
+            self.ovn_nb_sync._get_neutron_digests.call_args[0][1]))
+        since, old_counts, counts = (
+            self.ovn_nb_sync._get_changed_network_ids.call_args[0][1:])
+        self.assertEqual(('counts', 'counts'), (old_counts, counts))
+
+    def test_update_neutron_digests_without_timestamps(self):
+        self.ovn_nb_sync = ovn_nb_sync.OvnNbSynchronizer(self.plugin,
+                                                         self._ovn, 'log')
+        self.ovn_nb_sync._get_digest_counts = mock.Mock()
+        self.ovn_nb_sync._get_neutron_digests = mock.Mock(return_value={})
+        self.ovn_nb_sync._get_changed_network_ids = mock.Mock()
+        self.plugin.get_networks = mock.Mock(return_value=[{'id': 'n1'}])
+
+        for _i in range(2):
+            self.ovn_nb_sync._update_neutron_digests(mock.ANY)
+        self.assertEqual(2, self.ovn_nb_sync._get_neutron_digests.call_count)
+        self.assertFalse(self.ovn_nb_sync._get_changed_network_ids.called)
+
+    def test_get_changed_network_ids(self):
+        self.ovn_nb_sync = ovn_nb_sync.OvnNbSynchronizer(self.plugin,
+                                                         self._ovn, 'log')
+        self.plugin.get_networks = mock.Mock(return_value=[{'id': 'n1'}])
+        self.plugin.get_ports = mock.Mock(return_value=[
+            {'network_id': 'n2', 'security_groups': ['sg1']}])
+        self.plugin.get_security_group_rules = mock.Mock(side_effect=[
+            [{'security_group_id': 'sg2'}], [{'security_group_id': 'sg5'}]])
+        ctx = mock.Mock()
+        query = ctx.session.query.return_value.join.return_value
+        query.filter.return_value.distinct.return_value = [('n6',)]
+        old_counts = ({'n3': 2, 'n4': 1}, {'sg3': 1}, {'sg4': 2})
+        counts = ({'n3': 1, 'n4': 1}, {'sg3': 1}, {'sg4': 3})
+
+        network_ids = self.ovn_nb_sync._get_changed_network_ids(
+            ctx, mock.Mock(isoformat=mock.Mock(return_value='since')),
+            old_counts, counts)
+
+        # n1 changed, n2 has a changed port and n3 a deleted one, n6 has
+        # ports in the changed groups or the groups having them as remote
+        # group.
+        self.assertEqual(set(['n1', 'n2', 'n3', 'n6']), network_ids)
+        filters = {'changed_since': ['since']}
+        self.plugin.get_networks.assert_called_once_with(
+            ctx, filters=filters, fields=['id'])
+        self.assertEqual(
+            set(['sg1', 'sg2', 'sg4']), set(
+                self.plugin.get_security_group_rules.call_args[1][
+                    'filters']['remote_group_id']))
+        query.filter.assert_called_once_with(mock.ANY)
@@ -17,10 +17,12 @@
 import copy
 import mock
 from neutron_lib import exceptions as n_exc
+from oslo_config import cfg
 from oslo_utils import uuidutils
 import six
 from webob import exc
 
+from neutron.api.rpc.callbacks import events as callbacks_events
 from neutron import context
 from neutron.core_extensions.qos import QosCoreResourceExtension
 from neutron.db.qos import api as qos_api
@@ -41,6 +43,7 @@ from neutron.tests.unit.extensions import test_l3 as test_l3_plugin
 from neutron.tests.unit.extensions import test_portsecurity
 
 from networking_ovn.common import constants as ovn_const
+from networking_ovn.common import exceptions as ovn_exc
 from networking_ovn.ovsdb import commands as cmd
 from networking_ovn.ovsdb import impl_idl_ovn
 
@@ -282,6 +285,29 @@ class TestOvnPlugin(OVNPluginTestCase):
                          old_mac + " 1.1.1.1"]),
                         called_args_dict.get('port_security'))
 
+    def test_set_network_revision_number(self):
+        self.plugin._ovn.check_revision_number = mock.Mock()
+        self.plugin._ovn.set_lswitch_ext_id = mock.Mock()
+        network = {'id': 'n1', 'name': 'net1', 'revision_number': 3}
+        self.plugin._set_network_revision_number(network)
+        self.plugin._ovn.check_revision_number.assert_called_once_with(
+            'Logical_Switch', 'neutron-n1', 3)
+        self.plugin._ovn.set_lswitch_ext_id.assert_has_calls(
+            [mock.call('neutron-n1',
+                       [ovn_const.OVN_NETWORK_NAME_EXT_ID_KEY, 'net1']),
+             mock.call('neutron-n1',
+                       [ovn_const.OVN_REV_NUM_EXT_ID_KEY, '3'])])
+
+    def test_set_network_revision_number_conflict(self):
+        self.plugin._ovn.transaction = mock.MagicMock()
+        self.plugin._ovn.transaction.return_value.__exit__.side_effect = (
+            ovn_exc.RevisionConflict(table='Logical_Switch',
+                                     name='neutron-n1', current=4,
+                                     revision=3))
+        # The out of order update is dropped without error.
+        self.plugin._set_network_revision_number(
+            {'id': 'n1', 'name': 'net1', 'revision_number': 3})
+
 
 class TestQosOvnPlugin(OVNPluginTestCase):
     def setUp(self,
@@ -390,6 +416,67 @@ class TestQosOvnPlugin(OVNPluginTestCase):
                 self._validate_port_create({'policing_rate': '50',
                                             'policing_burst': '500'})
 
+    def test_qos_policy_update_ports(self):
+        cfg.CONF.set_override('qos_transaction_size', 2, 'ovn')
+        ports = [{'id': 'port%d' % i, 'network_id': 'net1',
+                  'device_owner': 'compute:nova'} for i in range(3)]
+        ports.append({'id': 'router-port', 'network_id': 'net1',
+                      'device_owner': 'network:router_interface'})
+        ports.append({'id': 'vtep-port', 'network_id': 'net1',
+                      'device_owner': 'compute:nova',
+                      ovn_const.OVN_PORT_BINDING_PROFILE: {
+                          'vtep_physical_switch': 'psw1',
+                          'vtep_logical_switch': 'lsw1'}})
+        policy = mock.Mock(id=self.qos_policy_id1, rules=self.policy1.rules)
+        policy.get_bound_networks.return_value = []
+        policy.get_bound_ports.return_value = [
+            mock.Mock(port_id=port['id']) for port in ports]
+        self.plugin._ovn.transaction = mock.MagicMock()
+
+        with mock.patch.object(self.plugin, 'get_ports',
+                               return_value=ports) as get_ports, \
+                mock.patch.object(self.plugin, 'qos_get_ovn_port_options',
+                                  return_value={}) as get_port_options, \
+                mock.patch.object(self.plugin,
+                                  '_update_port_in_ovn') as update_port:
+            self.plugin._handle_qos_notification(
+                policy, callbacks_events.UPDATED)
+
+        get_ports.assert_called_once_with(
+            mock.ANY, filters={'id': [port['id'] for port in ports]})
+        # Only the port the policy rules do not apply to is looked up.
+        self.assertEqual(1, get_port_options.call_count)
+        self.assertFalse(update_port.called)
+        options = {'policing_rate': '50', 'policing_burst': '500'}
+        self.assertEqual(
+            [mock.call(lport_name='port0', options=options),
+             mock.call(lport_name='port1', options=options),
+             mock.call(lport_name='port2', options=options),
+             mock.call(lport_name='router-port', options={})],
+            self.plugin._ovn.set_lport.call_args_list)
+        self.assertEqual(2, self.plugin._ovn.transaction.call_count)
+
+    @mock.patch('neutron.objects.qos.policy.QosPolicy.get_network_policy',
+                return_value=None)
+    def test_qos_options_cached_per_request(self, mock_get_nw_policy):
+        port = {'id': 'port1', 'network_id': 'net1',
+                'device_owner': 'compute:nova',
+                'qos_policy_id': self.qos_policy_id1}
+        ctxt = context.Context('', self.tenant_id)
+        for _i in range(2):
+            self.assertEqual(
+                {'policing_rate': '50', 'policing_burst': '500'},
+                self.plugin.qos_get_ovn_port_options(ctxt, port))
+        self.assertEqual(1, qos_policy.QosPolicy.get_object.call_count)
+        self.assertEqual(1, mock_get_nw_policy.call_count)
+
+        # The next request reads the policy, which another neutron-server
+        # process may have changed, again.
+        self.policy1.rules = []
+        self.assertEqual({}, self.plugin.qos_get_ovn_port_options(
+            context.Context('', self.tenant_id), port))
+        self.assertEqual(2, qos_policy.QosPolicy.get_object.call_count)
+
 
 class TestOvnPluginACLs(OVNPluginTestCase):
 
@@ -409,64 +496,74 @@ class TestOvnPluginACLs(OVNPluginTestCase):
                             'ip_version': 4,
                             'cidr': '1.1.1.0/24'}
 
-    def test__add_acl_dhcp_no_cache(self):
-        self.plugin._ovn.add_acl = mock.Mock()
+    def test__get_lswitch_acl_keys_no_cache(self):
+        self.fake_port['security_groups'] = ['sg1']
         with mock.patch.object(self.plugin, 'get_subnet',
                                return_value=self.fake_subnet):
-            acls = self.plugin._add_acl_dhcp(self.context, self.fake_port, {})
-
-        expected_match_to_lport = (
-            'outport == "%s" && ip4 && ip4.src == %s && udp && udp.src == 67 '
-            '&& udp.dst == 68') % (self.fake_port['id'],
-                                   self.fake_subnet['cidr'])
-        acl_to_lport = {'action': 'allow', 'direction': 'to-lport',
-                        'external_ids': {'neutron:lport': 'fake_port_id1'},
-                        'log': False, 'lport': 'fake_port_id1',
-                        'lswitch': 'neutron-network_id1',
-                        'match': expected_match_to_lport, 'priority': 1002}
-        expected_match_from_lport = (
-            'inport == "%s" && ip4 && '
-            '(ip4.dst == 255.255.255.255 || ip4.dst == %s) && '
-            'udp && udp.src == 68 && udp.dst == 67'
-        ) % (self.fake_port['id'], self.fake_subnet['cidr'])
-        acl_from_lport = {'action': 'allow', 'direction': 'from-lport',
-                          'external_ids': {'neutron:lport': 'fake_port_id1'},
-                          'log': False, 'lport': 'fake_port_id1',
-                          'lswitch': 'neutron-network_id1',
-                          'match': expected_match_from_lport, 'priority': 1002}
-        for acl in acls:
-            if 'to-lport' in acl.values():
-                self.assertEqual(acl_to_lport, acl)
-            if 'from-lport' in acl.values():
-                self.assertEqual(acl_from_lport, acl)
-
-    def test__add_acl_dhcp_cache(self):
-        acls = self.plugin._add_acl_dhcp(self.context, self.fake_port,
-                                         {'subnet_id1': self.fake_subnet})
-        expected_match_to_lport = (
-            'outport == "%s" && ip4 && ip4.src == %s && udp && udp.src == 67 '
-            '&& udp.dst == 68') % (self.fake_port['id'],
-                                   self.fake_subnet['cidr'])
-        acl_to_lport = {'action': 'allow', 'direction': 'to-lport',
-                        'external_ids': {'neutron:lport': 'fake_port_id1'},
-                        'log': False, 'lport': 'fake_port_id1',
-                        'lswitch': 'neutron-network_id1',
-                        'match': expected_match_to_lport, 'priority': 1002}
-        expected_match_from_lport = (
-            'inport == "%s" && ip4 && '
-            '(ip4.dst == 255.255.255.255 || ip4.dst == %s) && '
-            'udp && udp.src == 68 && udp.dst == 67'
-        ) % (self.fake_port['id'], self.fake_subnet['cidr'])
-        acl_from_lport = {'action': 'allow', 'direction': 'from-lport',
-                          'external_ids': {'neutron:lport': 'fake_port_id1'},
-                          'log': False, 'lport': 'fake_port_id1',
-                          'lswitch': 'neutron-network_id1',
-                          'match': expected_match_from_lport, 'priority': 1002}
-        for acl in acls:
-            if 'to-lport' in acl.values():
-                self.assertEqual(acl_to_lport, acl)
-            if 'from-lport' in acl.values():
-                self.assertEqual(acl_from_lport, acl)
+            keys = self.plugin._get_lswitch_acl_keys(self.context,
+                                                     self.fake_port, {})
+        self.assertEqual(['drop:from-lport', 'drop:to-lport',
+                          'dhcp:from-lport:1.1.1.0/24',
+                          'dhcp:to-lport:1.1.1.0/24'], keys)
+
+    def test__get_lswitch_acl_keys_cache(self):
+        self.fake_port['security_groups'] = ['sg1']
+        with mock.patch.object(self.plugin, 'get_subnet') as get_subnet:
+            keys = self.plugin._get_lswitch_acl_keys(
+                self.context, self.fake_port,
+                {'subnet_id1': self.fake_subnet})
+        self.assertFalse(get_subnet.called)
+        self.assertEqual(['drop:from-lport', 'drop:to-lport',
+                          'dhcp:from-lport:1.1.1.0/24',
+                          'dhcp:to-lport:1.1.1.0/24'], keys)
+
+    def test__get_lswitch_acl_keys_shared_cache(self):
+        self.fake_port['security_groups'] = ['sg1']
+        with mock.patch.object(self.plugin, 'get_subnet',
+                               return_value=self.fake_subnet) as get_subnet:
+            self.plugin._get_lswitch_acl_keys(self.context, self.fake_port)
+            keys = self.plugin._get_lswitch_acl_keys(self.context,
+                                                     self.fake_port)
+        get_subnet.assert_called_once_with(
+            self.context.elevated.return_value, 'subnet_id1',
+            fields=['id', 'ip_version', 'cidr'])
+        self.assertEqual(['drop:from-lport', 'drop:to-lport',
+                          'dhcp:from-lport:1.1.1.0/24',
+                          'dhcp:to-lport:1.1.1.0/24'], keys)
+
+    def test__get_sg_port_bindings_from_db(self):
+        bindings = [{'port_id': 'port1', 'security_group_id': 'sg1'}]
+        with mock.patch.object(self.plugin,
+                               '_get_port_security_group_bindings',
+                               return_value=bindings) as get_bindings:
+            self.plugin._get_sg_port_bindings(self.context, 'sg1')
+            # A port added meanwhile by another neutron-server process is
+            # not missed.
+            self.assertEqual(
+                bindings, self.plugin._get_sg_port_bindings(self.context,
+                                                            'sg1'))
+        self.assertEqual(2, get_bindings.call_count)
+        get_bindings.assert_called_with(self.context,
+                                        {'security_group_id': ['sg1']})
+
+    def test__get_referencing_sgs_from_db(self):
+        rules = [{'security_group_id': 'sg2'}, {'security_group_id': 'sg3'}]
+        with mock.patch.object(self.plugin, 'get_security_group_rules',
+                               return_value=rules) as get_rules:
+            self.assertEqual(
+                set(['sg2', 'sg3']),
+                self.plugin._get_referencing_sgs(self.context, 'sg1'))
+        get_rules.assert_called_once_with(
+            self.context, {'remote_group_id': ['sg1']},
+            fields=['security_group_id'])
+
+    def test__get_lswitch_acl_keys_no_sec_group(self):
+        self.fake_port['security_groups'] = []
+        with mock.patch.object(self.plugin, 'get_subnet') as get_subnet:
+            keys = self.plugin._get_lswitch_acl_keys(self.context,
+                                                     self.fake_port)
+        self.assertFalse(get_subnet.called)
+        self.assertEqual([], keys)
 
     def test__add_acls_no_sec_group(self):
         acls = self.plugin._add_acls(self.context,
@@ -536,7 +633,7 @@ class TestOvnPluginACLs(OVNPluginTestCase):
         subnets = {'subnet-id': subnet,
                    'subnet-id-v6': subnet_v6}
 
-        def _get_subnet(context, id):
+        def _get_subnet(context, id, fields=None):
             return subnets[id]
 
         with mock.patch('neutron.db.securitygroups_db.SecurityGroupDbMixin.'
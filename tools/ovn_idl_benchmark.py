@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Benchmark the API latency during the initial dump of the OVN NB DB.
+
+An OVN NB database file with --lswitches logical switches of --lports
+logical ports each is served by an ovsdb-server, the schema of the database
+being read from --schema, e.g. ovn/ovn-nb.ovsschema of the OVS source tree.
+For each mode, a process monkey patched by eventlet, as neutron-server is,
+starts the OVN NB DB connection of an API worker, with [ovn]
+ovsdb_native_thread off and on, while a greenthread stands for the API
+requests being handled: it sleeps --interval seconds in a loop, and its
+latency is how much later than due it wakes up:
+
+    python tools/ovn_idl_benchmark.py --schema ovn-nb.ovsschema \\
+        --lswitches 100 --lports 1000
+
+The database file is kept in --work-dir, and reused when run again with
+the same sizes.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+from oslo_serialization import jsonutils
+
+MODES = ('greenthread', 'native')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--schema', required=True,
+                        help='OVN NB DB schema file')
+    parser.add_argument('--lswitches', type=int, default=100)
+    parser.add_argument('--lports', type=int, default=1000,
+                        help='logical ports per logical switch')
+    parser.add_argument('--interval', type=float, default=0.01,
+                        help='seconds between two probes of the latency')
+    parser.add_argument('--work-dir', default='ovn-idl-benchmark')
+    # Used by the benchmark to run each mode in its own process.
+    parser.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--remote', help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def write_nb_db(nb_file, args):
+    """Write an OVSDB file with the lswitches and lports."""
+    with open(args.schema) as f:
+        schema = jsonutils.load(f)
+    lswitches = {}
+    lports = {}
+    for i in range(args.lswitches):
+        ports = []
+        for j in range(args.lports):
+            lport_id = str(uuid.uuid4())
+            lports[lport_id] = {
+                'name': lport_id,
+                'addresses': ['set', ['fa:16:3e:%02x:%02x:%02x 10.%d.%d.%d' %
+                                      (i % 256, j // 256, j % 256,
+                                       i % 256, j // 256, j % 256)]],
+                'external_ids': ['map', [['neutron:port_name',
+                                          'port%d' % j]]]}
+            ports.append(['uuid', lport_id])
+        lswitches[str(uuid.uuid4())] = {
+            'name': 'neutron-%d' % i, 'ports': ['set', ports],
+            'external_ids': ['map', [['neutron:network_name',
+                                      'net%d' % i]]]}
+
+    with open(nb_file, 'w') as f:
+        for record in (schema, {'Logical_Switch': lswitches,
+                                'Logical_Port': lports}):
+            text = jsonutils.dumps(record)
+            f.write('OVSDB JSON %d 0\n%s\n' % (len(text), text))
+
+
+def run_mode(args):
+    """Start the connection and print the latencies probed meanwhile."""
+    import eventlet
+    eventlet.monkey_patch()
+
+    from oslo_config import cfg
+
+    from networking_ovn.common import config  # noqa
+    from networking_ovn.ovsdb import ovsdb_monitor
+
+    cfg.CONF.set_override('ovsdb_native_thread', args.mode == 'native',
+                          'ovn')
+    latencies = []
+    done = []
+
+    def probe():
+        while not done:
+            due = time.time() + args.interval
+            eventlet.sleep(args.interval)
+            latencies.append(time.time() - due)
+
+    prober = eventlet.spawn(probe)
+    eventlet.sleep(0)
+    connection = ovsdb_monitor.OvnConnection(args.remote, 600,
+                                             'OVN_Northbound')
+    start = time.time()
+    connection.start()
+    duration = time.time() - start
+    done.append(True)
+    prober.wait()
+
+    latencies.sort()
+    print(jsonutils.dumps({
+        'dump': duration,
+        'p50': latencies[len(latencies) // 2],
+        'p99': latencies[int(len(latencies) * 0.99)],
+        'max': latencies[-1]}))
+
+
+def main():
+    args = parse_args()
+    if args.mode:
+        run_mode(args)
+        return
+
+    work_dir = os.path.abspath(args.work_dir)
+    if not os.path.isdir(work_dir):
+        os.makedirs(work_dir)
+    nb_file = os.path.join(work_dir, 'ovnnb-%dx%d.db' % (args.lswitches,
+                                                         args.lports))
+    if not os.path.exists(nb_file):
+        print('Writing the OVN NB DB %s' % nb_file)
+        write_nb_db(nb_file, args)
+    socket = os.path.join(work_dir, 'ovnnb.sock')
+    server = subprocess.Popen(
+        ['ovsdb-server', '--remote=punix:%s' % socket,
+         '--unixctl=%s' % os.path.join(work_dir, 'ovnnb.ctl'), nb_file])
+    try:
+        while not os.path.exists(socket):
+            time.sleep(0.1)
+        print('%-12s %10s %10s %10s %10s' % ('mode', 'dump s', 'p50 ms',
+                                             'p99 ms', 'max ms'))
+        for mode in MODES:
+            output = subprocess.check_output(
+                [sys.executable, os.path.abspath(__file__),
+                 '--schema', args.schema, '--interval', str(args.interval),
+                 '--mode', mode, '--remote', 'unix:%s' % socket])
+            result = jsonutils.loads(output.splitlines()[-1])
+            print('%-12s %10.2f %10.1f %10.1f %10.1f' % (
+                mode, result['dump'], result['p50'] * 1000,
+                result['p99'] * 1000, result['max'] * 1000))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    main()
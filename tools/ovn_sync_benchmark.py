@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Benchmark neutron-ovn-db-sync-util on a synthetic cloud.
+
+A sqlite Neutron DB is filled with --networks networks of --ports ports,
+all of them members of a security group referencing itself, and an OVN NB
+database file is written with the matching logical switches and ports,
+but for the --drift ratio of the ports left out.  A log mode sync of the
+NB database file is then timed for each --workers count, and the peak RSS
+of the process syncing, the largest worker one when sharded, reported:
+
+    python tools/ovn_sync_benchmark.py --networks 200 --ports 50 \\
+        --workers 1 2 4 8
+
+The DB and NB files are kept in --work-dir, and reused when run again
+with the same sizes.  To compare two revisions of networking-ovn, e.g.
+the peak RSS of a 100k ports sync before and after a change, run the
+benchmark with --networks 400 --ports 250 in a checkout of each, with
+the same --work-dir.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+from neutron_lib import constants
+from oslo_config import cfg
+from oslo_serialization import jsonutils
+
+NB_SCHEMA = {
+    'name': 'OVN_Northbound',
+    'version': '0.0.0',
+    'tables': {
+        'Logical_Switch': {'columns': {
+            'name': {'type': 'string'},
+            'ports': {'type': {'key': {'type': 'uuid',
+                                       'refTable': 'Logical_Port'},
+                               'min': 0, 'max': 'unlimited'}},
+            'acls': {'type': {'key': {'type': 'uuid', 'refTable': 'ACL'},
+                              'min': 0, 'max': 'unlimited'}},
+            'external_ids': {'type': {'key': 'string', 'value': 'string',
+                                      'min': 0, 'max': 'unlimited'}}}},
+        'Logical_Port': {'columns': {
+            'name': {'type': 'string'},
+            'type': {'type': 'string'},
+            'options': {'type': {'key': 'string', 'value': 'string',
+                                 'min': 0, 'max': 'unlimited'}},
+            'parent_name': {'type': {'key': 'string', 'min': 0, 'max': 1}},
+            'tag': {'type': {'key': 'integer', 'min': 0, 'max': 1}},
+            'addresses': {'type': {'key': 'string', 'min': 0,
+                                   'max': 'unlimited'}},
+            'port_security': {'type': {'key': 'string', 'min': 0,
+                                       'max': 'unlimited'}},
+            'enabled': {'type': {'key': 'boolean', 'min': 0, 'max': 1}},
+            'external_ids': {'type': {'key': 'string', 'value': 'string',
+                                      'min': 0, 'max': 'unlimited'}}}},
+        'ACL': {'columns': {
+            'priority': {'type': 'integer'},
+            'direction': {'type': 'string'},
+            'match': {'type': 'string'},
+            'action': {'type': 'string'},
+            'log': {'type': 'boolean'},
+            'external_ids': {'type': {'key': 'string', 'value': 'string',
+                                      'min': 0, 'max': 'unlimited'}}}},
+        'Logical_Router': {'columns': {
+            'name': {'type': 'string'},
+            'ports': {'type': {'key': {'type': 'uuid',
+                                       'refTable': 'Logical_Router_Port'},
+                               'min': 0, 'max': 'unlimited'}},
+            'external_ids': {'type': {'key': 'string', 'value': 'string',
+                                      'min': 0, 'max': 'unlimited'}}}},
+        'Logical_Router_Port': {'columns': {
+            'name': {'type': 'string'}}}}}
+
+TENANT_ID = 'benchmark'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--networks', type=int, default=100)
+    parser.add_argument('--ports', type=int, default=50,
+                        help='ports per network, at most 250')
+    parser.add_argument('--drift', type=float, default=0.01,
+                        help='ratio of the ports missing in the NB DB')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--work-dir', default='ovn-sync-benchmark')
+    return parser.parse_args()
+
+
+def create_neutron_db(db_file, args):
+    # Imported here, the Neutron DB options are registered on import.
+    from neutron import context
+    from neutron.db import api as db_api
+    from neutron.db import db_base_plugin_v2
+    from neutron.db.migration.models import head  # noqa
+    from neutron.db import model_base
+    from neutron.db import securitygroups_db
+
+    class Plugin(db_base_plugin_v2.NeutronDbPluginV2,
+                 securitygroups_db.SecurityGroupDbMixin):
+        pass
+
+    cfg.CONF.set_override('connection', 'sqlite:///%s' % db_file,
+                          'database')
+    model_base.BASEV2.metadata.create_all(db_api.get_engine())
+    plugin = Plugin()
+    ctx = context.get_admin_context()
+    sg = plugin.create_security_group(ctx, {'security_group': {
+        'name': 'benchmark', 'description': '', 'tenant_id': TENANT_ID}},
+        default_sg=True)
+    plugin.create_security_group_rule(ctx, {'security_group_rule': {
+        'security_group_id': sg['id'], 'tenant_id': TENANT_ID,
+        'direction': 'ingress', 'ethertype': 'IPv4', 'protocol': 'tcp',
+        'port_range_min': 22, 'port_range_max': 22,
+        'remote_ip_prefix': None, 'remote_group_id': sg['id']}})
+
+    unset = constants.ATTR_NOT_SPECIFIED
+    for i in range(args.networks):
+        network = plugin.create_network(ctx, {'network': {
+            'name': 'net%d' % i, 'tenant_id': TENANT_ID,
+            'admin_state_up': True, 'shared': False}})
+        plugin.create_subnet(ctx, {'subnet': {
+            'name': 'subnet%d' % i, 'tenant_id': TENANT_ID,
+            'network_id': network['id'], 'ip_version': 4,
+            'cidr': '10.%d.%d.0/24' % (i // 256, i % 256),
+            'gateway_ip': unset, 'allocation_pools': unset,
+            'dns_nameservers': unset, 'host_routes': unset,
+            'enable_dhcp': False, 'ipv6_ra_mode': unset,
+            'ipv6_address_mode': unset, 'subnetpool_id': unset}})
+        for j in range(args.ports):
+            port = plugin.create_port(ctx, {'port': {
+                'name': 'port%d' % j, 'tenant_id': TENANT_ID,
+                'network_id': network['id'], 'admin_state_up': True,
+                'mac_address': unset, 'fixed_ips': unset,
+                'device_id': '', 'device_owner': ''}})
+            with ctx.session.begin(subtransactions=True):
+                plugin._process_port_create_security_group(
+                    ctx, port, [sg['id']])
+    return plugin, ctx
+
+
+def write_nb_db(nb_file, plugin, ctx, drift):
+    """Write an OVSDB file with the lswitches and lports of the cloud."""
+    lswitches = {}
+    lports = {}
+    for network in plugin.get_networks(ctx):
+        lswitches[network['id']] = {
+            'name': 'neutron-%s' % network['id'], 'ports': [],
+            'external_ids': ['map', [['neutron:network_name',
+                                      network['name']]]]}
+    skip_every = int(1 / drift) if drift else 0
+    for index, port in enumerate(plugin.get_ports(ctx)):
+        if skip_every and index % skip_every == 0:
+            continue
+        addresses = ' '.join([port['mac_address']] +
+                             [ip['ip_address'] for ip in port['fixed_ips']])
+        lports[port['id']] = {
+            'name': port['id'], 'addresses': addresses,
+            'external_ids': ['map', [['neutron:port_name', port['name']]]]}
+        lswitches[port['network_id']]['ports'].append(['uuid', port['id']])
+    for lswitch in lswitches.values():
+        lswitch['ports'] = ['set', lswitch['ports']]
+
+    with open(nb_file, 'w') as f:
+        for record in (NB_SCHEMA, {'Logical_Switch': lswitches,
+                                   'Logical_Port': lports}):
+            text = jsonutils.dumps(record)
+            f.write('OVSDB JSON %d 0\n%s\n' % (len(text), text))
+
+
+def run_sync(args, db_file, nb_file, workers):
+    report_file = os.path.join(args.work_dir, 'report-%d.json' % workers)
+    conf_file = os.path.join(args.work_dir, 'sync-%d.conf' % workers)
+    with open(conf_file, 'w') as f:
+        f.write('[DEFAULT]\nuse_stderr = False\n'
+                '[database]\nconnection = sqlite:///%s\n'
+                '[ovn]\nneutron_sync_mode = log\n'
+                'sync_snapshot_file = %s\nsync_report_file = %s\n'
+                'sync_workers = %d\n' %
+                (db_file, nb_file, report_file, workers))
+    start = time.time()
+    subprocess.check_call(
+        [sys.executable, '-c',
+         'from networking_ovn.cmd import neutron_ovn_db_sync_util as u; '
+         'u.main()', '--config-file', conf_file])
+    duration = time.time() - start
+    with open(report_file) as f:
+        return duration, jsonutils.load(f)
+
+
+def main():
+    args = parse_args()
+    if not os.path.isdir(args.work_dir):
+        os.makedirs(args.work_dir)
+    name = '%dx%d' % (args.networks, args.ports)
+    db_file = os.path.abspath(os.path.join(args.work_dir,
+                                           'neutron-%s.db' % name))
+    nb_file = os.path.abspath(os.path.join(args.work_dir,
+                                           'ovnnb-%s.db' % name))
+    if not os.path.exists(db_file):
+        print('Creating the Neutron DB %s' % db_file)
+        plugin, ctx = create_neutron_db(db_file, args)
+        write_nb_db(nb_file, plugin, ctx, args.drift)
+
+    print('%-8s %10s %8s %14s %13s' % ('workers', 'seconds', 'speedup',
+                                       'discrepancies', 'peak RSS MiB'))
+    baseline = None
+    for workers in args.workers:
+        duration, report = run_sync(args, db_file, nb_file, workers)
+        baseline = baseline or duration
+        print('%-8d %10.2f %8.2f %14d %13.1f' % (
+            workers, duration, baseline / duration,
+            report['total_discrepancies'], report['peak_rss_kib'] / 1024.0))
+
+
+if __name__ == '__main__':
+    main()